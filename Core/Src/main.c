@@ -32,7 +32,12 @@
 
 /* Private define ------------------------------------------------------------*/
 /* USER CODE BEGIN PD */
-
+// Binary joystick frame: sync | x (u16) | y (u16) | buttons | seq | crc
+#define FRAME_SYNC          0xA5
+#define FRAME_SIZE          8
+#define FRAME_FLAG_SAMPLE   0x80
+#define UART_SEND_PERIOD_MS 50
+#define UART_RX_LINE_SIZE   16
 /* USER CODE END PD */
 
 /* Private macro -------------------------------------------------------------*/
@@ -56,6 +61,15 @@ volatile uint8_t buttonE_pressed = 0;
 volatile uint8_t buttonF_pressed = 0;
 volatile uint8_t joystickButton_pressed = 0;
 
+// Protocol selection (host sends "PROTO:BIN\n" / "PROTO:TXT\n")
+volatile uint8_t binary_requested = 0;
+volatile uint8_t text_requested = 0;
+uint8_t binary_mode = 0;
+uint8_t frame_seq = 0;
+uint8_t uart_rx_byte;
+char uart_rx_line[UART_RX_LINE_SIZE];
+uint8_t uart_rx_len = 0;
+
 /* USER CODE END PV */
 
 /* Private function prototypes -----------------------------------------------*/
@@ -67,6 +81,8 @@ static void MX_ADC2_Init(void);
 /* USER CODE BEGIN PFP */
 uint16_t Read_ADC(ADC_HandleTypeDef* hadc);
 void Send_UART_Data(uint16_t x, uint16_t y, uint8_t buttonE);
+void Send_UART_Frame(uint16_t x, uint16_t y, uint8_t buttons);
+uint8_t Collect_Buttons(void);
 /* USER CODE END PFP */
 
 /* Private user code ---------------------------------------------------------*/
@@ -121,6 +137,10 @@ int main(void)
   // EXTI15_10 for PA10 (Button A), PB10 (Button E)
   HAL_NVIC_SetPriority(EXTI15_10_IRQn, 0, 0);
   HAL_NVIC_EnableIRQ(EXTI15_10_IRQn);
+  // USART2 RX interrupt for protocol requests from the host
+  HAL_NVIC_SetPriority(USART2_IRQn, 1, 0);
+  HAL_NVIC_EnableIRQ(USART2_IRQn);
+  HAL_UART_Receive_IT(&huart2, &uart_rx_byte, 1);
 
   /* USER CODE END 2 */
 
@@ -137,14 +157,49 @@ int main(void)
     uint16_t joystick_x = Read_ADC(&hadc1);  // PA0 - X axis
     uint16_t joystick_y = Read_ADC(&hadc2);  // PA1 - Y axis
     
-    // Send data via UART (every ~50ms to avoid flooding)
+    // Protocol switch requested by the host
+    if(binary_requested)
+    {
+      const char ack[] = "ACK:BIN\n";
+      HAL_UART_Transmit(&huart2, (uint8_t*)ack, strlen(ack), 100);
+      binary_mode = 1;
+      binary_requested = 0;
+    }
+    if(text_requested)
+    {
+      binary_mode = 0;
+      text_requested = 0;
+    }
+    
     uint32_t current_time = HAL_GetTick();
-    if(current_time - last_send_time >= 50)
+    uint8_t sample_due = (current_time - last_send_time >= UART_SEND_PERIOD_MS);
+    if(sample_due)
     {
-      Send_UART_Data(joystick_x, joystick_y, 0);
       last_send_time = current_time;
     }
     
+    if(binary_mode)
+    {
+      // One frame carries the sample and every button pressed since the last one
+      uint8_t buttons = Collect_Buttons();
+      if(sample_due)
+      {
+        buttons |= FRAME_FLAG_SAMPLE;
+      }
+      if(buttons)
+      {
+        Send_UART_Frame(joystick_x, joystick_y, buttons);
+      }
+      HAL_Delay(10);
+      continue;
+    }
+    
+    // Send data via UART (every ~50ms to avoid flooding)
+    if(sample_due)
+    {
+      Send_UART_Data(joystick_x, joystick_y, 0);
+    }
+    
     // Handle button presses (send via UART immediately)
     if(buttonA_pressed)
     {
@@ -474,6 +529,61 @@ void Send_UART_Data(uint16_t x, uint16_t y, uint8_t buttonE)
   HAL_UART_Transmit(&huart2, (uint8_t*)uart_buffer, strlen(uart_buffer), 100);
 }
 
+// Take and clear pending button flags as a bitmask (A=bit0 ... F=bit5, JOY=bit6)
+uint8_t Collect_Buttons(void)
+{
+  uint8_t mask = 0;
+  if(buttonA_pressed) { mask |= 0x01; buttonA_pressed = 0; }
+  if(buttonB_pressed) { mask |= 0x02; buttonB_pressed = 0; }
+  if(buttonC_pressed) { mask |= 0x04; buttonC_pressed = 0; }
+  if(buttonD_pressed) { mask |= 0x08; buttonD_pressed = 0; }
+  if(buttonE_pressed) { mask |= 0x10; buttonE_pressed = 0; }
+  if(buttonF_pressed) { mask |= 0x20; buttonF_pressed = 0; }
+  if(joystickButton_pressed) { mask |= 0x40; joystickButton_pressed = 0; }
+  return mask;
+}
+
+// Function to send one binary frame (little-endian, crc = XOR of bytes 1..6)
+void Send_UART_Frame(uint16_t x, uint16_t y, uint8_t buttons)
+{
+  uint8_t frame[FRAME_SIZE];
+  frame[0] = FRAME_SYNC;
+  frame[1] = (uint8_t)(x & 0xFF);
+  frame[2] = (uint8_t)(x >> 8);
+  frame[3] = (uint8_t)(y & 0xFF);
+  frame[4] = (uint8_t)(y >> 8);
+  frame[5] = buttons;
+  frame[6] = frame_seq++;
+  frame[7] = frame[1] ^ frame[2] ^ frame[3] ^ frame[4] ^ frame[5] ^ frame[6];
+  HAL_UART_Transmit(&huart2, frame, FRAME_SIZE, 100);
+}
+
+// UART RX callback: collect a request line from the host
+void HAL_UART_RxCpltCallback(UART_HandleTypeDef *huart)
+{
+  if(huart->Instance == USART2)
+  {
+    if(uart_rx_byte == '\n')
+    {
+      uart_rx_line[uart_rx_len] = '\0';
+      if(strcmp(uart_rx_line, "PROTO:BIN") == 0)
+        binary_requested = 1;
+      else if(strcmp(uart_rx_line, "PROTO:TXT") == 0)
+        text_requested = 1;
+      uart_rx_len = 0;
+    }
+    else if(uart_rx_byte != '\r' && uart_rx_len < UART_RX_LINE_SIZE - 1)
+    {
+      uart_rx_line[uart_rx_len++] = (char)uart_rx_byte;
+    }
+    else if(uart_rx_byte != '\r')
+    {
+      uart_rx_len = 0;
+    }
+    HAL_UART_Receive_IT(&huart2, &uart_rx_byte, 1);
+  }
+}
+
 /* USER CODE END 4 */
 
 /**
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Асинхронный журнал сообщений приложения
+
+Сообщения складываются в кольцевой буфер, а в stdout их выводит отдельный
+поток, поэтому поток чтения порта и главный цикл не ждут консоль. У каждой
+категории ('uart', 'serial', 'net', 'paint') свой уровень и лимит сообщений в
+секунду; отключённый уровень стоит одного сравнения, а строка
+форматируется только в потоке вывода:
+
+    log = get_logger('uart')
+    log.debug("[UART] Получено: %s", item)
+"""
+
+import atexit
+import sys
+import threading
+import time
+from collections import deque
+
+from config import (LOG_LEVEL, LOG_CATEGORY_LEVELS, LOG_RATE_LIMIT,
+                    LOG_BUFFER_SIZE, LOG_FLUSH_INTERVAL)
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR, 'off': OFF}
+
+# Кольцевой буфер (сообщение, аргументы): при переполнении вытесняются старые
+_buffer = deque(maxlen=LOG_BUFFER_SIZE)
+_write_lock = threading.Lock()
+_wakeup = threading.Event()
+_writer = None
+_loggers = {}
+_default_level = LEVELS[LOG_LEVEL]
+
+
+class Logger:
+    """Журнал одной категории с уровнем и ограничением частоты"""
+    
+    def __init__(self, category):
+        self.category = category
+        if category in LOG_CATEGORY_LEVELS:
+            self.level = LEVELS[LOG_CATEGORY_LEVELS[category]]
+        else:
+            self.level = _default_level
+        # Лимит на debug/info; предупреждения и ошибки проходят всегда
+        self.rate_limit = LOG_RATE_LIMIT
+        self._tokens = float(LOG_RATE_LIMIT)
+        self._last_refill = time.monotonic()
+        self.suppressed = 0
+    
+    def enabled(self, level):
+        """Будет ли записано сообщение уровня level"""
+        return level >= self.level
+    
+    def debug(self, message, *args):
+        if DEBUG >= self.level:
+            self._log(DEBUG, message, args)
+    
+    def info(self, message, *args):
+        if INFO >= self.level:
+            self._log(INFO, message, args)
+    
+    def warning(self, message, *args):
+        if WARNING >= self.level:
+            self._log(WARNING, message, args)
+    
+    def error(self, message, *args):
+        if ERROR >= self.level:
+            self._log(ERROR, message, args)
+    
+    def _log(self, level, message, args):
+        if self.rate_limit and level < WARNING and not self._take_token():
+            self.suppressed += 1
+            return
+        if self.suppressed:
+            _buffer.append(("[%s] пропущено сообщений: %d", (self.category, self.suppressed)))
+            self.suppressed = 0
+        _buffer.append((message, args))
+        _ensure_writer()
+        if level >= WARNING:
+            _wakeup.set()
+    
+    def _take_token(self):
+        """Корзина токенов: не больше rate_limit сообщений в секунду"""
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._last_refill) * self.rate_limit)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+def get_logger(category):
+    """Журнал категории (создаётся при первом обращении)"""
+    logger = _loggers.get(category)
+    if logger is None:
+        logger = _loggers.setdefault(category, Logger(category))
+    return logger
+
+
+def set_level(level, category=None):
+    """Сменить уровень категории или (category=None) всех категорий"""
+    value = LEVELS[level]
+    if category is not None:
+        get_logger(category).level = value
+        return
+    global _default_level
+    _default_level = value
+    for logger in _loggers.values():
+        logger.level = value
+
+
+def _format(message, args):
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return f"{message} {args!r}"
+
+
+def flush():
+    """Вывести всё накопленное (вызывается потоком вывода и при выходе)"""
+    with _write_lock:
+        lines = []
+        while _buffer:
+            lines.append(_format(*_buffer.popleft()))
+        if lines:
+            stream = sys.stdout
+            stream.write('\n'.join(lines) + '\n')
+            stream.flush()
+
+
+def _writer_loop():
+    while True:
+        _wakeup.wait(LOG_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            # stdout закрыт или недоступен - сообщения просто теряются
+            _buffer.clear()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _write_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_writer_loop, daemon=True)
+                _writer.start()
+
+
+atexit.register(flush)
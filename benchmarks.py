@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки горячих путей приложения
+
+Запуск:
+    python benchmarks.py hit-test
+    python benchmarks.py multi-device --counts 1 2 4 8 16
+    python benchmarks.py startup --runs 10 --discovery-delay 0.5
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from config import CANVAS_WIDTH, CANVAS_HEIGHT, REFERENCE_SIZE
+
+
+def _synthetic_picture(count, seed=0):
+    """Рисунок из count случайных кругов и прямоугольников"""
+    from drawings import Picture
+    
+    rng = random.Random(seed)
+    # Размер частей уменьшается с их количеством, как на детальных раскрасках
+    size = max(2.0, REFERENCE_SIZE / (count ** 0.5))
+    figures = []
+    for i in range(count):
+        x = rng.uniform(0, REFERENCE_SIZE - size)
+        y = rng.uniform(0, REFERENCE_SIZE - size)
+        if i % 2:
+            figures.append({'name': f'part{i}', 'shape': 'circle', 'color': 'RED',
+                            'center': [x + size / 2, y + size / 2], 'radius': size / 2})
+        else:
+            figures.append({'name': f'part{i}', 'shape': 'rect', 'color': 'BLUE',
+                            'rect': [x, y, size, size]})
+    return Picture(f'synthetic{count}', {'figures': figures})
+
+
+def bench_hit_test(args):
+    """Поиск части под курсором: линейный перебор, сетка и карта регионов"""
+    from config import FIGURE_MAP_MAX_REGIONS
+    from drawings import _hit_primitive
+    from figure_layers import FigureLayers
+    
+    scale_x = CANVAS_WIDTH / REFERENCE_SIZE
+    scale_y = CANVAS_HEIGHT / REFERENCE_SIZE
+    rng = random.Random(1)
+    points = [(rng.randrange(CANVAS_WIDTH), rng.randrange(CANVAS_HEIGHT)) for _ in range(args.lookups)]
+    
+    def linear(compiled, x, y):
+        for name, shape, scaled in compiled.hit_order:
+            if _hit_primitive(shape, scaled, x, y):
+                return name
+        return None
+    
+    print(f"приложение ищет по сетке рисунки крупнее {FIGURE_MAP_MAX_REGIONS} частей")
+    print(f"{'частей':>8} {'перебор, мкс':>14} {'сетка, мкс':>12} {'карта, мкс':>12} "
+          f"{'сборка сетки, мс':>18} {'сборка масок, мс':>18} {'сборка карты, мс':>18}")
+    for count in args.counts:
+        picture = _synthetic_picture(count)
+        compiled = picture.compile(scale_x, scale_y)
+        
+        start = time.perf_counter()
+        compiled.index
+        build_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        expected = [linear(compiled, x, y) for x, y in points]
+        linear_us = (time.perf_counter() - start) / len(points) * 1e6
+        
+        start = time.perf_counter()
+        found = [compiled.figure_at(x, y) for x, y in points]
+        grid_us = (time.perf_counter() - start) / len(points) * 1e6
+        assert found == expected, "сетка и перебор дали разные результаты"
+        
+        map_us = masks_ms = map_ms = float('nan')
+        if count <= args.max_map_regions:
+            start = time.perf_counter()
+            layers = FigureLayers(picture, (CANVAS_WIDTH, CANVAS_HEIGHT))
+            masks_ms = (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            layers.region_map
+            map_ms = (time.perf_counter() - start) * 1000
+            
+            start = time.perf_counter()
+            for x, y in points:
+                layers.figure_at(x, y)
+            map_us = (time.perf_counter() - start) / len(points) * 1e6
+        
+        print(f"{count:>8} {linear_us:>14.2f} {grid_us:>12.2f} {map_us:>12.2f} "
+              f"{build_ms:>18.2f} {masks_ms:>18.2f} {map_ms:>18.2f}")
+
+
+def _drain_for(sources, duration):
+    """Разбирать очереди источников с частотой кадров, вернуть число записей"""
+    received = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for source in sources:
+            received += len(source.get_batch())
+        time.sleep(1 / 60)
+    return received
+
+
+def bench_multi_device(args):
+    """CPU на приём от N плат: один поток selectors против потока на плату"""
+    import app_log
+    from device_mux import DeviceMultiplexer
+    from serial_handler import SerialHandler
+    from simulator import JoystickSimulator, _thread_cpu_seconds
+    
+    app_log.set_level('warning')
+    print("mux - один поток selectors на все платы, потоки - SerialHandler на каждую плату")
+    print(f"{'плат':>6} {'mux, отсч./с':>14} {'mux, CPU %':>12} {'потоки, отсч./с':>17} {'потоки, CPU %':>15}")
+    for count in args.counts:
+        simulators = [JoystickSimulator(rate=args.rate, binary_capable=args.binary, seed=i)
+                      for i in range(count)]
+        for simulator in simulators:
+            simulator.open()
+            simulator.start()
+        ports = [simulator.path for simulator in simulators]
+        
+        # Один поток на все платы
+        mux = DeviceMultiplexer(ports=ports)
+        mux.find_and_connect()
+        mux.start_reading()
+        cpu_start = _thread_cpu_seconds(mux.serial_thread.native_id)
+        mux_received = _drain_for([mux], args.duration)
+        mux_cpu = _thread_cpu_seconds(mux.serial_thread.native_id) - cpu_start
+        mux.close()
+        
+        # Поток SerialHandler на каждую плату
+        handlers = [SerialHandler(port=port) for port in ports]
+        for handler in handlers:
+            handler.auto_reconnect = False
+            handler.find_and_connect()
+            handler.start_reading()
+        thread_ids = [handler.serial_thread.native_id for handler in handlers]
+        cpu_start = sum(_thread_cpu_seconds(native_id) for native_id in thread_ids)
+        threads_received = _drain_for(handlers, args.duration)
+        threads_cpu = sum(_thread_cpu_seconds(native_id) for native_id in thread_ids) - cpu_start
+        for handler in handlers:
+            handler.close()
+        
+        for simulator in simulators:
+            simulator.close()
+        app_log.flush()
+        print(f"{count:>6} {mux_received / args.duration:>14.0f} {mux_cpu / args.duration * 100:>12.1f} "
+              f"{threads_received / args.duration:>17.0f} {threads_cpu / args.duration * 100:>15.1f}")
+
+
+class _DelayedSource:
+    """Источник без данных, поиск которого занимает delay секунд"""
+    
+    def __init__(self, delay):
+        self.delay = delay
+        self.connected_at = None
+    
+    def find_and_connect(self):
+        time.sleep(self.delay)
+        self.connected_at = time.time()
+        return True
+    
+    def start_reading(self):
+        pass
+    
+    def get_batches(self):
+        return []
+    
+    def wait_batches(self, timeout):
+        time.sleep(timeout)
+        return []
+    
+    def close(self):
+        pass
+
+
+def _startup_child(args):
+    """Один холодный запуск: времена от создания процесса, мс (JSON в файл PAINT_BENCH_RESULT)"""
+    spawned = float(os.environ['PAINT_BENCH_SPAWNED'])
+    started = time.time()
+    from paint_app import PaintApp
+    import pygame
+    imported = time.time()
+    
+    source = _DelayedSource(args.discovery_delay)
+    app = PaintApp(source)
+    app.latency = None
+    created = time.time()
+    # Закрыть окно сразу после первого кадра
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+    wall_offset = time.time() - time.monotonic()
+    try:
+        app.run()
+    except SystemExit:
+        pass
+    
+    def ms(moment):
+        return round((moment - spawned) * 1000, 1)
+    
+    # Не в stdout: туда же пишут сообщения приложения (и после выхода из run)
+    with open(os.environ['PAINT_BENCH_RESULT'], 'w', encoding='utf-8') as f:
+        json.dump({'interpreter': ms(started), 'import': round((imported - started) * 1000, 1),
+                   'init': round((created - imported) * 1000, 1),
+                   'first_frame': ms(app.first_frame_at + wall_offset),
+                   'connected': ms(source.connected_at)}, f)
+
+
+def bench_startup(args):
+    """Холодный запуск: импорт, создание окна и первый кадр в новом процессе"""
+    if args.child:
+        _startup_child(args)
+        return
+    
+    command = [sys.executable, os.path.abspath(__file__), 'startup', '--child',
+               '--discovery-delay', str(args.discovery_delay)]
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, 'startup.json')
+        for _ in range(args.runs):
+            env = dict(os.environ, PAINT_BENCH_SPAWNED=repr(time.time()), PAINT_BENCH_RESULT=result_path)
+            subprocess.run(command, env=env, capture_output=True, check=True)
+            with open(result_path, encoding='utf-8') as f:
+                runs.append(json.load(f))
+    
+    print(f"Запусков: {args.runs}, поиск платы: {args.discovery_delay * 1000:.0f} мс "
+          f"(от создания процесса, медиана / максимум, мс)")
+    labels = (('interpreter', 'запуск Python'), ('import', 'импорт paint_app'),
+              ('init', 'PaintApp()'), ('first_frame', 'первый кадр'), ('connected', 'подключение'))
+    for key, label in labels:
+        values = [run[key] for run in runs]
+        print(f"{label:>18} {statistics.median(values):>9.1f} {max(values):>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки Paint Receiver")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    hit_test = commands.add_parser('hit-test', help=bench_hit_test.__doc__)
+    hit_test.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    hit_test.add_argument('--lookups', type=int, default=20000)
+    hit_test.add_argument('--max-map-regions', type=int, default=10000,
+                          help="не строить карту регионов для рисунков крупнее")
+    hit_test.set_defaults(func=bench_hit_test)
+    
+    multi_device = commands.add_parser('multi-device', help=bench_multi_device.__doc__)
+    multi_device.add_argument('--counts', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    multi_device.add_argument('--rate', type=float, default=200.0, help="отсчётов в секунду с каждой платы")
+    multi_device.add_argument('--duration', type=float, default=3.0, help="длительность замера, с")
+    multi_device.add_argument('--binary', action='store_true', help="бинарный протокол")
+    multi_device.set_defaults(func=bench_multi_device)
+    
+    startup = commands.add_parser('startup', help=bench_startup.__doc__)
+    startup.add_argument('--runs', type=int, default=10)
+    startup.add_argument('--discovery-delay', type=float, default=0.5,
+                         help="сколько длится поиск платы, с")
+    startup.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    startup.set_defaults(func=bench_startup)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сохранение раскрасок в галерею (PNG и миниатюра) в фоне
+
+Кадр только копирует пиксели canvas (pygame.image.tobytes) и кладёт
+задание в ограниченную очередь; сжатие PNG и уменьшение выполняют процессы
+пула, поэтому отрисовка их не ждёт. Рядом с картинкой сохраняется JSON с
+названием рисунка и заливками - по нему пакетный режим перерисовывает
+галерею без окна сразу на всех ядрах (например, в другом размере):
+
+    python canvas_export.py ~/paint_gallery/*.json --size 1200
+    python canvas_export.py ~/.paint_receiver_state.journal --out gallery/
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Процессы пула импортируют этот модуль заново - без приветствия pygame
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from app_log import get_logger
+from config import (CANVAS_WIDTH, CANVAS_HEIGHT, EXPORT_DIR, EXPORT_THUMBNAIL_SIZE,
+                    EXPORT_WORKERS, EXPORT_QUEUE_CAPACITY)
+
+log = get_logger('export')
+
+# Слои рисунков в процессе пула {(рисунок, размер): FigureLayers}
+_layers = {}
+
+
+def _thumbnail_path(path):
+    return os.path.splitext(path)[0] + '.thumb.png'
+
+
+def _fit(size, bounds):
+    """Размер size, вписанный в bounds с сохранением пропорций"""
+    scale = min(bounds[0] / size[0], bounds[1] / size[1])
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def save_image(surface, path, thumbnail_size=EXPORT_THUMBNAIL_SIZE):
+    """PNG и миниатюра рядом с ним (path.thumb.png)"""
+    pygame.image.save(surface, path)
+    thumbnail = pygame.transform.smoothscale(surface, _fit(surface.get_size(), thumbnail_size))
+    pygame.image.save(thumbnail, _thumbnail_path(path))
+
+
+def figure_layers(picture_type, size=(CANVAS_WIDTH, CANVAS_HEIGHT)):
+    """Слои рисунка в размере size (строятся один раз на процесс)"""
+    from drawings import DRAWINGS
+    from figure_layers import FigureLayers
+    
+    key = (picture_type, size)
+    layers = _layers.get(key)
+    if layers is None:
+        layers = _layers[key] = FigureLayers(DRAWINGS[picture_type], size)
+    return layers
+
+
+def render_state(picture_type, filled_figures, size=(CANVAS_WIDTH, CANVAS_HEIGHT)):
+    """Раскраска picture_type с заливками filled_figures на новом Surface (без окна)"""
+    surface = pygame.Surface(size)
+    filled = {name: tuple(color) for name, color in filled_figures.items()}
+    figure_layers(picture_type, size).compose(surface, filled)
+    return surface
+
+
+def _encode_job(pixels, size, path, state, thumbnail_size):
+    """Задание пула: сохранить скопированные пиксели canvas и состояние"""
+    start = time.perf_counter()
+    save_image(pygame.image.frombytes(pixels, size, 'RGB'), path, thumbnail_size)
+    with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    return path, time.perf_counter() - start
+
+
+def _regenerate_job(source, out_dir, size, thumbnail_size):
+    """Задание пакетного режима: перерисовать состояние из JSON или журнала
+    
+    Возвращает путь PNG или None, если в журнале нет рисунка.
+    """
+    if source.endswith('.json'):
+        with open(source, encoding='utf-8') as f:
+            state = json.load(f)
+        picture_type, filled_figures = state['picture_type'], state['filled_figures']
+    else:
+        from state_journal import read_journal
+        state, _valid_size = read_journal(source)
+        if state is None or state.picture_type is None:
+            return None
+        picture_type, filled_figures = state.picture_type, state.filled_figures
+    
+    name = os.path.splitext(os.path.basename(source))[0] + '.png'
+    path = os.path.join(out_dir or os.path.dirname(source), name)
+    save_image(render_state(picture_type, filled_figures, size), path, thumbnail_size)
+    return path
+
+
+class CanvasExporter:
+    """Очередь сохранения раскрасок и пул процессов-кодировщиков"""
+    
+    def __init__(self, directory=EXPORT_DIR, workers=EXPORT_WORKERS, capacity=EXPORT_QUEUE_CAPACITY,
+                 thumbnail_size=EXPORT_THUMBNAIL_SIZE, on_done=None):
+        """on_done(path) вызывается потоком пула после сохранения"""
+        self.directory = directory
+        self.workers = workers
+        self.thumbnail_size = thumbnail_size
+        self.on_done = on_done
+        # Скопированные кадры, ещё не отданные пулу
+        self._queue = queue.Queue(capacity)
+        # Не больше workers заданий в пуле: остальные ждут в очереди
+        self._slots = threading.Semaphore(workers)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counter = 0
+        
+        # Счётчики
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+    
+    def submit(self, surface, picture_type, filled_figures):
+        """Скопировать canvas и поставить в очередь (главный поток, не блокирует)
+        
+        Возвращает путь будущего PNG или None, если очередь заполнена.
+        """
+        self._counter += 1
+        name = f"{picture_type}-{time.strftime('%Y%m%d-%H%M%S')}-{self._counter}.png"
+        state = {'picture_type': picture_type,
+                 'filled_figures': {figure: list(color) for figure, color in filled_figures.items()}}
+        job = (pygame.image.tobytes(surface, 'RGB'), surface.get_size(),
+               os.path.join(self.directory, name), state)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            log.warning("✗ Очередь сохранения заполнена, раскраска не сохранена")
+            return None
+        self.submitted += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, daemon=True)
+            self._thread.start()
+        return job[2]
+    
+    def _dispatch(self):
+        """Поток раздачи: передаёт задания пулу по мере освобождения процессов"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            log.error("✗ Не удалось создать каталог галереи %s: %s", self.directory, e)
+        # spawn: процессы не наследуют состояние SDL и потоки приложения
+        with ProcessPoolExecutor(self.workers, mp_context=get_context('spawn')) as pool:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                self._slots.acquire()
+                try:
+                    future = pool.submit(_encode_job, *job, self.thumbnail_size)
+                except (RuntimeError, OSError) as e:
+                    # Пул не запустился или сломан: задание теряется, очередь
+                    # продолжает разбираться, чтобы close() не зависал
+                    self._slots.release()
+                    with self._lock:
+                        self.failed += 1
+                    log.error("✗ Ошибка сохранения раскраски: %s", e)
+                    continue
+                future.add_done_callback(self._done)
+    
+    def _done(self, future):
+        self._slots.release()
+        try:
+            path, seconds = future.result()
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.error("✗ Ошибка сохранения раскраски: %s", e)
+            return
+        with self._lock:
+            self.completed += 1
+        log.info("✓ Раскраска сохранена: %s (%.0f мс)", path, seconds * 1000)
+        if self.on_done is not None:
+            self.on_done(path)
+    
+    def close(self):
+        """Дождаться сохранения поставленных раскрасок и остановить пул"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная перерисовка галереи раскрасок")
+    parser.add_argument('sources', nargs='+',
+                        help="состояния .json из галереи или журналы состояния (main.py --journal)")
+    parser.add_argument('--out', metavar='DIR', help="каталог для картинок (по умолчанию рядом с исходными)")
+    parser.add_argument('--size', type=int, default=CANVAS_WIDTH, help="сторона картинки, пикселей")
+    parser.add_argument('--thumbnail', type=int, default=EXPORT_THUMBNAIL_SIZE[0],
+                        help="сторона миниатюры, пикселей")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="процессов")
+    args = parser.parse_args()
+    
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    size = (args.size, args.size * CANVAS_HEIGHT // CANVAS_WIDTH)
+    thumbnail_size = (args.thumbnail, args.thumbnail)
+    
+    start = time.perf_counter()
+    images = errors = 0
+    with ProcessPoolExecutor(args.workers, mp_context=get_context('spawn')) as pool:
+        futures = [(source, pool.submit(_regenerate_job, source, args.out, size, thumbnail_size))
+                   for source in args.sources]
+        for source, future in futures:
+            try:
+                images += future.result() is not None
+            except (OSError, ValueError, KeyError) as e:
+                errors += 1
+                print(f"✗ {source}: {e}")
+    elapsed = time.perf_counter() - start
+    print(f"Картинок: {images}, ошибок: {errors}, {elapsed:.2f} с на {args.workers} процессах")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Оценка раскраски: насколько canvas совпадает с образцом
+
+Образец один раз рисуется в масштабе canvas и в формате его пикселей, а
+каждый пиксель помечается частью рисунка, которой он принадлежит
+(FigureLayers.region_map, без контуров). Совпадение считается NumPy по
+пикселям; после заливки пересчитывается только прямоугольник изменённой
+фигуры, а счётчики частей правятся через bincount - доли миллисекунды на
+заливку при любом размере canvas.
+
+Пакетная оценка сохранённых раскрасок, журналов состояния и сеансов:
+
+    python coloring_score.py ~/paint_gallery/*.json
+    python coloring_score.py session.pslog ~/.paint_receiver_state.journal
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pygame
+
+from config import REFERENCE_SIZE
+from colors import WHITE
+
+
+class ColoringScore:
+    """Совпадение canvas с образцом по частям рисунка"""
+    
+    def __init__(self, drawing_class, layers):
+        self.drawing_class = drawing_class
+        self.layers = layers
+        width, height = layers.region_map.shape
+        
+        # Пиксели контуров не считаются: они одинаковы на canvas и в образце
+        outlines = pygame.surfarray.array_colorkey(layers.outlines) != 0
+        self._labels = np.where(outlines, 0, layers.region_map).astype(np.intp)
+        self._count = len(layers.names)
+        self.totals = np.bincount(self._labels.ravel(), minlength=self._count)
+        self.totals[0] = 0
+        
+        self._reference = None
+        self._match = np.zeros((width, height), dtype=bool)
+        self.matched = np.zeros(self._count, dtype=np.intp)
+    
+    def _build_reference(self, canvas):
+        """Образец в масштабе и формате пикселей canvas (целые числа пикселей)"""
+        width, height = self._labels.shape
+        reference = pygame.Surface((width, height), 0, canvas)
+        reference.fill(WHITE)
+        scale_x = width / REFERENCE_SIZE
+        scale_y = height / REFERENCE_SIZE
+        for name, _shape, _geometry, color in self.drawing_class.figures:
+            self.drawing_class.draw_filled_figure(reference, name, color, scale_x, scale_y)
+        self._reference = pygame.surfarray.array2d(reference)
+    
+    def reset(self, canvas):
+        """Оценить весь canvas заново (после смены картинки)"""
+        if self._reference is None:
+            self._build_reference(canvas)
+        self._match = pygame.surfarray.array2d(canvas) == self._reference
+        self.matched = np.bincount(self._labels[self._match], minlength=self._count)
+        self.matched[0] = 0
+    
+    def update(self, canvas, rect):
+        """Пересчитать область rect canvas (после заливки или очистки фигуры)"""
+        if self._reference is None:
+            self.reset(canvas)
+            return
+        rect = pygame.Rect(rect).clip(canvas.get_rect())
+        if not rect.width or not rect.height:
+            return
+        area = (slice(rect.left, rect.right), slice(rect.top, rect.bottom))
+        match = pygame.surfarray.array2d(canvas.subsurface(rect)) == self._reference[area]
+        labels = self._labels[area]
+        old = self._match[area]
+        self.matched -= np.bincount(labels[old], minlength=self._count)
+        self.matched += np.bincount(labels[match], minlength=self._count)
+        self.matched[0] = 0
+        old[...] = match
+    
+    @property
+    def percent(self):
+        """Доля правильно раскрашенных пикселей, %"""
+        total = int(self.totals.sum())
+        return 100.0 * int(self.matched.sum()) / total if total else 0.0
+    
+    def figure_scores(self):
+        """{часть рисунка: доля совпадающих пикселей 0..1}"""
+        return {name: int(matched) / int(total)
+                for name, matched, total in zip(self.layers.names, self.matched, self.totals)
+                if total}
+
+
+def score_state(picture_type, filled_figures):
+    """Оценка раскраски из сохранённого состояния (без окна)"""
+    from canvas_export import figure_layers, render_state
+    from drawings import DRAWINGS
+    
+    score = ColoringScore(DRAWINGS[picture_type], figure_layers(picture_type))
+    score.reset(render_state(picture_type, filled_figures))
+    return score
+
+
+def _score_session(path):
+    """Воспроизвести сеанс без окна и оценить итоговый canvas"""
+    import contextlib
+    import io
+    from drawings import DRAWINGS
+    from paint_app import PaintApp
+    from session_log import ReplaySource
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        source = ReplaySource(path, realtime=False)
+        app = PaintApp(source)
+        source.find_and_connect()
+        source.start_reading()
+        while not source.exhausted:
+            app.process_input()
+            app.render_frame()
+    picture_type = app._view.picture_type
+    score = app.coloring_score
+    if score is None:
+        score = ColoringScore(DRAWINGS[picture_type], app._get_figure_layers(picture_type))
+        score.reset(app.canvas)
+    return picture_type, score
+
+
+def score_file(path):
+    """(картинка, ColoringScore) для .json галереи, журнала состояния или сеанса .pslog"""
+    if path.endswith('.json'):
+        import json
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        return state['picture_type'], score_state(state['picture_type'], state['filled_figures'])
+    if path.endswith('.pslog'):
+        return _score_session(path)
+    from state_journal import read_journal
+    state, _valid_size = read_journal(path)
+    if state is None or state.picture_type is None:
+        raise ValueError("не журнал состояния")
+    return state.picture_type, score_state(state.picture_type, state.filled_figures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка раскрасок по образцу")
+    parser.add_argument('sources', nargs='+',
+                        help="состояния .json из галереи, журналы состояния или сеансы .pslog")
+    parser.add_argument('--figures', action='store_true', help="вывести оценку каждой части рисунка")
+    args = parser.parse_args()
+    
+    # Сообщения приложения при воспроизведении сеансов не нужны
+    import app_log
+    app_log.set_level('warning')
+    
+    errors = 0
+    for path in args.sources:
+        try:
+            picture_type, score = score_file(path)
+        except (OSError, ValueError, KeyError) as e:
+            errors += 1
+            print(f"✗ {path}: {e}")
+            continue
+        print(f"{os.path.basename(path)}: {picture_type}, точность {score.percent:.1f}%")
+        if args.figures:
+            for name, value in score.figure_scores().items():
+                print(f"    {name}: {value * 100:.1f}%")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    sys.exit(main())
@@ -24,3 +24,7 @@ COLOR_PALETTE = [
     BLACK, RED, GREEN, BLUE, YELLOW, CYAN, MAGENTA, ORANGE, PURPLE, BROWN, PINK, WHITE
 ]
 
+# Цвета курсоров джойстиков (по номеру устройства)
+PLAYER_COLORS = [
+    RED, BLUE, GREEN, MAGENTA, ORANGE, PURPLE, CYAN, BROWN
+]
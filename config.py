@@ -4,8 +4,34 @@
 Конфигурационный файл с настройками приложения
 """
 
+import os
+
 # Настройки COM-порта
 BAUD_RATE = 115200
+SERIAL_PORT = None         # явный порт ('COM4', '/dev/ttyACM0', pty симулятора); None - автопоиск
+SERIAL_READ_TIMEOUT = 0.1  # сек, максимальное время блокировки read()
+SERIAL_MAX_LINE = 256      # байт, защита от потока без перевода строки
+SERIAL_PROTOCOL = 'auto'   # 'auto' - попытаться включить бинарный протокол, 'text' - только текст
+SERIAL_LISTEN_TIMEOUT = 0.25    # сек, ожидание отсчётов платы до запроса протокола (плата шлёт их каждые 50 мс)
+SERIAL_HANDSHAKE_TIMEOUT = 0.3  # сек, ожидание подтверждения бинарного протокола
+SERIAL_PROBE_WORKERS = 16       # портов, проверяемых одновременно при поиске платы
+SERIAL_PORT_CACHE = os.path.join(os.path.expanduser('~'), '.paint_receiver_port.json')
+SERIAL_AUTO_RECONNECT = True    # искать плату заново после обрыва связи (и если её нет при запуске)
+SERIAL_RECONNECT_DELAY = 0.5    # сек, первая пауза между попытками, дальше удваивается
+SERIAL_RECONNECT_MAX_DELAY = 8.0
+SERIAL_SILENCE_TIMEOUT = 3.0    # сек без данных от платы - обрыв связи (0 - не проверять)
+SERIAL_QUEUE_CAPACITY = 128     # записей в очереди приёма, дальше отсчёты сжимаются
+SERIAL_OVERLOAD_POLICY = 'integrate-all'  # 'integrate-all', 'keep-latest' или 'drop-oldest'
+
+# Приём по сети (network_source.py): тот же протокол по TCP и UDP
+NET_HOST = '0.0.0.0'
+NET_PORT = 5005            # один номер для TCP и UDP
+NET_MAX_CLIENTS = 512      # одновременных клиентов, лишние отклоняются
+NET_CLIENT_BUFFER = 4096   # байт, предел буфера чтения на одно соединение
+NET_CLIENT_QUEUE_CAPACITY = 64   # записей в очереди клиента, дальше отсчёты сжимаются
+NET_CLIENT_MAX_BUTTONS = 32      # нажатий в очереди клиента; больше - клиент отключается
+NET_UDP_IDLE_TIMEOUT = 10.0  # сек тишины, после которых UDP-клиент забывается
+NET_UDP_RECEIVE_BUFFER = 4 << 20  # байт, буфер сокета UDP в ядре
 
 # Размеры экрана и элементов
 SCREEN_WIDTH = 1000
@@ -15,9 +41,64 @@ CANVAS_HEIGHT = 600
 REFERENCE_SIZE = 200
 COLOR_PANEL_X = SCREEN_WIDTH - 100
 
+# Перерисовывать только изменившиеся области экрана
+DIRTY_RECT_RENDERING = True
+
+# Рисунки с большим числом частей ищут часть под курсором по сетке
+# (spatial_index.py), а не по карте регионов figure_layers.py
+FIGURE_MAP_MAX_REGIONS = 1000
+
+# Обрабатывать данные платы в отдельном потоке по мере прихода отсчётов,
+# а не раз в кадр; отрисовка берёт последний снимок состояния
+INPUT_THREAD = True
+INPUT_WAIT_TIMEOUT = 0.1   # сек, максимальное ожидание данных потоком ввода
+
+# Кадры (см. frame_pacer.py): кадр рисуется только после изменений, без
+# них главный цикл спит до прихода данных или события окна
+FRAME_PACING = True          # False - цикл с постоянной частотой FRAME_RATE
+FRAME_RATE = 60              # кадров/с, не чаще
+FRAME_RATE_ACTIVE = 120      # кадров/с, пока курсор движется
+FRAME_ACTIVE_TIME = 0.25     # сек после движения курсора с частотой FRAME_RATE_ACTIVE
+FRAME_IDLE_TIMEOUT = 0.5     # сек, наибольший сон без изменений (проверка источника)
+FRAME_IDLE_POLL = 0.02       # сек ожидания данных за раз без потока ввода
+
+# Журнал состояния рисунка (см. state_journal.py): после перезапуска
+# восстанавливаются картинка, заливки и выбранные цвета. None - не вести
+STATE_JOURNAL_PATH = os.path.join(os.path.expanduser('~'), '.paint_receiver_state.journal')
+STATE_JOURNAL_COMPACT_EVERY = 1000  # действий, после которых журнал сжимается в снимок
+STATE_JOURNAL_FSYNC = True          # сбрасывать записи на диск (поток записи, не кадр)
+
+# Глубина истории отмены (кнопка джойстика, Ctrl+Z) и повтора (Ctrl+Y),
+# см. undo_history.py
+UNDO_DEPTH = 256
+
+# Галерея раскрасок (см. canvas_export.py): PNG, миниатюра и состояние
+# сохраняются по Ctrl+S и когда залиты все части рисунка. None - не сохранять
+EXPORT_DIR = os.path.join(os.path.expanduser('~'), 'paint_gallery')
+EXPORT_THUMBNAIL_SIZE = (150, 150)
+EXPORT_WORKERS = 2          # процессов сжатия PNG
+EXPORT_QUEUE_CAPACITY = 4   # скопированных кадров в очереди, лишние не сохраняются
+
+# Показывать совпадение раскраски с образцом в процентах (см. coloring_score.py)
+ACCURACY_SCORE = True
+
+# Гистограммы задержек от приёма строки до кадра на экране (см. latency.py)
+LATENCY_TRACKING = True
+
+# Прозрачный цвет (colorkey) служебных слоёв: окно под canvas в слое
+# интерфейса, фон слоя контуров и масок фигур. Не должен встречаться в рисунках
+LAYER_COLORKEY = (1, 2, 3)
+
 # Режим отладки
 DEBUG_MODE = True
 
+# Журнал сообщений (см. app_log.py): уровни 'debug', 'info', 'warning', 'error', 'off'
+LOG_LEVEL = 'debug' if DEBUG_MODE else 'info'
+LOG_CATEGORY_LEVELS = {}   # уровни отдельных категорий, например {'uart': 'info'}
+LOG_RATE_LIMIT = 50        # сообщений debug/info в секунду на категорию, 0 - без ограничения
+LOG_BUFFER_SIZE = 4096     # сообщений в кольцевом буфере, при переполнении теряются старые
+LOG_FLUSH_INTERVAL = 0.1   # сек, период вывода буфера
+
 # Калибровка джойстика (значения по умолчанию)
 JOY_X_MIN = 0
 JOY_X_MAX = 4095
@@ -29,3 +110,17 @@ JOY_DEAD_ZONE = 100
 JOY_SPEED_DIVIDER = 100.0
 JOY_MAX_SPEED = 10.0
 
+# Фильтр отсчётов джойстика (см. joystick_filter.py). Скорости выше заданы
+# в пикселях за отсчёт при номинальной частоте платы JOY_SAMPLE_RATE, а
+# курсор движется по настоящему времени между отсчётами
+JOY_SEND_PERIOD_MS = 50            # как UART_SEND_PERIOD_MS в прошивке (Core/Src/main.c)
+JOY_SAMPLE_RATE = 1000.0 / JOY_SEND_PERIOD_MS   # отсчётов в секунду (20)
+JOY_MAX_SAMPLE_INTERVAL = 2.5 / JOY_SAMPLE_RATE  # сек, интервал больше (пауза в данных) не учитывается
+JOY_FILTER = 'ema'                 # 'none', 'ema' или 'one-euro'
+JOY_EMA_TIME = 0.02                # сек, постоянная времени 'ema'
+JOY_ONE_EURO_MIN_CUTOFF = 2.0      # Гц, частота среза 'one-euro' в покое
+JOY_ONE_EURO_BETA = 0.002          # прирост частоты среза на единицу АЦП/с
+JOY_ONE_EURO_D_CUTOFF = 1.0        # Гц, сглаживание производной 'one-euro'
+JOY_CALIBRATION_RADIUS = 150       # отсчёты ближе к центру считаются покоем
+JOY_CALIBRATION_TIME = 5.0         # сек, постоянная времени автокалибровки (0 - выключена)
+
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Приём данных от нескольких плат в одном потоке
+
+Все порты регистрируются в selectors и читаются одним потоком: он спит в
+select(), пока ни на одном порту нет данных, и забирает всё накопленное с
+готовых портов. Каждая пачка помечается номером устройства (по порядку
+подключения), поэтому у каждого джойстика свой курсор, цвет и кнопки.
+
+Интерфейс тот же, что у SerialHandler (find_and_connect, start_reading,
+get_batches, wait_batches, close), но пачки приходят от всех плат.
+Ограничения: только POSIX (select по дескрипторам порта), без записи
+сеанса и без переподключения - отключившаяся плата просто выбывает.
+"""
+
+import os
+import selectors
+import threading
+import time
+
+from app_log import get_logger, DEBUG
+from config import (BAUD_RATE, SERIAL_READ_TIMEOUT, SERIAL_QUEUE_CAPACITY,
+                    SERIAL_OVERLOAD_POLICY)
+from ingest_queue import IngestQueue
+from port_discovery import discover_all, probe_all
+from protocol import BinaryDecoder, TEXT_MODE_REQUEST
+from serial_handler import SerialHandler
+
+log = get_logger('serial')
+uart_log = get_logger('uart')
+
+
+class Device:
+    """Одна плата: порт, разбор потока байт и своя очередь"""
+    
+    def __init__(self, device_id, result):
+        self.device_id = device_id
+        self.port = result.port
+        self.serial_port = result.serial_port
+        self.protocol = result.protocol
+        self.decoder = BinaryDecoder() if result.protocol == 'binary' else None
+        self.buffer = bytearray()
+        # Байты, принятые во время проверки, разбираются первыми
+        self.tail = result.tail
+        self.data_queue = IngestQueue(SERIAL_QUEUE_CAPACITY, SERIAL_OVERLOAD_POLICY)
+    
+    def feed(self, chunk):
+        """Записи из очередного куска потока"""
+        if self.decoder is not None:
+            return self.decoder.feed(chunk)
+        self.buffer += chunk
+        return SerialHandler._split_lines(self.buffer)
+
+
+class DeviceMultiplexer:
+    """Несколько плат на одном потоке чтения"""
+    
+    def __init__(self, ports=None, count=None):
+        """
+        ports - явный список портов (например pty симуляторов)
+        count - сколько плат искать, если ports не задан (None - все)
+        """
+        self.ports = list(ports or [])
+        self.count = count
+        self.devices = []
+        self._selector = None
+        self._data_event = threading.Event()
+        self.serial_thread = None
+        self._running = False
+        # Переподключения нет: без плат приложению ждать нечего
+        self.auto_reconnect = False
+        self.disconnects = 0
+    
+    def find_and_connect(self):
+        """Подключение ко всем платам (порты проверяются параллельно)"""
+        start = time.monotonic()
+        if self.ports:
+            results = []
+            for port, result in zip(self.ports, probe_all(self.ports)):
+                if result is None:
+                    log.error("✗ Не удалось открыть порт %s", port)
+                else:
+                    results.append(result)
+        else:
+            log.info("Поиск плат...")
+            results = discover_all(self.count)
+        if not results:
+            log.error("\n✗ Не удалось найти ни одной платы")
+            log.error("Проверьте подключение устройств и попробуйте снова")
+            return False
+        
+        for result in results:
+            device = Device(len(self.devices), result)
+            self.devices.append(device)
+            log.info("✓ Устройство %s: порт %s на %s бод, протокол %s",
+                     device.device_id, device.port, BAUD_RATE, device.protocol)
+        log.info("Подключено плат: %s (поиск %.2f с)", len(self.devices), time.monotonic() - start)
+        return True
+    
+    def start_reading(self):
+        """Запуск общего потока чтения"""
+        if not self.devices or self._running:
+            return
+        self._selector = selectors.DefaultSelector()
+        for device in self.devices:
+            self._selector.register(device.serial_port.fileno(), selectors.EVENT_READ, device)
+        self._running = True
+        self.serial_thread = threading.Thread(target=self._read_thread, daemon=True)
+        self.serial_thread.start()
+    
+    def _read_thread(self):
+        """Ожидание данных сразу на всех портах"""
+        for device in self.devices:
+            if device.tail:
+                self._deliver(device, device.tail)
+                device.tail = b''
+        
+        while self._running and self._selector.get_map():
+            try:
+                events = self._selector.select(SERIAL_READ_TIMEOUT)
+            except OSError as e:
+                log.error("Ошибка чтения: %s", e)
+                break
+            for key, _mask in events:
+                device = key.data
+                try:
+                    chunk = os.read(key.fd, 4096)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    chunk = b''
+                    log.debug("[DEBUG] Ошибка порта %s: %s", device.port, e)
+                if not chunk:
+                    self._drop(device)
+                    continue
+                self._deliver(device, chunk)
+    
+    def _deliver(self, device, chunk):
+        items = device.feed(chunk)
+        if not items:
+            return
+        if uart_log.enabled(DEBUG):
+            for item in items:
+                uart_log.debug("[UART %s] Получено: %s", device.device_id, item)
+        device.data_queue.put(time.monotonic(), items)
+        self._data_event.set()
+    
+    def _drop(self, device):
+        """Порт закрылся (плата отключена): убрать устройство из опроса"""
+        self._selector.unregister(device.serial_port.fileno())
+        try:
+            device.serial_port.close()
+        except Exception:
+            pass
+        self.disconnects += 1
+        log.warning("✗ Устройство %s (%s) отключено", device.device_id, device.port)
+    
+    @property
+    def connected(self):
+        return any(device.serial_port.is_open for device in self.devices)
+    
+    def get_batch(self):
+        """Все накопленные записи всех плат одним списком"""
+        lines = []
+        for _received_at, items, _device_id in self.get_batches():
+            lines.extend(items)
+        return lines
+    
+    def get_batches(self):
+        """Все накопленные пачки: список (время приёма, записи, номер устройства)"""
+        batches = []
+        for device in self.devices:
+            for received_at, items in device.data_queue.get_all():
+                batches.append((received_at, items, device.device_id))
+        if len(self.devices) > 1:
+            batches.sort(key=lambda batch: batch[0])
+        return batches
+    
+    def wait_batches(self, timeout):
+        """Как get_batches(), но ждёт первую пачку не дольше timeout секунд"""
+        self._data_event.wait(timeout)
+        self._data_event.clear()
+        return self.get_batches()
+    
+    def close(self):
+        """Остановить поток и закрыть все порты"""
+        self._running = False
+        if self.serial_thread and self.serial_thread is not threading.current_thread():
+            self.serial_thread.join(timeout=1.0)
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        for device in self.devices:
+            queue = device.data_queue
+            if queue.coalesced or queue.dropped or queue.dropped_buttons:
+                log.info("Очередь устройства %s (%s): принято %s, объединено %s, выброшено %s, кнопок %s",
+                         device.device_id, queue.policy, queue.enqueued, queue.coalesced, queue.dropped,
+                         queue.dropped_buttons)
+            if not device.serial_port.is_open:
+                continue
+            if device.protocol == 'binary':
+                # Возвращаем плату в текстовый режим по умолчанию
+                try:
+                    device.serial_port.write(TEXT_MODE_REQUEST)
+                except Exception:
+                    pass
+            device.serial_port.close()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Кэш растеризованных фигур рисунка для инкрементальной заливки
+"""
+
+import numpy as np
+import pygame
+from config import REFERENCE_SIZE, LAYER_COLORKEY
+from colors import BLACK, WHITE
+
+
+class FigureLayers:
+    """Маски фигур и слой контуров одного рисунка в масштабе canvas
+    
+    Каждая фигура растеризуется один раз в маску размером со свой
+    ограничивающий прямоугольник. Заливка или очистка фигуры
+    пересобирает только этот прямоугольник: белый фон, залитые фигуры,
+    которые его задевают, и контуры поверх.
+    
+    Карта регионов region_map[x, y] - номер фигуры под пикселем (0 - фона,
+    иначе индекс в names) - собирается из масок при первом обращении. При
+    перекрытии побеждает фигура, стоящая раньше в FIGURES, как и в
+    get_figure_at. Рисункам с числом частей больше FIGURE_MAP_MAX_REGIONS
+    она для поиска под курсором не нужна (см. PaintApp.get_figure_at_position).
+    """
+    
+    def __init__(self, drawing_class, size):
+        width, height = size
+        scale_x = width / REFERENCE_SIZE
+        scale_y = height / REFERENCE_SIZE
+        
+        self.size = size
+        self.masks = {}
+        self.rects = {}
+        
+        figures = drawing_class.FIGURES
+        self.names = (None,) + tuple(figures)
+        self._region_map = None
+        
+        temp = pygame.Surface(size)
+        temp.fill(BLACK)
+        for name in figures:
+            rect = drawing_class.draw_filled_figure(temp, name, WHITE, scale_x, scale_y)
+            rect = rect.clip(temp.get_rect())
+            self.masks[name] = pygame.mask.from_threshold(temp.subsurface(rect), WHITE, (1, 1, 1, 255))
+            self.rects[name] = rect
+            # Очищается только нарисованное: заливка всего temp на каждую
+            # фигуру занимала почти всё время сборки детальных рисунков
+            temp.fill(BLACK, rect)
+        
+        # Контуры - отдельный слой с прозрачным фоном
+        self.outlines = pygame.Surface(size)
+        self.outlines.fill(LAYER_COLORKEY)
+        drawing_class.draw_outlines(self.outlines, scale_x, scale_y)
+        self.outlines.set_colorkey(LAYER_COLORKEY, pygame.RLEACCEL)
+        
+        # Маски, окрашенные в текущий цвет заливки {имя: (цвет, Surface)}
+        self._tinted = {}
+    
+    @property
+    def region_map(self):
+        """Карта регионов (собирается из масок при первом обращении)"""
+        if self._region_map is None:
+            dtype = np.uint8 if len(self.names) <= 256 else np.uint16
+            region_map = np.zeros(self.size, dtype=dtype)
+            # С конца списка, чтобы фигуры с высоким приоритетом легли сверху
+            for index in range(len(self.names) - 1, 0, -1):
+                name = self.names[index]
+                rect = self.rects[name]
+                if rect.width and rect.height:
+                    inside = pygame.surfarray.array_red(self.masks[name].to_surface()) != 0
+                    region_map[rect.left:rect.right, rect.top:rect.bottom][inside] = index
+            self._region_map = region_map
+        return self._region_map
+    
+    def figure_at(self, x, y):
+        """Фигура в точке (x, y) canvas или None"""
+        width, height = self.region_map.shape
+        if 0 <= x < width and 0 <= y < height:
+            return self.names[self.region_map[int(x), int(y)]]
+        return None
+    
+    def figures_at(self, points):
+        """Фигуры для набора точек [(x, y), ...] одним обращением к карте"""
+        points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+        xs, ys = points[:, 0], points[:, 1]
+        width, height = self.region_map.shape
+        valid = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        
+        ids = np.zeros(len(points), dtype=self.region_map.dtype)
+        ids[valid] = self.region_map[xs[valid], ys[valid]]
+        return [self.names[i] for i in ids.tolist()]
+    
+    def _tinted_surface(self, name, color):
+        """Маска фигуры, окрашенная в color (пересоздаётся при смене цвета)"""
+        cached = self._tinted.get(name)
+        if cached is not None and cached[0] == color:
+            return cached[1]
+        
+        surface = pygame.Surface(self.rects[name].size)
+        self.masks[name].to_surface(surface, setcolor=color, unsetcolor=LAYER_COLORKEY)
+        surface.set_colorkey(LAYER_COLORKEY, pygame.RLEACCEL)
+        self._tinted[name] = (color, surface)
+        return surface
+    
+    def compose(self, canvas, filled_figures, rect=None):
+        """Пересобрать область rect на canvas (весь canvas, если rect не задан)
+        
+        Фигуры накладываются в порядке filled_figures, как и при полной
+        перерисовке, поэтому результат в области совпадает попиксельно.
+        """
+        if rect is None:
+            rect = canvas.get_rect()
+        
+        canvas.set_clip(rect)
+        canvas.fill(WHITE)
+        for name, color in filled_figures.items():
+            figure_rect = self.rects.get(name)
+            if figure_rect is not None and figure_rect.colliderect(rect):
+                canvas.blit(self._tinted_surface(name, color), figure_rect)
+        canvas.blit(self.outlines, rect, rect)
+        canvas.set_clip(None)
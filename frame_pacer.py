@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Частота кадров главного цикла и счётчики кадров
+
+Кадр рисуется только после изменений (курсор, заливка, цвет, событие
+окна); без них главный поток спит до прихода данных или события окна, а
+не перерисовывает одно и то же 60 раз в секунду. Пока курсор движется и
+ещё FRAME_ACTIVE_TIME после этого, кадры идут с частотой FRAME_RATE_ACTIVE,
+иначе не чаще FRAME_RATE.
+
+FramePacer только считает: когда можно рисовать следующий кадр и сколько
+кадров было нарисовано и пропущено; ждёт сам PaintApp.wait_frame().
+"""
+
+import time
+
+from config import FRAME_RATE, FRAME_RATE_ACTIVE, FRAME_ACTIVE_TIME
+
+
+class FramePacer:
+    """Ограничение частоты кадров и счётчики нарисованных и пустых кадров"""
+    
+    def __init__(self, rate=FRAME_RATE, active_rate=FRAME_RATE_ACTIVE, active_time=FRAME_ACTIVE_TIME):
+        self.rate = rate
+        self.active_rate = active_rate
+        self.active_time = active_time
+        self.started = time.monotonic()
+        # Время последнего нарисованного кадра и конец повышенной частоты
+        self._frame_at = None
+        self._active_until = 0.0
+        
+        # Счётчики
+        self.frames = 0          # нарисованные кадры
+        self.moving_frames = 0   # из них с движением курсора
+        self.idle_frames = 0     # пробуждения, после которых рисовать было нечего
+        self.idle_time = 0.0     # сек в ожидании изменений
+    
+    def frame(self, drawn, moving, now):
+        """Учесть кадр: drawn - что-то нарисовано, moving - сдвинулся курсор"""
+        if not drawn:
+            self.idle_frames += 1
+            return
+        self.frames += 1
+        self._frame_at = now
+        if moving:
+            self.moving_frames += 1
+            self._active_until = now + self.active_time
+    
+    def delay(self, now):
+        """Сколько ещё ждать до следующего кадра, сек (0 и меньше - можно рисовать)"""
+        if self._frame_at is None:
+            return 0.0
+        rate = self.active_rate if now < self._active_until else self.rate
+        return self._frame_at + 1.0 / rate - now
+    
+    def idle(self, seconds):
+        """Учесть ожидание изменений"""
+        self.idle_time += seconds
+    
+    def summary(self):
+        """Счётчики и доля времени в ожидании"""
+        elapsed = time.monotonic() - self.started
+        return {'frames': self.frames, 'moving_frames': self.moving_frames,
+                'idle_frames': self.idle_frames,
+                'idle_share': self.idle_time / elapsed if elapsed > 0 else 0.0}
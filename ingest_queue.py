@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ограниченная очередь приёма данных платы
+
+Очередь хранит пачки (время приёма, записи), как их кладёт поток чтения.
+Если записей становится больше capacity, отсчёты джойстика сжимаются по
+выбранной политике; нажатия кнопок (BTN:... и бинарные кадры с битами
+кнопок) не теряются никогда и сохраняют порядок относительно отсчётов:
+    drop-oldest   - выбросить самые старые отсчёты
+    keep-latest   - из каждой серии отсчётов между кнопками оставить последний
+    integrate-all - серию отсчётов заменить одной записью CoalescedSample
+                    со средним отклонением и числом отсчётов, чтобы курсор
+                    прошёл примерно тот же путь, но за один шаг
+
+Кнопок в очереди не больше button_capacity: сверх него новые нажатия
+отбрасываются (dropped_buttons), иначе поток кнопок без отсчётов растил бы
+очередь без ограничения. Если сжимать нечего (одни кнопки и одиночные
+отсчёты между ними), очередь не пересматривается при каждой записи.
+"""
+
+import threading
+from collections import deque, namedtuple
+
+from protocol import FLAG_SAMPLE, TEXT_SAMPLE_RE
+
+POLICIES = ('drop-oldest', 'keep-latest', 'integrate-all')
+
+# Серия отсчётов, объединённая политикой integrate-all
+CoalescedSample = namedtuple('CoalescedSample', 'x y count')
+
+# Запись-отметка в пачке устройства: оно отключилось, и его джойстик больше
+# не нужен (номер может достаться следующему клиенту сети). Это не строка и
+# не кортеж, поэтому клиент не может прислать её сам
+DEVICE_RELEASED = object()
+
+
+def is_button(item):
+    """Запись с нажатием кнопки (её нельзя выбрасывать или объединять)"""
+    if isinstance(item, str):
+        return item.startswith("BTN:")
+    return not isinstance(item, CoalescedSample) and bool(item[2] & ~FLAG_SAMPLE)
+
+
+def _sample_values(item):
+    """(x, y, количество отсчётов) для записи-отсчёта или None"""
+    if isinstance(item, CoalescedSample):
+        return item
+    if isinstance(item, tuple):
+        return item[0], item[1], 1
+    match = TEXT_SAMPLE_RE.match(item)
+    if match:
+        return int(match.group(1)), int(match.group(2)), 1
+    return None
+
+
+class IngestQueue:
+    """Потокобезопасная очередь пачек с ограничением по числу записей"""
+    
+    def __init__(self, capacity=128, policy='integrate-all', button_capacity=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.button_capacity = capacity if button_capacity is None else button_capacity
+        self._batches = deque()
+        self._size = 0
+        self._buttons = 0
+        # Отсчёты, стоящие сразу за другим отсчётом (их можно объединить),
+        # и последняя запись очереди - отсчёт
+        self._mergeable = 0
+        self._last_sample = False
+        self._condition = threading.Condition()
+        
+        # Счётчики записей
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.dropped_buttons = 0
+        self.max_size = 0
+    
+    def put(self, received_at, items):
+        """Добавить пачку, принятую в received_at"""
+        with self._condition:
+            self.enqueued += len(items)
+            room = self.button_capacity - self._buttons
+            kept = []
+            for item in items:
+                if is_button(item):
+                    if room <= 0:
+                        self.dropped_buttons += 1
+                        continue
+                    room -= 1
+                    self._last_sample = False
+                else:
+                    self._mergeable += self._last_sample
+                    self._last_sample = True
+                kept.append(item)
+            if not kept:
+                return
+            self._batches.append((received_at, kept))
+            self._size += len(kept)
+            self._buttons = self.button_capacity - room
+            # Наибольший размер - до сжатия, сколько записей действительно пришло
+            self.max_size = max(self.max_size, self._size)
+            if self._size > self.capacity and self._can_shrink():
+                self._shrink()
+            self._condition.notify()
+    
+    def _can_shrink(self):
+        """Есть ли отсчёты, которые политика может выбросить или объединить"""
+        if self.policy == 'drop-oldest':
+            return self._size > self._buttons
+        return self._mergeable > 0
+    
+    def _shrink(self):
+        """Сжать отсчёты по политике (вызывается под блокировкой)"""
+        if self.policy == 'drop-oldest':
+            self._drop_oldest(self._size - self.capacity)
+            return
+        
+        received_at = self._batches[0][0]
+        kept = []
+        run = []
+        for _, batch in self._batches:
+            for item in batch:
+                if is_button(item):
+                    kept.extend(self._merge_run(run))
+                    run = []
+                    kept.append(item)
+                else:
+                    run.append(item)
+        kept.extend(self._merge_run(run))
+        
+        # После сжатия все записи - одна пачка со временем самой старой
+        self._batches = deque([(received_at, kept)])
+        self._size = len(kept)
+        self._mergeable = 0
+    
+    def _drop_oldest(self, excess):
+        """Выбросить excess самых старых отсчётов, начиная с первых пачек"""
+        batches = self._batches
+        index = 0
+        emptied = False
+        while excess > 0 and index < len(batches):
+            received_at, batch = batches[index]
+            kept = []
+            for item in batch:
+                if excess > 0 and not is_button(item):
+                    excess -= 1
+                    self.dropped += 1
+                else:
+                    kept.append(item)
+            self._size -= len(batch) - len(kept)
+            batches[index] = (received_at, kept)
+            emptied |= not kept
+            index += 1
+        if emptied:
+            # Пустые пачки остаются и за кнопками в начале очереди
+            self._batches = deque(batch for batch in batches if batch[1])
+    
+    def _merge_run(self, run):
+        """Серия отсчётов между кнопками после сжатия"""
+        if len(run) <= 1:
+            return run
+        if self.policy == 'keep-latest':
+            self.coalesced += len(run) - 1
+            return run[-1:]
+        
+        total_x = total_y = count = 0
+        for item in run:
+            values = _sample_values(item)
+            if values is None:
+                # Испорченная строка - в сумму не входит
+                continue
+            x, y, n = values
+            total_x += x * n
+            total_y += y * n
+            count += n
+        if not count:
+            self.coalesced += len(run)
+            return []
+        self.coalesced += len(run) - 1
+        return [CoalescedSample(round(total_x / count), round(total_y / count), count)]
+    
+    def get_nowait(self):
+        """Самая старая пачка или None"""
+        with self._condition:
+            if not self._batches:
+                return None
+            batch = self._batches.popleft()
+            items = batch[1]
+            self._size -= len(items)
+            previous = False
+            for item in items:
+                sample = not is_button(item)
+                if sample:
+                    self._mergeable -= previous
+                else:
+                    self._buttons -= 1
+                previous = sample
+            if self._batches:
+                # Первая запись следующей пачки больше не стоит за отсчётом
+                following = self._batches[0][1]
+                if previous and following and not is_button(following[0]):
+                    self._mergeable -= 1
+            else:
+                self._last_sample = False
+            return batch
+    
+    def get_all(self):
+        """Все накопленные пачки: список (время приёма, записи)"""
+        with self._condition:
+            batches = list(self._batches)
+            self._batches.clear()
+            self._size = 0
+            self._buttons = 0
+            self._mergeable = 0
+            self._last_sample = False
+            return batches
+    
+    def wait(self, timeout):
+        """Как get_all(), но ждёт первую пачку не дольше timeout секунд"""
+        with self._condition:
+            if not self._batches:
+                self._condition.wait(timeout)
+            return self.get_all()
+    
+    def empty(self):
+        return not self._batches
+    
+    def qsize(self):
+        """Количество записей в очереди"""
+        return self._size
+    
+    def stats(self):
+        return {'enqueued': self.enqueued, 'coalesced': self.coalesced,
+                'dropped': self.dropped, 'dropped_buttons': self.dropped_buttons,
+                'max_size': self.max_size}
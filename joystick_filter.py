@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Фильтр отсчётов джойстика: от сырых значений АЦП к движению курсора
+
+Отсчёты, накопившиеся между кнопками, обрабатываются одним массивом NumPy:
+    1. автокалибровка центра по отсчётам покоя (ручка отпущена)
+    2. сглаживание дрожания: 'ema' или 'one-euro' (частота среза растёт со
+       скоростью ручки, поэтому медленные движения гладкие, а быстрые - без
+       запаздывания), 'none' - без сглаживания
+    3. мёртвая зона и скорость: JOY_SPEED_DIVIDER и JOY_MAX_SPEED заданы в
+       пикселях за отсчёт при номинальной частоте JOY_SAMPLE_RATE
+    4. интегрирование по настоящему времени: скорость умножается на
+       интервал между отсчётами, а не на их число
+
+Интервал берётся из времени прихода пачек и делится поровну между её
+отсчётами, поэтому скорость курсора не зависит от частоты отправки платы.
+Положение хранится с долями пикселя: медленное движение не теряется.
+"""
+
+import math
+
+import numpy as np
+
+from config import (SCREEN_WIDTH, SCREEN_HEIGHT, JOY_X_CENTER, JOY_Y_CENTER, JOY_DEAD_ZONE,
+                    JOY_SPEED_DIVIDER, JOY_MAX_SPEED, JOY_SAMPLE_RATE, JOY_MAX_SAMPLE_INTERVAL,
+                    JOY_FILTER, JOY_EMA_TIME, JOY_ONE_EURO_MIN_CUTOFF, JOY_ONE_EURO_BETA,
+                    JOY_ONE_EURO_D_CUTOFF, JOY_CALIBRATION_RADIUS, JOY_CALIBRATION_TIME)
+
+FILTERS = ('none', 'ema', 'one-euro')
+
+# Рекуррентное сглаживание считается одним выражением по участкам из _CHUNK
+# отсчётов: при alpha не больше _MAX_ALPHA произведение (1 - alpha) на
+# участке не уходит в ноль
+_CHUNK = 32
+_MAX_ALPHA = 0.99
+
+
+def _smooth(values, alphas, start):
+    """Экспоненциальное сглаживание с переменным alpha без цикла по отсчётам
+    
+    y[i] = y[i-1] + alpha[i] * (values[i] - y[i-1]), y[-1] = start;
+    values - (n, 2), alphas - (n,) или (n, 2), start - (2,).
+    """
+    result = np.empty_like(values)
+    alphas = np.minimum(alphas, _MAX_ALPHA)
+    if alphas.ndim == 1:
+        alphas = alphas[:, None]
+    for begin in range(0, len(values), _CHUNK):
+        end = begin + _CHUNK
+        a = alphas[begin:end]
+        # y[i] = keep[i] * (start + sum(a[j] * x[j] / keep[j], j <= i)),
+        # keep[i] = произведение (1 - a[j]) по j <= i
+        keep = np.cumprod(1.0 - a, axis=0)
+        result[begin:end] = keep * (start + np.cumsum(a * values[begin:end] / keep, axis=0))
+        start = result[min(end, len(values)) - 1]
+    return result
+
+
+def _alpha(dts, cutoff):
+    """Коэффициент сглаживания для интервалов dts и частоты среза cutoff, Гц"""
+    return 1.0 - np.exp(-2.0 * math.pi * cutoff * dts)
+
+
+class JoystickFilter:
+    """Состояние фильтра одного джойстика: центр, сглаживание, положение"""
+    
+    def __init__(self, kind=JOY_FILTER, calibrate=JOY_CALIBRATION_TIME > 0):
+        if kind not in FILTERS:
+            raise ValueError(f"Неизвестный фильтр джойстика: {kind}")
+        self.kind = kind
+        self.calibrate = calibrate
+        self.center = np.array([JOY_X_CENTER, JOY_Y_CENTER], dtype=float)
+        self.interval = 1.0 / JOY_SAMPLE_RATE
+        
+        # Сглаженное и предыдущее сырое значение, производная (one-euro)
+        self._smoothed = None
+        self._previous = None
+        self._velocity = np.zeros(2)
+        
+        # Время последнего обработанного отсчёта и положение с долями пикселя
+        self.time = None
+        self._position = None
+    
+    def intervals(self, count, until=None):
+        """Интервалы перед каждым из count отсчётов, последний из которых пришёл в until
+        
+        Без until (отсчёты до кнопки посреди пачки) берётся последний
+        измеренный интервал; время фильтра сдвигается на их сумму. Время до
+        первой пачки неизвестно - на неё целиком приходится один интервал.
+        """
+        if self.time is None:
+            interval = self.interval / count
+        elif until is None:
+            interval = self.interval
+        else:
+            interval = min(max(until - self.time, 0.0) / count, JOY_MAX_SAMPLE_INTERVAL)
+            self.interval = interval or self.interval
+        if until is None:
+            if self.time is not None:
+                self.time += interval * count
+        else:
+            self.time = until
+        return np.full(count, interval)
+    
+    def process(self, samples, dts, cursor):
+        """Новое положение курсора (x, y) после отсчётов samples
+        
+        samples - сырые (x, y) как массив (n, 2), dts - интервалы перед
+        отсчётами (с), cursor - текущее положение курсора в пикселях.
+        """
+        samples = np.asarray(samples, dtype=float)
+        if self._smoothed is None:
+            self._smoothed = samples[0].copy()
+            self._previous = samples[0].copy()
+        
+        if self.calibrate:
+            self._calibrate(samples, dts)
+        values = self._filter(samples, dts)
+        
+        # Мёртвая зона без скачка скорости на её границе
+        deflection = values - self.center
+        magnitude = np.maximum(np.abs(deflection) - JOY_DEAD_ZONE, 0.0)
+        speed = np.minimum(magnitude / JOY_SPEED_DIVIDER, JOY_MAX_SPEED) * JOY_SAMPLE_RATE
+        # Вправо - X растёт; ручка вверх (значение меньше центра) - Y растёт
+        steps = np.sign(deflection) * speed * dts[:, None]
+        steps[:, 1] = -steps[:, 1]
+        return self._integrate(steps, cursor)
+    
+    def _calibrate(self, samples, dts):
+        """Подстроить центр по отсчётам покоя (не дальше JOY_CALIBRATION_RADIUS от центра)"""
+        resting = np.all(np.abs(samples - self.center) < JOY_CALIBRATION_RADIUS, axis=1)
+        if not resting.any():
+            return
+        weight = 1.0 - math.exp(-float(dts[resting].sum()) / JOY_CALIBRATION_TIME)
+        self.center += weight * (samples[resting].mean(axis=0) - self.center)
+    
+    def _filter(self, samples, dts):
+        if self.kind == 'none':
+            return samples
+        if self.kind == 'ema':
+            alphas = 1.0 - np.exp(-dts / JOY_EMA_TIME)
+        else:
+            # One-Euro: производная по сырым отсчётам, сглаженная на
+            # JOY_ONE_EURO_D_CUTOFF, поднимает частоту среза при движении
+            previous = np.vstack((self._previous, samples[:-1]))
+            derivative = (samples - previous) / np.maximum(dts, 1e-6)[:, None]
+            velocity = _smooth(derivative, _alpha(dts, JOY_ONE_EURO_D_CUTOFF), self._velocity)
+            self._velocity = velocity[-1]
+            cutoff = JOY_ONE_EURO_MIN_CUTOFF + JOY_ONE_EURO_BETA * np.abs(velocity)
+            alphas = _alpha(dts[:, None], cutoff)
+        smoothed = _smooth(samples, alphas, self._smoothed)
+        self._smoothed = smoothed[-1]
+        self._previous = samples[-1]
+        return smoothed
+    
+    def _integrate(self, steps, cursor):
+        """Сложить перемещения с учётом границ экрана, вернуть целые (x, y)"""
+        position = self._position
+        if position is None or (int(position[0]), int(position[1])) != tuple(cursor):
+            # Курсор сдвинули снаружи (сброс, восстановление из журнала)
+            position = np.array(cursor, dtype=float)
+        limit = np.array([SCREEN_WIDTH - 1, SCREEN_HEIGHT - 1], dtype=float)
+        
+        path = position + np.cumsum(steps, axis=0)
+        if path.min() >= 0 and (path <= limit).all():
+            position = path[-1]
+        else:
+            # Упёрлись в край: дальше движение от края, а не от точки за ним
+            for step in steps:
+                position = np.clip(position + step, 0.0, limit)
+        self._position = position
+        return int(position[0]), int(position[1])
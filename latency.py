@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Измерение задержки от приёма данных платы до их появления на экране
+
+Этапы (все времена - time.monotonic()):
+    queue  - от приёма строки/кадра в потоке чтения до извлечения из очереди
+    handle - разбор и обработка (parse_data, handle_button, fill_figure)
+    render - от публикации снимка до выгрузки кадра на дисплей
+    total  - от приёма до первого кадра, показавшего результат
+    button - то же, что total, только для пачек с нажатиями кнопок
+"""
+
+import csv
+import json
+import math
+from collections import deque
+
+
+class Histogram:
+    """Гистограмма длительностей с логарифмическими корзинами
+    
+    Память не зависит от числа замеров; перцентили точны до ширины
+    корзины (около 5% значения).
+    """
+    
+    MIN_VALUE = 1e-6          # сек, всё меньшее попадает в первую корзину
+    BUCKETS_PER_DECADE = 50
+    
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, seconds):
+        seconds = max(seconds, 0.0)
+        bucket = int(math.log10(max(seconds, self.MIN_VALUE) / self.MIN_VALUE) * self.BUCKETS_PER_DECADE)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def _bucket_limit(self, bucket):
+        """Верхняя граница корзины, сек"""
+        return self.MIN_VALUE * 10 ** ((bucket + 1) / self.BUCKETS_PER_DECADE)
+    
+    def percentile(self, fraction):
+        """Значение, не меньше которого fraction замеров (верхняя граница корзины)"""
+        if not self.count:
+            return float('nan')
+        rank = math.ceil(self.count * fraction)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._bucket_limit(bucket), self.max)
+        return self.max
+    
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+
+class LatencyTracker:
+    """Гистограммы задержек по этапам от приёма до вывода на экран
+    
+    Поток ввода сообщает о каждой обработанной пачке (input_handled),
+    поток отрисовки - о каждом выведенном снимке (displayed). Пачки
+    ждут в очереди, пока не будет показан снимок, в который они вошли.
+    Пачки, после которых на экране ничего не меняется (ручка в мёртвой
+    зоне), кадра не ждут: у них только этапы queue и handle (input_unchanged).
+    """
+    
+    STAGES = ('queue', 'handle', 'render', 'total', 'button')
+    
+    def __init__(self):
+        self.histograms = {stage: Histogram() for stage in self.STAGES}
+        # (номер снимка, время приёма, время обработки, есть ли кнопки)
+        self._waiting = deque()
+        # Пачки без видимых изменений
+        self.unchanged = 0
+    
+    def record(self, stage, seconds):
+        self.histograms[stage].add(seconds)
+    
+    def input_handled(self, snapshot_seq, received_at, dequeued_at, handled_at, button=False):
+        """Пачка принята в received_at, извлечена в dequeued_at и обработана в handled_at"""
+        self.record('queue', dequeued_at - received_at)
+        self.record('handle', handled_at - dequeued_at)
+        self._waiting.append((snapshot_seq, received_at, handled_at, button))
+    
+    def input_unchanged(self, received_at, dequeued_at, handled_at):
+        """Пачка обработана, но снимок выглядит как прежний - кадра для неё не будет"""
+        self.record('queue', dequeued_at - received_at)
+        self.record('handle', handled_at - dequeued_at)
+        self.unchanged += 1
+    
+    def displayed(self, snapshot_seq, displayed_at):
+        """Снимок snapshot_seq (и все более ранние) выведен на дисплей"""
+        waiting = self._waiting
+        while waiting and waiting[0][0] <= snapshot_seq:
+            _seq, received_at, handled_at, button = waiting.popleft()
+            self.record('render', displayed_at - handled_at)
+            self.record('total', displayed_at - received_at)
+            if button:
+                self.record('button', displayed_at - received_at)
+    
+    def summary(self):
+        """Сводка по этапам: список словарей (времена в миллисекундах)"""
+        rows = []
+        for stage in self.STAGES:
+            histogram = self.histograms[stage]
+            if not histogram.count:
+                rows.append({'stage': stage, 'count': 0, 'mean_ms': None, 'p50_ms': None,
+                             'p95_ms': None, 'p99_ms': None, 'max_ms': None})
+                continue
+            rows.append({
+                'stage': stage,
+                'count': histogram.count,
+                'mean_ms': round(histogram.mean * 1000, 3),
+                'p50_ms': round(histogram.percentile(0.50) * 1000, 3),
+                'p95_ms': round(histogram.percentile(0.95) * 1000, 3),
+                'p99_ms': round(histogram.percentile(0.99) * 1000, 3),
+                'max_ms': round(histogram.max * 1000, 3),
+            })
+        return rows
+    
+    def print_summary(self):
+        print(f"{'этап':>8} {'замеров':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}")
+        for row in self.summary():
+            if row['count']:
+                print(f"{row['stage']:>8} {row['count']:>8} {row['p50_ms']:>9.2f} "
+                      f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}")
+        if self.unchanged:
+            print(f"Пачек без изменений на экране (только queue и handle): {self.unchanged}")
+    
+    def export(self, path):
+        """Сохранить сводку в CSV или JSON (по расширению файла)"""
+        rows = self.summary()
+        if path.lower().endswith('.json'):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, indent=2)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
@@ -7,12 +7,87 @@ Paint Receiver - Программа для приема данных от NUCLEO
 Точка входа в приложение
 """
 
+import argparse
+
 from paint_app import PaintApp
+from config import (SERIAL_PORT, NET_HOST, STATE_JOURNAL_PATH, STATE_JOURNAL_COMPACT_EVERY,
+                    STATE_JOURNAL_FSYNC, EXPORT_DIR)
+from state_journal import StateJournal
+
+
+def _listen_address(value):
+    """Значение --listen: (хост или None, порт)"""
+    host, _, port = value.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        port = -1
+    if not 0 <= port <= 65535:
+        raise argparse.ArgumentTypeError(f"ожидается [HOST:]PORT с портом 0...65535: {value!r}")
+    return host or None, port
 
 
 def main():
     """Главная функция запуска приложения"""
-    app = PaintApp()
+    parser = argparse.ArgumentParser(description="Paint Receiver")
+    parser.add_argument('--port', metavar='PORT',
+                        help="подключиться к заданному порту (например, pty из simulator.py)")
+    parser.add_argument('--ports', metavar='PORT', nargs='+',
+                        help="несколько плат на одном холсте: по курсору на каждую")
+    parser.add_argument('--devices', metavar='N', type=int,
+                        help="найти и подключить N плат (0 - все найденные)")
+    parser.add_argument('--listen', metavar='[HOST:]PORT', type=_listen_address,
+                        help="принимать данные джойстиков по TCP и UDP вместо COM-порта")
+    parser.add_argument('--record', metavar='PATH',
+                        help="записать принятые данные в журнал (см. replay.py)")
+    parser.add_argument('--journal', metavar='PATH', default=STATE_JOURNAL_PATH,
+                        help="журнал состояния рисунка для восстановления после перезапуска")
+    parser.add_argument('--no-journal', action='store_true',
+                        help="не восстанавливать и не сохранять рисунок")
+    parser.add_argument('--gallery', metavar='DIR', default=EXPORT_DIR,
+                        help="каталог для сохранённых раскрасок (Ctrl+S и законченные рисунки)")
+    parser.add_argument('--no-gallery', action='store_true',
+                        help="не сохранять раскраски")
+    parser.add_argument('--latency-report', metavar='PATH',
+                        help="сохранить при выходе задержки по этапам (.csv или .json)")
+    args = parser.parse_args()
+    
+    # Источник данных один: COM-порт, несколько плат или сеть
+    sources = [option for option, value in (('--port', args.port), ('--ports', args.ports),
+                                            ('--devices', args.devices), ('--listen', args.listen))
+               if value is not None]
+    if len(sources) > 1:
+        parser.error(f"{' и '.join(sources)} нельзя задавать вместе")
+    if args.devices is not None and args.devices < 0:
+        parser.error("--devices: число плат не может быть отрицательным")
+    if args.record and sources and sources[0] != '--port':
+        # Запись сеанса есть только у SerialHandler
+        parser.error(f"--record работает только с одной платой, не с {sources[0]}")
+    
+    # Источники импортируются по требованию: asyncio и прочее не
+    # замедляют запуск, если не нужны
+    if args.listen:
+        from network_source import NetworkSource
+        host, port = args.listen
+        source = NetworkSource(host=host or NET_HOST, port=port)
+    elif args.ports or args.devices is not None:
+        # Несколько плат читаются одним потоком (без записи и переподключения)
+        from device_mux import DeviceMultiplexer
+        source = DeviceMultiplexer(ports=args.ports, count=args.devices or None)
+    else:
+        from serial_handler import SerialHandler
+        source = SerialHandler(record_path=args.record, port=args.port or SERIAL_PORT)
+    
+    journal = None
+    if args.journal and not args.no_journal:
+        journal = StateJournal(args.journal, STATE_JOURNAL_COMPACT_EVERY, STATE_JOURNAL_FSYNC)
+    
+    exporter = None
+    if args.gallery and not args.no_gallery:
+        from canvas_export import CanvasExporter
+        exporter = CanvasExporter(args.gallery)
+    
+    app = PaintApp(source, latency_report=args.latency_report, journal=journal, exporter=exporter)
     app.run()
 
 
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Генератор нагрузки для сетевого приёма (network_source.py)
+
+Открывает заданное число клиентов TCP или UDP и отправляет от каждого
+отсчёты джойстика с заданной частотой, строками или бинарными кадрами:
+
+    python main.py --listen 5005
+    python net_loadgen.py --port 5005 --clients 200 --rate 100
+
+    python net_loadgen.py --load-test --clients 500 --rate 100 --duration 10
+
+В режиме --load-test NetworkSource запускается в этом процессе, а
+генератор - в отдельном (чтобы не делить с сервером GIL); в конце
+выводятся отправленные и принятые отсчёты, число клиентов и загрузка CPU
+потоком сервера.
+"""
+
+import argparse
+import asyncio
+import math
+import multiprocessing
+import sys
+import threading
+import time
+
+from config import NET_PORT, JOY_X_CENTER, JOY_Y_CENTER
+from protocol import encode_frame, FLAG_SAMPLE, HANDSHAKE_REQUEST, HANDSHAKE_ACK, TEXT_SAMPLE_RE
+from ingest_queue import CoalescedSample, DEVICE_RELEASED
+
+# Период отправки: отсчёты, накопившиеся за такт, уходят одной записью
+TICK = 0.02
+
+
+def _encode_samples(index, first, count, binary):
+    """count отсчётов клиента index, начиная с номера first"""
+    chunks = []
+    for n in range(first, first + count):
+        t = n * 0.01
+        x = int(JOY_X_CENTER + 1800 * math.sin(t * 0.7 + index))
+        y = int(JOY_Y_CENTER + 1800 * math.sin(t * 0.45 + index + 1.0))
+        if binary:
+            chunks.append(encode_frame(x, y, FLAG_SAMPLE, n))
+        else:
+            chunks.append(f"X:{x},Y:{y},B:0\n".encode())
+    return b''.join(chunks)
+
+
+async def _tcp_client(index, args, stats):
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        if args.binary:
+            writer.write(HANDSHAKE_REQUEST)
+            await asyncio.wait_for(reader.readexactly(len(HANDSHAKE_ACK)), 2.0)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        stats['failed'] += 1
+        return
+    sent = 0
+    start = time.monotonic()
+    try:
+        while time.monotonic() - start < args.duration:
+            due = int((time.monotonic() - start) * args.rate) - sent
+            if due > 0:
+                writer.write(_encode_samples(index, sent, due, args.binary))
+                await writer.drain()
+                sent += due
+            await asyncio.sleep(TICK)
+    except OSError:
+        stats['failed'] += 1
+    finally:
+        stats['sent'] += sent
+        writer.close()
+
+
+async def _udp_client(index, args, stats):
+    loop = asyncio.get_running_loop()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(args.host, args.port))
+    except OSError:
+        stats['failed'] += 1
+        return
+    sent = 0
+    start = time.monotonic()
+    while time.monotonic() - start < args.duration:
+        due = int((time.monotonic() - start) * args.rate) - sent
+        if due > 0:
+            transport.sendto(_encode_samples(index, sent, due, args.binary))
+            sent += due
+        await asyncio.sleep(TICK)
+    stats['sent'] += sent
+    transport.close()
+
+
+async def generate(args):
+    """Запустить всех клиентов, вернуть {'sent': отсчётов, 'failed': клиентов}"""
+    stats = {'sent': 0, 'failed': 0}
+    client = _udp_client if args.udp else _tcp_client
+    await asyncio.gather(*(client(index, args, stats) for index in range(args.clients)))
+    return stats
+
+
+def _generator_process(args, results):
+    results.put(asyncio.run(generate(args)))
+
+
+def load_test(args):
+    """Нагрузочный тест NetworkSource на локальном генераторе"""
+    import app_log
+    from network_source import NetworkSource
+    from simulator import _thread_cpu_seconds
+    
+    app_log.set_level('info')
+    app_log.set_level('warning', 'net')
+    source = NetworkSource(host='127.0.0.1', port=0, tcp=not args.udp, udp=args.udp)
+    if not source.find_and_connect():
+        return 1
+    source.start_reading()
+    server_id = source.serial_thread.native_id
+    cpu_start = _thread_cpu_seconds(server_id)
+    args.host, args.port = '127.0.0.1', source.port
+    
+    results = multiprocessing.Queue()
+    generator = multiprocessing.Process(target=_generator_process, args=(args, results))
+    
+    received = 0
+    devices = set()
+    running = True
+    
+    def drain():
+        nonlocal received
+        while True:
+            batches = source.wait_batches(0.1)
+            if not batches and not running:
+                break
+            for _received_at, items, device_id in batches:
+                devices.add(device_id)
+                for item in items:
+                    if item is DEVICE_RELEASED:
+                        continue
+                    if isinstance(item, CoalescedSample):
+                        received += item.count
+                    elif isinstance(item, tuple):
+                        received += bool(item[2] & FLAG_SAMPLE)
+                    elif TEXT_SAMPLE_RE.match(item):
+                        received += 1
+    
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    wall_start = time.monotonic()
+    generator.start()
+    stats = results.get()
+    generator.join()
+    time.sleep(0.3)
+    running = False
+    reader.join()
+    wall = time.monotonic() - wall_start
+    cpu = _thread_cpu_seconds(server_id) - cpu_start
+    metrics = source.metrics()
+    source.close()
+    app_log.flush()
+    
+    sent = stats['sent']
+    print(f"Транспорт: {'UDP' if args.udp else 'TCP'}, протокол: {'binary' if args.binary else 'text'}, "
+          f"длительность: {wall:.1f} с")
+    print(f"Клиентов: {args.clients}, принято сервером: {metrics['accepted']}, "
+          f"отклонено: {metrics['rejected']}, не смогли отправить: {stats['failed']}, устройств: {len(devices)}")
+    print(f"Отправлено отсчётов: {sent} ({sent / args.duration:.0f}/с), "
+          f"получено: {received} ({received / args.duration:.0f}/с), потеряно: {sent - received}")
+    print(f"CPU потока сервера: {cpu:.2f} с ({cpu / wall * 100:.1f}% ядра)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для приёма по сети")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=NET_PORT)
+    parser.add_argument('--clients', type=int, default=100, help="одновременных клиентов")
+    parser.add_argument('--rate', type=float, default=100.0, help="отсчётов в секунду на клиента")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность, с")
+    parser.add_argument('--udp', action='store_true', help="отправлять датаграммы UDP вместо TCP")
+    parser.add_argument('--binary', action='store_true', help="бинарные кадры вместо строк")
+    parser.add_argument('--load-test', action='store_true',
+                        help="запустить NetworkSource в этом же процессе и вывести статистику")
+    args = parser.parse_args()
+    
+    if args.load_test:
+        return load_test(args)
+    
+    stats = asyncio.run(generate(args))
+    print(f"Отправлено отсчётов: {stats['sent']} ({stats['sent'] / args.duration:.0f}/с), "
+          f"клиентов с ошибкой: {stats['failed']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
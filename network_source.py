@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Приём данных джойстиков по сети (TCP и UDP)
+
+Удалённые клиенты (шлюзы, клиент WPF) присылают тот же поток, что и плата
+по COM-порту: строки X:..,Y:..,B:.. и BTN:.. или бинарные кадры. По TCP
+клиент может включить бинарный протокол, отправив PROTO:BIN первой строкой
+(ответ - ACK:BIN); UDP-датаграмма, начинающаяся с байта sync, разбирается
+как бинарные кадры, иначе - как строки.
+
+Сервер asyncio работает в одном фоновом потоке и держит сотни соединений.
+У каждого клиента ограниченный буфер чтения (NET_CLIENT_BUFFER) и своя
+ограниченная очередь IngestQueue (NET_CLIENT_QUEUE_CAPACITY, не больше
+NET_CLIENT_MAX_BUTTONS нажатий); клиент, переполнивший её нажатиями,
+отключается, а датаграммы с его адреса не принимаются, пока он не замолчит.
+Пачки помечаются номером устройства - каждый клиент управляет своим
+курсором. При отключении клиента в поток пачек добавляется DEVICE_RELEASED:
+приложение убирает его курсор, а номер выдаётся следующему клиенту с
+чистым джойстиком, поэтому курсоров не больше, чем клиентов одновременно.
+
+    source = NetworkSource(port=5005)
+    source.find_and_connect()   # открыть сокеты
+    source.start_reading()      # запустить сервер
+"""
+
+import asyncio
+import heapq
+import socket
+import threading
+import time
+
+from app_log import get_logger, DEBUG
+from config import (NET_HOST, NET_PORT, NET_MAX_CLIENTS, NET_CLIENT_BUFFER,
+                    NET_CLIENT_QUEUE_CAPACITY, NET_CLIENT_MAX_BUTTONS,
+                    NET_UDP_IDLE_TIMEOUT, NET_UDP_RECEIVE_BUFFER, SERIAL_OVERLOAD_POLICY)
+from ingest_queue import IngestQueue, DEVICE_RELEASED
+from protocol import BinaryDecoder, HANDSHAKE_REQUEST, HANDSHAKE_ACK, SYNC_BYTE
+from serial_handler import SerialHandler
+
+log = get_logger('net')
+uart_log = get_logger('uart')
+
+
+class Client:
+    """Один удалённый джойстик: разбор потока байт и своя очередь"""
+    
+    def __init__(self, device_id, address, transport, writer=None):
+        self.device_id = device_id
+        self.address = address
+        self.transport = transport      # 'tcp' или 'udp'
+        self.writer = writer
+        self.protocol = 'text'
+        self.decoder = None
+        self.buffer = bytearray()
+        self.last_seen = time.monotonic()
+        # Переполнил очередь: его данные больше не принимаются
+        self.closed = False
+        self.data_queue = IngestQueue(NET_CLIENT_QUEUE_CAPACITY, SERIAL_OVERLOAD_POLICY,
+                                      button_capacity=NET_CLIENT_MAX_BUTTONS)
+    
+    def feed(self, chunk):
+        """Записи из очередного куска потока TCP"""
+        if self.decoder is not None:
+            return self.decoder.feed(chunk)
+        self.buffer += chunk
+        if self.buffer.startswith(HANDSHAKE_REQUEST):
+            # Всё после запроса - уже бинарные кадры
+            rest = bytes(self.buffer[len(HANDSHAKE_REQUEST):])
+            self.buffer.clear()
+            self.protocol = 'binary'
+            self.decoder = BinaryDecoder()
+            self.writer.write(HANDSHAKE_ACK)
+            return self.decoder.feed(rest)
+        return SerialHandler._split_lines(self.buffer)
+    
+    def feed_datagram(self, data):
+        """Записи одной UDP-датаграммы (последняя строка может быть без перевода)"""
+        self.last_seen = time.monotonic()
+        if data[0] == SYNC_BYTE:
+            if self.decoder is None:
+                self.protocol = 'binary'
+                self.decoder = BinaryDecoder()
+            return self.decoder.feed(data)
+        return SerialHandler._split_lines(bytearray(data.rstrip(b'\n') + b'\n'))
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, source):
+        self.source = source
+    
+    def datagram_received(self, data, address):
+        if data:
+            self.source._on_datagram(data, address)
+
+
+class NetworkSource:
+    """Источник данных для PaintApp: сервер TCP/UDP в отдельном потоке"""
+    
+    def __init__(self, host=NET_HOST, port=NET_PORT, tcp=True, udp=True):
+        self.host = host
+        self.port = port
+        self.tcp = tcp
+        self.udp = udp
+        self._tcp_socket = None
+        self._udp_socket = None
+        
+        # Активные клиенты {номер устройства: Client}; UDP-клиенты - по адресу
+        self.clients = {}
+        self._udp_clients = {}
+        self._free_ids = []
+        self._next_id = 0
+        
+        # Клиенты с непрочитанными пачками и отключившиеся устройства
+        # [(время отключения, номер устройства)]
+        self._ready = set()
+        self._released = []
+        self._lock = threading.Lock()
+        self._data_event = threading.Event()
+        
+        self._loop = None
+        self._stop = None
+        self._serving = threading.Event()
+        self._connections = set()
+        self.serial_thread = None
+        # Переподключения нет: сокеты либо открылись, либо нет
+        self.auto_reconnect = False
+        
+        # Счётчики
+        self.accepted = 0
+        self.rejected = 0
+        self.overflowed = 0
+        self.received = 0
+    
+    def find_and_connect(self):
+        """Открыть сокеты TCP и UDP (port=0 - свободный порт, см. self.port)"""
+        try:
+            if self.tcp:
+                self._tcp_socket = socket.create_server((self.host, self.port), backlog=NET_MAX_CLIENTS)
+                self.port = self._tcp_socket.getsockname()[1]
+            if self.udp:
+                self._udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                # Датаграммы сотен клиентов приходят пачками - буфер ядра побольше
+                self._udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, NET_UDP_RECEIVE_BUFFER)
+                self._udp_socket.bind((self.host, self.port))
+                self.port = self._udp_socket.getsockname()[1]
+        except OSError as e:
+            log.error("✗ Не удалось открыть порт %s:%s: %s", self.host, self.port, e)
+            self._close_sockets()
+            return False
+        transports = [name for name, enabled in (('TCP', self.tcp), ('UDP', self.udp)) if enabled]
+        log.info("✓ Приём по сети: %s на %s:%s", '/'.join(transports), self.host, self.port)
+        return True
+    
+    def _close_sockets(self):
+        for sock in (self._tcp_socket, self._udp_socket):
+            if sock is not None:
+                sock.close()
+        self._tcp_socket = self._udp_socket = None
+    
+    def start_reading(self):
+        """Запуск сервера в фоновом потоке"""
+        if self.serial_thread is not None or (self._tcp_socket is None and self._udp_socket is None):
+            return
+        self.serial_thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+        self.serial_thread.start()
+        self._serving.wait(timeout=2.0)
+    
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = udp_transport = None
+        if self._tcp_socket is not None:
+            server = await asyncio.start_server(self._handle_tcp, sock=self._tcp_socket,
+                                                limit=NET_CLIENT_BUFFER)
+        if self._udp_socket is not None:
+            udp_transport, _ = await self._loop.create_datagram_endpoint(
+                lambda: _UdpProtocol(self), sock=self._udp_socket)
+        self._serving.set()
+        
+        try:
+            while not self._stop.is_set():
+                try:
+                    await asyncio.wait_for(self._stop.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    self._expire_udp()
+        finally:
+            if server is not None:
+                server.close()
+            if udp_transport is not None:
+                udp_transport.close()
+            for client in list(self.clients.values()):
+                if client.writer is not None:
+                    client.writer.close()
+            # Закрытые соединения дочитывают конец потока и завершаются сами
+            await asyncio.gather(*self._connections, return_exceptions=True)
+    
+    def _open_client(self, address, transport, writer=None):
+        """Новый клиент с наименьшим свободным номером (None - мест нет)"""
+        if len(self.clients) >= NET_MAX_CLIENTS:
+            self.rejected += 1
+            log.info("Клиент %s отклонён: уже %s клиентов", address, NET_MAX_CLIENTS)
+            return None
+        if self._free_ids:
+            device_id = heapq.heappop(self._free_ids)
+        else:
+            device_id = self._next_id
+            self._next_id += 1
+        client = Client(device_id, address, transport, writer)
+        self.clients[device_id] = client
+        self.accepted += 1
+        log.debug("[DEBUG] Клиент %s %s подключен как устройство %s", transport, address, device_id)
+        return client
+    
+    def _close_client(self, client):
+        if self.clients.pop(client.device_id, None) is client:
+            # Отметка попадает в поток пачек раньше данных следующего
+            # клиента с этим номером
+            with self._lock:
+                self._released.append((time.monotonic(), client.device_id))
+            self._data_event.set()
+            heapq.heappush(self._free_ids, client.device_id)
+            log.debug("[DEBUG] Клиент %s %s отключен", client.transport, client.address)
+    
+    async def _handle_tcp(self, reader, writer):
+        client = self._open_client(writer.get_extra_info('peername'), 'tcp', writer)
+        if client is None:
+            writer.close()
+            return
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                chunk = await reader.read(NET_CLIENT_BUFFER)
+                if not chunk:
+                    break
+                self._deliver(client, client.feed(chunk))
+        except OSError as e:
+            log.debug("[DEBUG] Ошибка соединения %s: %s", client.address, e)
+        finally:
+            self._connections.discard(task)
+            self._close_client(client)
+            writer.close()
+    
+    def _on_datagram(self, data, address):
+        client = self._udp_clients.get(address)
+        if client is None:
+            client = self._open_client(address, 'udp')
+            if client is None:
+                return
+            self._udp_clients[address] = client
+        elif client.closed:
+            # Переполнивший очередь адрес молчит NET_UDP_IDLE_TIMEOUT, прежде
+            # чем его примут снова
+            client.last_seen = time.monotonic()
+            return
+        self._deliver(client, client.feed_datagram(data))
+    
+    def _expire_udp(self):
+        """Забыть UDP-клиентов, молчащих дольше NET_UDP_IDLE_TIMEOUT"""
+        now = time.monotonic()
+        for address, client in list(self._udp_clients.items()):
+            if now - client.last_seen > NET_UDP_IDLE_TIMEOUT:
+                del self._udp_clients[address]
+                self._close_client(client)
+    
+    def _deliver(self, client, items):
+        if not items or client.closed:
+            return
+        if uart_log.enabled(DEBUG):
+            for item in items:
+                uart_log.debug("[NET %s] Получено: %s", client.device_id, item)
+        self.received += len(items)
+        queue = client.data_queue
+        queue.put(time.monotonic(), items)
+        with self._lock:
+            self._ready.add(client)
+        self._data_event.set()
+        if queue.dropped_buttons:
+            self._overflow(client)
+    
+    def _overflow(self, client):
+        """Клиент шлёт нажатия быстрее, чем их разбирает приложение - отключить"""
+        client.closed = True
+        self.overflowed += 1
+        log.info("Клиент %s %s отключен: больше %s нажатий в очереди",
+                 client.transport, client.address, NET_CLIENT_MAX_BUTTONS)
+        if client.writer is not None:
+            # Чтение получит конец потока и закроет клиента
+            client.writer.close()
+        else:
+            self._close_client(client)
+    
+    @property
+    def connected(self):
+        return bool(self.clients)
+    
+    def metrics(self):
+        """Состояние сервера для отчётов"""
+        return {'clients': len(self.clients), 'accepted': self.accepted,
+                'rejected': self.rejected, 'overflowed': self.overflowed, 'received': self.received}
+    
+    def get_batch(self):
+        """Все накопленные записи всех клиентов одним списком (без отметок отключения)"""
+        lines = []
+        for _received_at, items, _device_id in self.get_batches():
+            lines.extend(item for item in items if item is not DEVICE_RELEASED)
+        return lines
+    
+    def get_batches(self):
+        """Все накопленные пачки: список (время приёма, записи, номер устройства)"""
+        with self._lock:
+            ready, self._ready = self._ready, set()
+            released, self._released = self._released, []
+        batches = []
+        for client in ready:
+            for received_at, items in client.data_queue.get_all():
+                batches.append((received_at, items, client.device_id))
+        for released_at, device_id in released:
+            batches.append((released_at, [DEVICE_RELEASED], device_id))
+        batches.sort(key=lambda batch: batch[0])
+        return batches
+    
+    def wait_batches(self, timeout):
+        """Как get_batches(), но ждёт первую пачку не дольше timeout секунд"""
+        self._data_event.wait(timeout)
+        self._data_event.clear()
+        return self.get_batches()
+    
+    def close(self):
+        """Остановить сервер и закрыть все соединения"""
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self.serial_thread and self.serial_thread is not threading.current_thread():
+            self.serial_thread.join(timeout=2.0)
+        self._close_sockets()
+        log.info("Клиентов по сети: принято %s, отклонено %s, отключено за переполнение %s, записей %s",
+                 self.accepted, self.rejected, self.overflowed, self.received)
@@ -6,21 +6,89 @@
 
 import pygame
 import sys
-import re
+import threading
+import time
+from collections import deque, namedtuple
+from itertools import zip_longest
 from config import *
+import app_log
+from app_log import get_logger, DEBUG
 from colors import *
 from drawings import DRAWINGS
-from serial_handler import SerialHandler
+from figure_layers import FigureLayers
+from coloring_score import ColoringScore
+from frame_pacer import FramePacer
+from joystick_filter import JoystickFilter
+from ingest_queue import CoalescedSample, DEVICE_RELEASED
+from latency import LatencyTracker
+from protocol import TEXT_SAMPLE_RE, FLAG_SAMPLE, buttons_from_mask
+from undo_history import UndoHistory, encode_change, encode_step, decode_step, code_color
+from state_journal import (KIND_PICTURE, KIND_FILL, KIND_CLEAR, KIND_CLEAR_ALL,
+                           KIND_COLOR, KIND_RELEASE, encode_fill)
 
+log = get_logger('paint')
 
-class PaintApp:
-    """Класс приложения для рисования с управлением через джойстик"""
+# Событие, которым поток ввода будит главный цикл, ждущий изменений
+FRAME_WAKEUP = pygame.event.custom_type()
+
+# Снимок состояния ввода, который публикуется для отрисовки. Словарь
+# filled_figures в снимке - отдельная копия и после публикации не меняется,
+# seq - номер снимка (растёт с каждой публикацией), cursors и
+# color_indices - курсоры и выбранные цвета всех джойстиков по порядку
+# (None - джойстик отключился и не показывается)
+InputSnapshot = namedtuple('InputSnapshot', 'seq cursors picture_type color_indices filled_figures')
+
+
+class Player:
+    """Курсор, выбранный цвет и фильтр отсчётов одного джойстика"""
     
     def __init__(self):
-        pygame.init()
+        # Калибровка фильтра переживает сброс курсора
+        self.filter = JoystickFilter()
+        # Устройство подключено (курсор и выбранный цвет показываются)
+        self.active = True
+        self.reset()
+    
+    def reset(self):
+        self.cursor_x = CANVAS_WIDTH // 2
+        self.cursor_y = CANVAS_HEIGHT // 2
+        self.selected_color = BLACK
+        self.color_index = 0
+
+
+def _player_attribute(name):
+    """Атрибут PaintApp, который хранится у текущего джойстика"""
+    return property(lambda self: getattr(self._player, name),
+                    lambda self, value: setattr(self._player, name, value))
+
+
+class PaintApp:
+    """Класс приложения для рисования с управлением через джойстик
+    
+    Джойстиков может быть несколько (см. device_mux.py): у каждого свой
+    курсор и цвет, а картинка и залитые фигуры общие. Обработчики ввода
+    работают с self.cursor_x и т. п. - это поля джойстика, чья пачка
+    данных сейчас обрабатывается.
+    """
+    
+    cursor_x = _player_attribute('cursor_x')
+    cursor_y = _player_attribute('cursor_y')
+    selected_color = _player_attribute('selected_color')
+    color_index = _player_attribute('color_index')
+    
+    def __init__(self, source=None, latency_report=None, journal=None, exporter=None):
+        # Только дисплей: шрифты инициализируются при первой надписи, а
+        # звук и прочие модули pygame приложению не нужны
+        pygame.display.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Paint - Joystick Control")
+        # Мышь приложению не нужна: её движение не будит ждущий цикл
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
         self.clock = pygame.time.Clock()
+        self.pacer = FramePacer()
+        # События окна, полученные при ожидании (обрабатываются в step)
+        self._waited_events = []
+        self._frame_waiting = False
         
         # Canvas для основного рисунка (по центру)
         self.canvas = pygame.Surface((CANVAS_WIDTH, CANVAS_HEIGHT))
@@ -28,85 +96,296 @@ class PaintApp:
         
         # Начинаем с человечка
         self.picture_type = 'human'
-        print(f"Выбрана картинка: {self.picture_type}")
+        log.info("Выбрана картинка: %s", self.picture_type)
         
         # Референсная картинка (справа сверху) - ЗАКРАШЕННАЯ
         self.reference_image = pygame.Surface((REFERENCE_SIZE, REFERENCE_SIZE))
         self.reference_image.fill(WHITE)
-        self._draw_reference()
         
         # Хранилище залитых фигур {имя_фигуры: цвет}
         self.filled_figures = {}
         
-        # Изображение для раскрашивания (по центру) - БЕЗ ЦВЕТОВ
-        self._draw_canvas_outline()
+        # Растеризованные фигуры рисунков {тип_картинки: FigureLayers}
+        self._figure_layers = {}
         
-        # Состояние курсора и инструментов
-        self.cursor_x = CANVAS_WIDTH // 2
-        self.cursor_y = CANVAS_HEIGHT // 2
-        self.selected_color = BLACK
-        self.color_index = 0
+        # Совпадение canvas с образцом (см. coloring_score.py): оценки
+        # рисунков {тип_картинки: ColoringScore} и оценка нарисованного
+        self._coloring_scores = {}
+        self.coloring_score = None
+        
+        # Грязные области экрана для частичной перерисовки
+        self._dirty_rects = []
+        self._full_redraw = True
+        self._drawn_cursors = ()
+        
+        # Состояние курсоров и инструментов (по джойстику на устройство)
+        self.players = [Player()]
+        self._player = self.players[0]
+        self._player_id = 0
         self.brush_size = 3
         
-        # Обработчик COM-порта
-        self.serial_handler = SerialHandler()
+        # Источник данных: COM-порт или, например, журнал сеанса
+        if source is None:
+            from serial_handler import SerialHandler
+            source = SerialHandler()
+        self.serial_handler = source
+        self._connect_thread = None
+        self._source_failed = False
+        
+        # Задержки от приёма данных до экрана (сводка сохраняется при выходе)
+        self.latency = LatencyTracker() if LATENCY_TRACKING else None
+        self.latency_report = latency_report
+        
+        # Отсчёты джойстика, ещё не переданные фильтру (см. _flush_samples),
+        # и время прихода последней пачки с ними. Источник может задать
+        # свои часы отсчётов (воспроизведение сеанса в виртуальном времени)
+        self._samples = []
+        self._samples_until = None
+        self._sample_clock = getattr(source, 'sample_clock', None)
+        
+        # Шрифты (загружаются при первом обращении, см. font)
+        self._fonts = {}
+        
+        # Кэш отрендеренных строк и статический слой интерфейса
+        self._text_cache = {}
+        self._ui_layer = None
+        self._ui_layer_key = None
+        
+        # История отмены и повтора заливок (см. undo_history.py); номера
+        # фигур в ней - позиции в FIGURES, {картинка: {имя: номер}}
+        self.history = UndoHistory()
+        self._figure_ids = {}
+        # Кнопки с клавиатуры (Ctrl+Z, Ctrl+Y) для потока ввода
+        self._keyboard_buttons = deque()
+        
+        # Галерея раскрасок (см. canvas_export.py): кадр только копирует
+        # canvas, PNG сжимается в пуле процессов
+        self.exporter = exporter
+        self._export_requested = False
+        self._checked_figures = None  # заливки, уже проверенные на завершённость
+        
+        # Журнал состояния (см. state_journal.py): рисунок переживает перезапуск
+        self.journal = journal
+        if journal is not None:
+            self._restore_from_journal()
+        
+        # Поток обработки ввода и последний опубликованный снимок состояния
+        self._input_thread = None
+        self._input_running = False
+        self._figures_changed = False
+        self._snapshot = None
+        self.publish_snapshot()
         
-        # Калибровка джойстика
-        self.joy_x_center = JOY_X_CENTER
-        self.joy_y_center = JOY_Y_CENTER
+        # Снимок, который сейчас нарисован на canvas и в интерфейсе
+        self._view = self._snapshot
+        # Рисунок, законченный до запуска (восстановлен из журнала), в
+        # галерею повторно не сохраняется
+        self._checked_figures = self._view.filled_figures
+        self.first_frame_at = None
+        self._draw_reference()
         
-        # Инициализация шрифтов
-        self.font = pygame.font.Font(None, 24)
-        self.small_font = pygame.font.Font(None, 18)
+        # Изображение для раскрашивания (по центру) - БЕЗ ЦВЕТОВ
+        self._draw_canvas_outline()
     
     def _draw_reference(self):
         """Рисует референсное изображение (закрашенное)"""
-        drawing_class = DRAWINGS[self.picture_type]
+        drawing_class = DRAWINGS[self._view.picture_type]
         drawing_class.draw(self.reference_image, filled=True)
     
-    def _draw_canvas_outline(self, clear=True):
-        """Рисует контуры на основном canvas (без цветов)"""
-        if clear:
-            self.canvas.fill(WHITE)
+    def _get_figure_layers(self, picture_type=None):
+        """Кэш масок и контуров рисунка (строится один раз)
         
-        # Сначала рисуем все залитые фигуры
-        scale_x = CANVAS_WIDTH / REFERENCE_SIZE
-        scale_y = CANVAS_HEIGHT / REFERENCE_SIZE
+        По умолчанию - рисунок, выбранный вводом; отрисовка передаёт
+        рисунок из своего снимка.
+        """
+        if picture_type is None:
+            picture_type = self.picture_type
+        layers = self._figure_layers.get(picture_type)
+        if layers is None:
+            layers = FigureLayers(DRAWINGS[picture_type], (CANVAS_WIDTH, CANVAS_HEIGHT))
+            self._figure_layers[picture_type] = layers
+        return layers
+    
+    def _draw_canvas_outline(self):
+        """Рисует контуры на основном canvas (с залитыми фигурами)"""
+        view = self._view
+        layers = self._get_figure_layers(view.picture_type)
+        layers.compose(self.canvas, view.filled_figures)
+        if ACCURACY_SCORE:
+            score = self._coloring_scores.get(view.picture_type)
+            if score is None:
+                score = ColoringScore(DRAWINGS[view.picture_type], layers)
+                self._coloring_scores[view.picture_type] = score
+            score.reset(self.canvas)
+            self.coloring_score = score
+    
+    def _redraw_figure(self, figure_name):
+        """Пересобирает на canvas только область одной фигуры"""
+        view = self._view
+        layers = self._get_figure_layers(view.picture_type)
+        rect = layers.rects[figure_name]
+        layers.compose(self.canvas, view.filled_figures, rect)
+        self.mark_canvas_dirty(rect)
+        if self.coloring_score is not None:
+            # Пересчитывается только область фигуры
+            self.coloring_score.update(self.canvas, rect)
+            self.mark_dirty(self._score_rect())
+    
+    def _restore_from_journal(self):
+        """Восстановить картинку, заливки и джойстики из журнала и начать его вести"""
+        start = time.monotonic()
+        try:
+            state = self.journal.load()
+            self.journal.start()
+        except OSError as e:
+            # Каталог журнала недоступен (нет HOME, только чтение) - рисовать можно и без него
+            log.error("✗ Журнал состояния недоступен, работа без него: %s", e)
+            self.journal = None
+            return
+        if state is None or state.picture_type not in DRAWINGS:
+            # Новый журнал начинается с текущей картинки
+            self._journal_action(KIND_PICTURE, self.picture_type.encode('utf-8'))
+            return
         
-        drawing_class = DRAWINGS[self.picture_type]
+        self.picture_type = state.picture_type
+        self.filled_figures = dict(state.filled_figures)
+        for player_id, (x, y, color_index) in sorted(state.players.items()):
+            self._select_player(player_id)
+            player = self._player
+            player.cursor_x, player.cursor_y = x, y
+            if color_index < len(COLOR_PALETTE):
+                player.color_index = color_index
+                player.selected_color = COLOR_PALETTE[color_index]
+            # Остальные устройства могли не вернуться: их курсор появится
+            # (с прежним цветом) с первыми данными от них
+            player.active = player_id == 0
+        self._select_player(0)
+        log.info("✓ Рисунок восстановлен из журнала: %s, залито частей: %s (%.1f мс)",
+                 self.picture_type, len(self.filled_figures), (time.monotonic() - start) * 1000)
+    
+    def _journal_action(self, kind, payload=b''):
+        """Дописать действие текущего джойстика в журнал состояния"""
+        if self.journal is not None:
+            self.journal.append(kind, self._player_id, self.cursor_x, self.cursor_y, payload)
+    
+    def publish_snapshot(self):
+        """Опубликовать текущее состояние ввода для отрисовки
         
-        # Рисуем заливки
-        for figure_name, color in self.filled_figures.items():
-            drawing_class.draw_filled_figure(self.canvas, figure_name, color, scale_x, scale_y)
+        Словарь залитых фигур копируется только после изменений, поэтому
+        снимок дешёвый и публикуется после каждой пачки данных платы.
+        Присваивание атрибута атомарно, блокировка не нужна.
         
-        # Теперь рисуем контуры поверх заливок
-        drawing_class.draw_outlines(self.canvas, scale_x, scale_y)
+        Возвращает False, если снимок выглядит так же, как предыдущий.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or self._figures_changed:
+            filled_figures = dict(self.filled_figures)
+            self._figures_changed = False
+        else:
+            filled_figures = snapshot.filled_figures
+        seq = 0 if snapshot is None else snapshot.seq + 1
+        players = self.players
+        self._snapshot = InputSnapshot(seq, tuple((player.cursor_x, player.cursor_y) if player.active else None
+                                                  for player in players),
+                                       self.picture_type,
+                                       tuple(player.color_index if player.active else None for player in players),
+                                       filled_figures)
+        return snapshot is None or self._snapshot[1:] != snapshot[1:]
+    
+    def _apply_snapshot(self, snapshot):
+        """Привести canvas и интерфейс к снимку, пометив изменившиеся области"""
+        view = self._view
+        if snapshot is view:
+            return
+        self._view = snapshot
+        
+        if snapshot.picture_type != view.picture_type:
+            self._draw_reference()
+            self._draw_canvas_outline()
+            self.mark_full_redraw()
+            return
+        
+        if snapshot.filled_figures is not view.filled_figures:
+            old, new = view.filled_figures, snapshot.filled_figures
+            for figure_name in old.keys() | new.keys():
+                if old.get(figure_name) != new.get(figure_name):
+                    self._redraw_figure(figure_name)
+        
+        if snapshot.color_indices != view.color_indices:
+            for old, new in zip_longest(view.color_indices, snapshot.color_indices):
+                if old != new:
+                    for index in (old, new):
+                        if index is not None:
+                            self.mark_dirty(self._color_rect(index))
+            # Строка "Выбран цвет" слева от canvas
+            self.mark_dirty((0, 40, (SCREEN_WIDTH - CANVAS_WIDTH) // 2 - 2, 25))
+    
+    def mark_dirty(self, rect):
+        """Пометить область экрана для перерисовки в следующем кадре"""
+        self._dirty_rects.append(pygame.Rect(rect))
+    
+    def mark_canvas_dirty(self, rect=None):
+        """Пометить область canvas (или весь canvas) для перерисовки"""
+        canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
+        canvas_screen_y = (SCREEN_HEIGHT - CANVAS_HEIGHT) // 2
+        if rect is None:
+            rect = self.canvas.get_rect()
+        self.mark_dirty(pygame.Rect(rect).move(canvas_screen_x, canvas_screen_y))
+    
+    def mark_full_redraw(self):
+        """Перерисовать весь экран в следующем кадре"""
+        self._full_redraw = True
     
     def get_figure_at_position(self, x, y):
-        """Определяет, какая фигура находится в позиции (x, y)"""
-        scale_x = CANVAS_WIDTH / REFERENCE_SIZE
-        scale_y = CANVAS_HEIGHT / REFERENCE_SIZE
+        """Определяет, какая фигура находится в позиции (x, y)
         
-        if DEBUG_MODE:
-            print(f"[DEBUG] Проверка позиции: ({x}, {y}), тип: {self.picture_type}")
+        Обычно - одно обращение к карте регионов; у детальных рисунков
+        (больше FIGURE_MAP_MAX_REGIONS частей) - кандидаты из сетки над
+        частями и точная проверка, без сборки карты.
+        """
+        log.debug("[DEBUG] Проверка позиции: (%s, %s), тип: %s", x, y, self.picture_type)
         
-        drawing_class = DRAWINGS[self.picture_type]
-        return drawing_class.get_figure_at(x, y, scale_x, scale_y)
+        drawing = DRAWINGS[self.picture_type]
+        if len(drawing.FIGURES) > FIGURE_MAP_MAX_REGIONS:
+            return drawing.get_figure_at(x, y, CANVAS_WIDTH / REFERENCE_SIZE, CANVAS_HEIGHT / REFERENCE_SIZE)
+        return self._get_figure_layers().figure_at(x, y)
+    
+    def get_figures_at_positions(self, points):
+        """Определяет фигуры сразу для нескольких точек canvas [(x, y), ...]"""
+        if len(DRAWINGS[self.picture_type].FIGURES) > FIGURE_MAP_MAX_REGIONS:
+            return [self.get_figure_at_position(x, y) for x, y in points]
+        return self._get_figure_layers().figures_at(points)
     
     def fill_figure(self, figure_name):
         """Заливает фигуру выбранным цветом"""
-        if DEBUG_MODE:
-            print(f"[DEBUG] Заливка фигуры: {figure_name} цветом {self.selected_color}")
+        log.debug("[DEBUG] Заливка фигуры: %s цветом %s", figure_name, self.selected_color)
         
-        # Сохраняем информацию о заливке
+        # Сохраняем информацию о заливке; область фигуры перерисуется
+        # при отрисовке следующего снимка
+        self.history.record(encode_change(self._figure_id(figure_name),
+                                          self.filled_figures.get(figure_name), self.selected_color))
         self.filled_figures[figure_name] = self.selected_color
+        self._figures_changed = True
+        self._journal_action(KIND_FILL, encode_fill(self.selected_color, figure_name))
         
-        # Перерисовываем canvas с учетом всех заливок
-        self._draw_canvas_outline(clear=True)
-        
-        if DEBUG_MODE:
-            print(f"[DEBUG] Фигура {figure_name} залита успешно")
-            print(f"[DEBUG] Залитые фигуры: {self.filled_figures}")
+        if log.enabled(DEBUG):
+            log.debug("[DEBUG] Фигура %s залита успешно", figure_name)
+            # Копия: сообщение форматируется позже, в потоке вывода
+            log.debug("[DEBUG] Залитые фигуры: %s", dict(self.filled_figures))
+    
+    def _color_rect(self, index):
+        """Квадрат цвета index в панели цветов (экранные координаты)"""
+        panel_start_y = 250
+        color_size = 40
+        color_spacing = 10
+        color_y = panel_start_y + index * (color_size + color_spacing)
+        return pygame.Rect(COLOR_PANEL_X, color_y, color_size, color_size)
+    
+    def select_color(self, index):
+        """Выбрать цвет палитры"""
+        self.color_index = index
+        self.selected_color = COLOR_PALETTE[index]
+        self._journal_action(KIND_COLOR, bytes((index,)))
     
     def get_color_at_panel(self, x, y):
         """Определяет, какой цвет выбран в панели цветов"""
@@ -123,44 +402,6 @@ class PaintApp:
         
         return None
     
-    def normalize_joystick_x(self, raw_value):
-        """Нормализация значения X джойстика (с плавностью)"""
-        if abs(raw_value - self.joy_x_center) < JOY_DEAD_ZONE:
-            return self.cursor_x
-        
-        # Плавное относительное движение
-        if raw_value < self.joy_x_center:
-            # Джойстик влево -> X уменьшается
-            delta = self.joy_x_center - raw_value
-            speed = min(delta / JOY_SPEED_DIVIDER, JOY_MAX_SPEED)
-            normalized = max(0, self.cursor_x - speed)
-        else:
-            # Джойстик вправо -> X увеличивается
-            delta = raw_value - self.joy_x_center
-            speed = min(delta / JOY_SPEED_DIVIDER, JOY_MAX_SPEED)
-            normalized = min(SCREEN_WIDTH - 1, self.cursor_x + speed)
-        
-        return normalized
-    
-    def normalize_joystick_y(self, raw_value):
-        """Нормализация значения Y джойстика (с инверсией)"""
-        if abs(raw_value - self.joy_y_center) < JOY_DEAD_ZONE:
-            return self.cursor_y
-        
-        # Инвертировано: если raw_value меньше центра, курсор идет вниз (Y увеличивается)
-        if raw_value < self.joy_y_center:
-            # Джойстик вверх -> курсор движется вниз (Y увеличивается)
-            delta = self.joy_y_center - raw_value
-            speed = min(delta / JOY_SPEED_DIVIDER, JOY_MAX_SPEED)
-            normalized = min(SCREEN_HEIGHT - 1, self.cursor_y + speed)
-        else:
-            # Джойстик вниз -> курсор движется вверх (Y уменьшается)
-            delta = raw_value - self.joy_y_center
-            speed = min(delta / JOY_SPEED_DIVIDER, JOY_MAX_SPEED)
-            normalized = max(0, self.cursor_y - speed)
-        
-        return normalized
-    
     def update_cursor(self, x, y):
         """Обновление позиции курсора"""
         self.cursor_x = int(x)
@@ -169,46 +410,104 @@ class PaintApp:
     def reset_game(self):
         """Перезагрузка игры - следующая картинка и очистка всего"""
         # Выбираем следующую картинку по порядку
-        if self.picture_type == 'human':
-            self.picture_type = 'flower'
-        else:
-            self.picture_type = 'human'
-        print(f"Выбрана новая картинка: {self.picture_type}")
-        
-        # Пересоздаем референсное изображение
-        self._draw_reference()
+        pictures = list(DRAWINGS)
+        index = pictures.index(self.picture_type) if self.picture_type in pictures else -1
+        new_index = (index + 1) % len(pictures)
+        if index >= 0:
+            # Отмена вернёт прежнюю картинку вместе с её заливками
+            self.history.record(encode_step(self._clear_changes(), (index, new_index)))
         
-        # Очищаем все заливки
+        # Сбрасываем курсоры в центр и выбранные цвета всех джойстиков
+        for player in self.players:
+            player.reset()
+        self._switch_picture(pictures[new_index])
+        log.info("Выбрана новая картинка: %s", self.picture_type)
+    
+    def _switch_picture(self, picture_type):
+        """Сменить картинку и очистить все заливки"""
+        self.picture_type = picture_type
+        # Образец и canvas перерисуются по снимку
         self.filled_figures = {}
+        self._figures_changed = True
+        self._journal_action(KIND_PICTURE, picture_type.encode('utf-8'))
+    
+    def _figure_id(self, figure_name):
+        """Номер фигуры текущей картинки для истории отмены"""
+        ids = self._figure_ids.get(self.picture_type)
+        if ids is None:
+            figures = DRAWINGS[self.picture_type].FIGURES
+            ids = self._figure_ids[self.picture_type] = {name: i for i, name in enumerate(figures)}
+        return ids[figure_name]
+    
+    def _clear_changes(self):
+        """Изменения истории для очистки всех заливок текущей картинки"""
+        return [encode_change(self._figure_id(name), color, None)
+                for name, color in self.filled_figures.items()]
+    
+    def undo(self):
+        """Отменить последнее действие с заливками"""
+        step = self.history.undo()
+        if step is None:
+            log.info("Нечего отменять")
+            return
+        self._apply_history_step(step, undo=True)
+        log.info("✓ Действие отменено")
+    
+    def redo(self):
+        """Повторить отменённое действие"""
+        step = self.history.redo()
+        if step is None:
+            log.info("Нечего повторять")
+            return
+        self._apply_history_step(step, undo=False)
+        log.info("✓ Действие повторено")
+    
+    def _apply_history_step(self, step, undo):
+        """Применить шаг истории назад (undo) или вперёд
         
-        # Перерисовываем canvas с новыми контурами
-        self._draw_canvas_outline(clear=True)
+        Меняются только затронутые фигуры, отрисовка перерисует их области
+        по снимку. Изменения дописываются в журнал как обычные действия.
+        """
+        picture_change, changes = decode_step(step)
+        pictures = list(DRAWINGS)
+        if picture_change is not None and undo:
+            self._switch_picture(pictures[picture_change[0]])
         
-        # Сбрасываем курсор в центр
-        self.cursor_x = CANVAS_WIDTH // 2
-        self.cursor_y = CANVAS_HEIGHT // 2
+        # Номера фигур относятся к прежней картинке: при отмене смены
+        # картинки она уже возвращена, при повторе ещё не сменена
+        figures = DRAWINGS[self.picture_type].FIGURES
+        for figure_id, old_code, new_code in changes:
+            name = figures[figure_id]
+            color = code_color(old_code if undo else new_code)
+            if color is None:
+                self.filled_figures.pop(name, None)
+                self._journal_action(KIND_CLEAR, name.encode('utf-8'))
+            else:
+                self.filled_figures[name] = color
+                self._journal_action(KIND_FILL, encode_fill(color, name))
+        self._figures_changed = True
         
-        # Сбрасываем выбранный цвет
-        self.selected_color = BLACK
-        self.color_index = 0
+        if picture_change is not None and not undo:
+            self._switch_picture(pictures[picture_change[1]])
     
     def handle_button(self, button):
         """Обработка нажатий кнопок"""
+        # Кнопка действует там, куда курсор дошёл к моменту нажатия
+        self._flush_samples()
         if button == "A" or button == "D":
             # Выбор цвета из панели (работают обе кнопки A и D)
             color_idx = self.get_color_at_panel(self.cursor_x, self.cursor_y)
             if color_idx is not None:
-                self.color_index = color_idx
-                self.selected_color = COLOR_PALETTE[color_idx]
-                print(f"Выбран цвет: {color_idx} - {COLOR_PALETTE[color_idx]}")
+                self.select_color(color_idx)
+                log.info("Выбран цвет: %s - %s", color_idx, COLOR_PALETTE[color_idx])
         elif button == "B":
             # Заливка фигуры на canvas
             canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
             canvas_screen_y = (SCREEN_HEIGHT - CANVAS_HEIGHT) // 2
             
-            if DEBUG_MODE:
-                print(f"[DEBUG] Кнопка B нажата. Курсор на экране: ({self.cursor_x}, {self.cursor_y})")
-                print(f"[DEBUG] Canvas на экране: ({canvas_screen_x}, {canvas_screen_y}) размером {CANVAS_WIDTH}x{CANVAS_HEIGHT}")
+            log.debug("[DEBUG] Кнопка B нажата. Курсор на экране: (%s, %s)", self.cursor_x, self.cursor_y)
+            log.debug("[DEBUG] Canvas на экране: (%s, %s) размером %sx%s",
+                      canvas_screen_x, canvas_screen_y, CANVAS_WIDTH, CANVAS_HEIGHT)
             
             if canvas_screen_x <= self.cursor_x <= canvas_screen_x + CANVAS_WIDTH and \
                canvas_screen_y <= self.cursor_y <= canvas_screen_y + CANVAS_HEIGHT:
@@ -216,21 +515,18 @@ class PaintApp:
                 canvas_x = self.cursor_x - canvas_screen_x
                 canvas_y = self.cursor_y - canvas_screen_y
                 
-                if DEBUG_MODE:
-                    print(f"[DEBUG] Курсор на canvas: ({canvas_x}, {canvas_y})")
+                log.debug("[DEBUG] Курсор на canvas: (%s, %s)", canvas_x, canvas_y)
                 
                 figure = self.get_figure_at_position(canvas_x, canvas_y)
                 if figure:
                     self.fill_figure(figure)
-                    print(f"✓ Залита фигура: {figure} цветом {self.selected_color}")
+                    log.info("✓ Залита фигура: %s цветом %s", figure, self.selected_color)
                 else:
-                    if DEBUG_MODE:
-                        print(f"[DEBUG] Фигура не найдена в позиции ({canvas_x}, {canvas_y})")
-                    print("Фигура не найдена. Убедитесь, что курсор на фигуре")
+                    log.debug("[DEBUG] Фигура не найдена в позиции (%s, %s)", canvas_x, canvas_y)
+                    log.info("Фигура не найдена. Убедитесь, что курсор на фигуре")
             else:
-                if DEBUG_MODE:
-                    print(f"[DEBUG] Курсор вне canvas")
-                print("Курсор вне области рисунка")
+                log.debug("[DEBUG] Курсор вне canvas")
+                log.info("Курсор вне области рисунка")
         elif button == "C":
             # Очистка фигуры под курсором
             canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
@@ -243,135 +539,573 @@ class PaintApp:
                 
                 figure = self.get_figure_at_position(canvas_x, canvas_y)
                 if figure and figure in self.filled_figures:
+                    self.history.record(encode_change(self._figure_id(figure), self.filled_figures[figure], None))
                     del self.filled_figures[figure]
-                    self._draw_canvas_outline(clear=True)
-                    print(f"✓ Очищена фигура: {figure}")
+                    self._figures_changed = True
+                    self._journal_action(KIND_CLEAR, figure.encode('utf-8'))
+                    log.info("✓ Очищена фигура: %s", figure)
                 else:
-                    print("Фигура не найдена или уже пустая")
+                    log.info("Фигура не найдена или уже пустая")
             else:
-                print("Курсор вне области рисунка")
+                log.info("Курсор вне области рисунка")
         elif button == "E":
             # Переключение на следующий рисунок
             self.reset_game()
-            print("✓ Игра перезагружена!")
+            log.info("✓ Игра перезагружена!")
         elif button == "F":
             # Очистка всего canvas
+            if self.filled_figures:
+                self.history.record(encode_step(self._clear_changes()))
             self.filled_figures = {}
-            self._draw_canvas_outline(clear=True)
-            print("✓ Canvas полностью очищен")
+            self._figures_changed = True
+            self._journal_action(KIND_CLEAR_ALL)
+            log.info("✓ Canvas полностью очищен")
+        elif button == "JOY" or button == "UNDO":
+            # Нажатие на джойстик (или Ctrl+Z) - отмена последнего действия
+            self.undo()
+        elif button == "REDO":
+            self.redo()
+    
+    def handle_joystick(self, x_raw, y_raw):
+        """Обработка одного отсчёта джойстика
+        
+        Отсчёт копится до кнопки или конца пачек и обрабатывается фильтром
+        вместе с остальными одним массивом (см. _flush_samples).
+        """
+        self._samples.append((x_raw, y_raw))
+    
+    def handle_coalesced(self, sample):
+        """Серия отсчётов, объединённая очередью при перегрузке
+        
+        Среднее отклонение учитывается столько раз, сколько было отсчётов,
+        поэтому курсор проходит примерно тот же путь.
+        """
+        self._samples.extend([(sample.x, sample.y)] * sample.count)
+    
+    def _flush_samples(self, until=None):
+        """Передать накопленные отсчёты фильтру текущего джойстика и сдвинуть курсор
+        
+        until - время прихода последнего отсчёта; без него (кнопка посреди
+        пачки) интервалы берутся по последней измеренной частоте.
+        """
+        if not self._samples:
+            return
+        joystick = self._player.filter
+        dts = joystick.intervals(len(self._samples), until)
+        x, y = joystick.process(self._samples, dts, (self.cursor_x, self.cursor_y))
+        self._samples = []
+        self.update_cursor(x, y)
     
     def parse_data(self, line):
-        """Парсинг данных от микроконтроллера"""
+        """Парсинг данных от микроконтроллера (текстовый протокол)"""
         if line.startswith("BTN:"):
             button = line[4:]
             self.handle_button(button)
-        elif line.startswith("X:") and "Y:" in line:
-            match = re.match(r'X:(\d+),Y:(\d+),B:(\d+)', line)
+        elif line.startswith("X:"):
+            match = TEXT_SAMPLE_RE.match(line)
             if match:
-                x_raw = int(match.group(1))
-                y_raw = int(match.group(2))
-                
-                x_normalized = self.normalize_joystick_x(x_raw)
-                y_normalized = self.normalize_joystick_y(y_raw)
-                
-                self.update_cursor(x_normalized, y_normalized)
+                self.handle_joystick(int(match.group(1)), int(match.group(2)))
     
-    def draw_ui(self):
-        """Отрисовка пользовательского интерфейса"""
+    def parse_frame(self, frame):
+        """Обработка кадра бинарного протокола (x, y, buttons, seq)"""
+        x_raw, y_raw, buttons, _seq = frame
+        if buttons & FLAG_SAMPLE:
+            self.handle_joystick(x_raw, y_raw)
+        if buttons & ~FLAG_SAMPLE:
+            for button in buttons_from_mask(buttons):
+                self.handle_button(button)
+    
+    def _get_font(self, size):
+        """Шрифт размера size (pygame.font инициализируется при первой надписи)"""
+        font = self._fonts.get(size)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(None, size)
+            self._fonts[size] = font
+        return font
+    
+    @property
+    def font(self):
+        return self._get_font(24)
+    
+    @property
+    def small_font(self):
+        return self._get_font(18)
+    
+    def _render_text(self, font, text):
+        """Отрендерить строку с кэшированием по (шрифт, текст)"""
+        key = (id(font), text)
+        surface = self._text_cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, BLACK)
+            self._text_cache[key] = surface
+        return surface
+    
+    def _build_ui_layer(self):
+        """Собрать статический слой интерфейса
+        
+        Слой размером с экран содержит фон, рамку canvas, образец, панель
+        цветов и подписи. На месте canvas - прозрачное окно (colorkey),
+        поэтому слой выводится поверх canvas одним blit.
+        """
+        layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        layer.fill(GRAY)
+        
+        canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
+        canvas_screen_y = (SCREEN_HEIGHT - CANVAS_HEIGHT) // 2
+        layer.fill(LAYER_COLORKEY, (canvas_screen_x, canvas_screen_y, CANVAS_WIDTH, CANVAS_HEIGHT))
+        
+        # Рамка вокруг canvas
+        self._draw_frame(layer, BLACK, 
+                         (canvas_screen_x - 2, canvas_screen_y - 2, 
+                          CANVAS_WIDTH + 4, CANVAS_HEIGHT + 4), 2)
+        
         # Референсное изображение (справа сверху)
         ref_x = SCREEN_WIDTH - REFERENCE_SIZE - 20
         ref_y = 20
-        self.screen.blit(self.reference_image, (ref_x, ref_y))
-        ref_label = self.small_font.render("Образец", True, BLACK)
-        self.screen.blit(ref_label, (ref_x, ref_y - 20))
+        layer.blit(self.reference_image, (ref_x, ref_y))
+        layer.blit(self._render_text(self.small_font, "Образец"), (ref_x, ref_y - 20))
         
         # Панель цветов (справа)
         panel_start_y = 250
-        color_size = 40
-        color_spacing = 10
-        
-        color_label = self.small_font.render("Цвета:", True, BLACK)
-        self.screen.blit(color_label, (COLOR_PANEL_X, panel_start_y - 20))
+        layer.blit(self._render_text(self.small_font, "Цвета:"), (COLOR_PANEL_X, panel_start_y - 20))
         
         for i, color in enumerate(COLOR_PALETTE):
-            color_y = panel_start_y + i * (color_size + color_spacing)
-            color_rect = pygame.Rect(COLOR_PANEL_X, color_y, color_size, color_size)
+            color_rect = self._color_rect(i)
             
             # Рисуем квадрат цвета
-            pygame.draw.rect(self.screen, color, color_rect)
-            pygame.draw.rect(self.screen, BLACK, color_rect, 2)
-            
-            # Подсветка выбранного цвета
-            if i == self.color_index:
-                pygame.draw.rect(self.screen, YELLOW, color_rect, 4)
+            layer.fill(color, color_rect)
+            self._draw_frame(layer, BLACK, color_rect, 2)
+        
+        # Подсветка выбранных цветов: первый джойстик - жёлтым, остальные -
+        # цветом своего курсора; первый рисуется последним, поверх остальных
+        color_indices = self._view.color_indices
+        for player in reversed(range(len(color_indices))):
+            if color_indices[player] is None:
+                continue
+            highlight = YELLOW if player == 0 else PLAYER_COLORS[player % len(PLAYER_COLORS)]
+            self._draw_frame(layer, highlight, self._color_rect(color_indices[player]), 4)
         
         # Информация
         info_y = 10
-        picture_name = "Человечек" if self.picture_type == 'human' else "Цветок"
-        picture_text = self.font.render(f"Картинка: {picture_name}", True, BLACK)
-        self.screen.blit(picture_text, (10, info_y))
-        color_text = self.font.render(f"Выбран цвет: {self.color_index}", True, BLACK)
-        self.screen.blit(color_text, (10, info_y + 30))
+        picture_name = DRAWINGS[self._view.picture_type].title
+        selected = " / ".join(str(index) for index in color_indices if index is not None)
+        layer.blit(self._render_text(self.font, f"Картинка: {picture_name}"), (10, info_y))
+        layer.blit(self._render_text(self.font, f"Выбран цвет: {selected}"), (10, info_y + 30))
+        
+        layer.blit(self._render_text(self.small_font, "A/D - Выбрать цвет | B - Залить фигуру | C - Очистить фигуру"),
+                   (10, SCREEN_HEIGHT - 50))
+        layer.blit(self._render_text(self.small_font, "E - След. рисунок | F - Очистить всё"),
+                   (10, SCREEN_HEIGHT - 30))
         
-        hint_text = self.small_font.render("A/D - Выбрать цвет | B - Залить фигуру | C - Очистить фигуру", True, BLACK)
-        self.screen.blit(hint_text, (10, SCREEN_HEIGHT - 50))
-        hint_text2 = self.small_font.render("E - След. рисунок | F - Очистить всё", True, BLACK)
-        self.screen.blit(hint_text2, (10, SCREEN_HEIGHT - 30))
+        layer.set_colorkey(LAYER_COLORKEY, pygame.RLEACCEL)
+        self._ui_layer = layer
+        self._ui_layer_key = (self._view.picture_type, self._view.color_indices)
     
-    def run(self):
-        """Главный цикл приложения"""
-        if not self.serial_handler.find_and_connect():
-            return
+    def draw_ui(self):
+        """Отрисовка пользовательского интерфейса
         
-        self.serial_handler.start_reading()
+        Слой пересобирается только при смене картинки или цвета.
+        """
+        if self._ui_layer_key != (self._view.picture_type, self._view.color_indices):
+            self._build_ui_layer()
+        self.screen.blit(self._ui_layer, (0, 0))
+        if self.coloring_score is not None:
+            text = f"Точность: {self.coloring_score.percent:.0f}%"
+            self.screen.blit(self._render_text(self.font, text), self._score_rect())
+    
+    def _score_rect(self):
+        """Строка оценки раскраски слева от canvas"""
+        return pygame.Rect(10, 70, (SCREEN_WIDTH - CANVAS_WIDTH) // 2 - 12, 25)
+    
+    @staticmethod
+    def _draw_frame(surface, color, rect, width):
+        """Рамка толщиной width внутри rect
+        
+        pygame.draw.rect с параметром width смещает рамку при включённом
+        set_clip, поэтому рамка собирается из четырёх заливок.
+        """
+        x, y, w, h = rect
+        surface.fill(color, (x, y, w, width))
+        surface.fill(color, (x, y + h - width, w, width))
+        surface.fill(color, (x, y, width, h))
+        surface.fill(color, (x + w - width, y, width, h))
+    
+    def _cursor_rect(self, cursor):
+        """Область экрана, занятая курсором"""
+        x, y = cursor
+        return pygame.Rect(x - 6, y - 6, 13, 13)
+    
+    def draw_scene(self):
+        """Полная отрисовка сцены на экран (без вывода на дисплей)"""
+        # Основной canvas (по центру)
+        canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
+        canvas_screen_y = (SCREEN_HEIGHT - CANVAS_HEIGHT) // 2
+        self.screen.blit(self.canvas, (canvas_screen_x, canvas_screen_y))
+        
+        # Фон, рамка и UI элементы - один слой поверх canvas
+        self.draw_ui()
+        
+        # Курсоры (первый джойстик - поверх остальных)
+        cursors = self._view.cursors
+        for player in reversed(range(len(cursors))):
+            if cursors[player] is None:
+                continue
+            color = PLAYER_COLORS[player % len(PLAYER_COLORS)]
+            pygame.draw.circle(self.screen, color, cursors[player], 5, 2)
+            pygame.draw.circle(self.screen, color, cursors[player], 1)
+    
+    def render_frame(self):
+        """Отрисовка кадра
+        
+        В режиме DIRTY_RECT_RENDERING сцена перерисовывается только внутри
+        изменившихся областей (старый и новый курсор, палитра, залитая
+        фигура), и на дисплей выгружаются только они.
+        
+        Кадр рисует последний опубликованный снимок состояния ввода. Если
+        ничего не изменилось, экран не трогается. Возвращает True, если
+        что-то нарисовано.
+        """
+        self._apply_snapshot(self._snapshot)
+        cursors = self._view.cursors
+        moving = cursors != self._drawn_cursors
+        if self._full_redraw or (not DIRTY_RECT_RENDERING and (moving or self._dirty_rects)):
+            self.draw_scene()
+            pygame.display.flip()
+            drawn = True
+        else:
+            if moving:
+                for old, new in zip_longest(self._drawn_cursors, cursors):
+                    if old != new:
+                        for cursor in (old, new):
+                            if cursor is not None:
+                                self.mark_dirty(self._cursor_rect(cursor))
+            
+            rects = self._merge_rects(self._dirty_rects)
+            if rects:
+                for rect in rects:
+                    self.screen.set_clip(rect)
+                    self.draw_scene()
+                self.screen.set_clip(None)
+                pygame.display.update(rects)
+            drawn = bool(rects)
+        
+        displayed_at = time.monotonic()
+        self.pacer.frame(drawn, moving, displayed_at)
+        if self.first_frame_at is None:
+            self.first_frame_at = displayed_at
+        if self.latency is not None:
+            self.latency.displayed(self._view.seq, displayed_at)
+        self._drawn_cursors = cursors
+        self._dirty_rects = []
+        self._full_redraw = False
+        return drawn
+    
+    def _snapshot_changed(self):
+        """Опубликован снимок, который выглядит не так, как нарисованный
+        
+        Номер снимка не сравнивается: пачка отсчётов в мёртвой зоне
+        публикует новый снимок, но кадр для него не нужен.
+        """
+        return self._snapshot[1:] != self._view[1:]
+    
+    def _needs_frame(self):
+        """Есть что рисовать или сохранять"""
+        return (self._full_redraw or bool(self._dirty_rects) or self._export_requested
+                or self._snapshot_changed())
+    
+    @staticmethod
+    def _merge_rects(rects):
+        """Объединить пересекающиеся области, чтобы не рисовать их дважды"""
+        merged = []
+        for rect in rects:
+            index = rect.collidelist(merged)
+            while index >= 0:
+                rect = rect.union(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+    
+    def process_input(self):
+        """Обработка всех накопленных данных от платы, возвращает их количество"""
+        return self._handle_batches(self.serial_handler.get_batches() + self._keyboard_batches())
+    
+    def _keyboard_batches(self):
+        """Нажатые с клавиатуры кнопки одной пачкой первого джойстика"""
+        if not self._keyboard_buttons:
+            return []
+        buttons = []
+        while self._keyboard_buttons:
+            buttons.append("BTN:" + self._keyboard_buttons.popleft())
+        return [(time.monotonic(), buttons, 0)]
+    
+    def _handle_batches(self, batches):
+        """Применить пачки (время приёма, записи, номер устройства) и опубликовать снимок
+        
+        Возвращает количество обработанных записей.
+        """
+        if not batches:
+            return 0
+        count = 0
+        handled = []
+        for received_at, items, device_id in batches:
+            dequeued_at = time.monotonic()
+            self._select_player(device_id)
+            button = self._handle_items(items)
+            self._samples_until = self._sample_clock() if self._sample_clock else received_at
+            count += len(items)
+            handled.append((received_at, dequeued_at, time.monotonic(), button))
+        self._flush_samples(self._samples_until)
+        changed = self.publish_snapshot()
         
+        if self.latency is not None:
+            # Пачки без видимых изменений не ждут кадра: иначе их задержкой
+            # стало бы время до следующего изменения
+            seq = self._snapshot.seq
+            for received_at, dequeued_at, handled_at, button in handled:
+                if changed:
+                    self.latency.input_handled(seq, received_at, dequeued_at, handled_at, button)
+                else:
+                    self.latency.input_unchanged(received_at, dequeued_at, handled_at)
+        return count
+    
+    def _select_player(self, device_id):
+        """Сделать текущим джойстик устройства device_id (новый - в центре)"""
+        if device_id != self._player_id:
+            # Отсчёты прежнего джойстика двигают его курсор
+            self._flush_samples(self._samples_until)
+        while len(self.players) <= device_id:
+            # Номера между прежними и device_id - ещё не подключившиеся устройства
+            player = Player()
+            player.active = False
+            self.players.append(player)
+        self._player = self.players[device_id]
+        self._player.active = True
+        self._player_id = device_id
+    
+    def _release_player(self):
+        """Устройство текущего джойстика отключилось (клиент сети ушёл)
+        
+        Курсор убирается с экрана, а следующее устройство с тем же номером
+        начинает с новым джойстиком: в центре, с первым цветом и без
+        калибровки прежнего.
+        """
+        self._samples = []
+        player = self.players[self._player_id] = Player()
+        player.active = False
+        self._player = player
+        self._journal_action(KIND_RELEASE)
+        # Отключившиеся в конце списка больше не нужны
+        while len(self.players) > 1 and not self.players[-1].active:
+            self.players.pop()
+    
+    def _handle_items(self, items):
+        """Обработать записи одной пачки, возвращает True, если в ней были кнопки"""
+        button = False
+        for item in items:
+            try:
+                if item is DEVICE_RELEASED:
+                    self._release_player()
+                    continue
+                if isinstance(item, CoalescedSample):
+                    self.handle_coalesced(item)
+                    continue
+                if isinstance(item, tuple):
+                    button |= bool(item[2] & ~FLAG_SAMPLE)
+                    self.parse_frame(item)
+                    continue
+                if item.startswith("BTN:"):
+                    button = True
+                    log.debug("[DEBUG] Кнопка: %s", item)
+                self.parse_data(item)
+            except Exception as e:
+                log.debug("[ERROR] Ошибка: %s", e)
+        return button
+    
+    def start_input_thread(self):
+        """Запуск потока обработки данных платы"""
+        if self._input_thread is None:
+            self._input_running = True
+            self._input_thread = threading.Thread(target=self._input_loop, daemon=True)
+            self._input_thread.start()
+    
+    def stop_input_thread(self):
+        """Остановка потока обработки данных платы"""
+        self._input_running = False
+        if self._input_thread:
+            self._input_thread.join(timeout=1.0)
+            self._input_thread = None
+    
+    def _input_loop(self):
+        """Поток ввода: отсчёты и кнопки обрабатываются по мере прихода
+        
+        Курсор интегрируется с частотой отсчётов платы, кнопки срабатывают
+        без ожидания кадра. Поток меняет только состояние ввода (курсор,
+        цвет, залитые фигуры, картинку); canvas и экран перерисовываются в
+        главном потоке по опубликованному снимку, поэтому задержки
+        отрисовки не тормозят и не искажают ввод.
+        """
+        while self._input_running:
+            batches = self.serial_handler.wait_batches(INPUT_WAIT_TIMEOUT)
+            if self._handle_batches(batches + self._keyboard_batches()) and self._frame_waiting:
+                self._wake_frame()
+    
+    def _wake_frame(self):
+        """Разбудить главный цикл, ждущий изменений (поток ввода)"""
+        if self._snapshot_changed():
+            self._frame_waiting = False
+            pygame.event.post(pygame.event.Event(FRAME_WAKEUP))
+    
+    def step(self):
+        """Один кадр: события окна, данные платы, отрисовка
+        
+        Возвращает False, если пользователь закрыл приложение.
+        """
         running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+        events = pygame.event.get()
+        if self._waited_events:
+            events = self._waited_events + events
+            self._waited_events = []
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
                     running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        running = False
-            
-            # Обработка данных из очереди
-            while True:
-                line = self.serial_handler.get_data()
-                if line is None:
-                    break
-                try:
-                    if DEBUG_MODE:
-                        if line.startswith("BTN:"):
-                            print(f"[DEBUG] Кнопка: {line}")
-                    self.parse_data(line)
-                except Exception as e:
-                    if DEBUG_MODE:
-                        print(f"[ERROR] Ошибка: {e}")
-            
-            # Отрисовка
-            self.screen.fill(GRAY)
-            
-            # Основной canvas (по центру)
-            canvas_screen_x = (SCREEN_WIDTH - CANVAS_WIDTH) // 2
-            canvas_screen_y = (SCREEN_HEIGHT - CANVAS_HEIGHT) // 2
-            self.screen.blit(self.canvas, (canvas_screen_x, canvas_screen_y))
-            
-            # Рамка вокруг canvas
-            pygame.draw.rect(self.screen, BLACK, 
-                           (canvas_screen_x - 2, canvas_screen_y - 2, 
-                            CANVAS_WIDTH + 4, CANVAS_HEIGHT + 4), 2)
-            
-            # UI элементы
-            self.draw_ui()
-            
-            # Курсор
-            pygame.draw.circle(self.screen, RED, (self.cursor_x, self.cursor_y), 5, 2)
-            pygame.draw.circle(self.screen, RED, (self.cursor_x, self.cursor_y), 1)
-            
-            pygame.display.flip()
-            self.clock.tick(60)
+                elif event.mod & pygame.KMOD_CTRL and event.key == pygame.K_s:
+                    self._export_requested = True
+                elif event.mod & pygame.KMOD_CTRL and event.key in (pygame.K_z, pygame.K_y):
+                    # Отмена и повтор выполняются в потоке ввода, как кнопки платы
+                    redo = event.key == pygame.K_y or event.mod & pygame.KMOD_SHIFT
+                    self._keyboard_buttons.append("REDO" if redo else "UNDO")
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.mark_full_redraw()
         
+        # Обработка данных из очереди, если нет отдельного потока ввода
+        if self._input_thread is None:
+            self.process_input()
+        
+        self.render_frame()
+        if self.exporter is not None:
+            self._export_finished()
+        return running
+    
+    def wait_frame(self):
+        """Ждать, пока будет что рисовать и подойдёт время следующего кадра
+        
+        Без изменений главный поток спит: с потоком ввода - до события окна
+        или FRAME_WAKEUP от потока ввода, без него - на очереди данных платы
+        (по FRAME_IDLE_POLL, чтобы не задерживать клавиатуру). Сон не
+        дольше FRAME_IDLE_TIMEOUT, чтобы цикл замечал отказ источника.
+        """
+        if not FRAME_PACING:
+            self.clock.tick(FRAME_RATE)
+            return
+        if not self._needs_frame():
+            start = time.monotonic()
+            if self._input_thread is None:
+                batches = self.serial_handler.wait_batches(FRAME_IDLE_POLL)
+                self._handle_batches(batches + self._keyboard_batches())
+            else:
+                self._wait_events(FRAME_IDLE_TIMEOUT)
+            self.pacer.idle(time.monotonic() - start)
+        delay = self.pacer.delay(time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _wait_events(self, timeout):
+        """Спать до события окна или пробуждения потоком ввода"""
+        # Флаг ставится до проверки: снимок, опубликованный после неё,
+        # поток ввода увидит вместе с флагом и разбудит цикл
+        self._frame_waiting = True
+        if not self._needs_frame():
+            event = pygame.event.wait(int(timeout * 1000))
+            if event.type not in (pygame.NOEVENT, FRAME_WAKEUP):
+                self._waited_events.append(event)
+        self._frame_waiting = False
+    
+    def report_frames(self):
+        """Сводка кадров: нарисованные и пустые, доля времени в ожидании"""
+        summary = self.pacer.summary()
+        log.info("Кадров нарисовано: %s (с движением курсора %s), пустых: %s, в ожидании %.0f%% времени",
+                 summary['frames'], summary['moving_frames'], summary['idle_frames'],
+                 summary['idle_share'] * 100)
+    
+    def _export_finished(self):
+        """Сохранить canvas по Ctrl+S или когда залиты все части рисунка
+        
+        Вызывается после кадра: canvas уже соответствует снимку _view.
+        Залитые фигуры снимка копируются только при изменениях, поэтому
+        проверка стоит одного сравнения на кадр.
+        """
+        view = self._view
+        if view.filled_figures is not self._checked_figures:
+            self._checked_figures = view.filled_figures
+            if len(view.filled_figures) == len(DRAWINGS[view.picture_type].FIGURES):
+                self._export_requested = True
+        if self._export_requested:
+            self._export_requested = False
+            self.export_canvas()
+    
+    def export_canvas(self):
+        """Поставить нарисованную раскраску в очередь сохранения (главный поток)"""
+        view = self._view
+        return self.exporter.submit(self.canvas, view.picture_type, view.filled_figures)
+    
+    def report_latency(self):
+        """Вывести и сохранить сводку задержек"""
+        if self.latency is None:
+            return
+        app_log.flush()
+        print("Задержка от приёма данных до экрана:")
+        self.latency.print_summary()
+        if self.latency_report:
+            try:
+                self.latency.export(self.latency_report)
+                print(f"✓ Задержки сохранены в {self.latency_report}")
+            except OSError as e:
+                print(f"✗ Не удалось сохранить задержки: {e}")
+    
+    def start_connecting(self):
+        """Начать поиск платы в фоне; окно тем временем уже рисуется"""
+        if self._connect_thread is None:
+            self._connect_thread = threading.Thread(target=self._connect_source, daemon=True)
+            self._connect_thread.start()
+    
+    def _connect_source(self):
+        """Подключение источника данных (поток поиска)"""
+        if not self.serial_handler.find_and_connect():
+            if not getattr(self.serial_handler, 'auto_reconnect', False):
+                self._source_failed = True
+                return
+            # Поток чтения будет искать плату в фоне, окно уже работает
+            log.info("Ожидание подключения платы...")
+        self.serial_handler.start_reading()
+    
+    def run(self):
+        """Главный цикл приложения
+        
+        Поиск платы запускается в фоне до первого кадра, поэтому окно
+        появляется сразу, а не после перебора портов. Если плата не
+        найдена и источник не умеет переподключаться, цикл завершается.
+        """
+        self.start_connecting()
+        if INPUT_THREAD:
+            self.start_input_thread()
+        
+        while self.step() and not self._source_failed:
+            self.wait_frame()
+        
+        self.stop_input_thread()
+        # Не закрывать источник посреди поиска порта
+        self._connect_thread.join(timeout=2.0)
         self.serial_handler.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.exporter is not None:
+            self.exporter.close()
+        self.report_frames()
+        self.report_latency()
         pygame.quit()
         sys.exit()
-
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Поиск платы среди последовательных портов
+
+Все порты-кандидаты проверяются одновременно в пуле потоков: порт
+открывается один раз и сначала только слушается - плата сама шлёт отсчёты.
+Запрос бинарного протокола получает лишь порт, приславший строку
+текстового протокола или бинарные кадры; модемам и другим устройствам
+на соседних портах хост ничего не пишет. Порт и
+VID/PID найденной платы запоминаются в SERIAL_PORT_CACHE и при следующем
+запуске проверяются первыми, отдельно от остальных.
+"""
+
+import glob
+import json
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+import serial.tools.list_ports
+
+from app_log import get_logger
+from config import (BAUD_RATE, SERIAL_READ_TIMEOUT, SERIAL_PROTOCOL,
+                    SERIAL_LISTEN_TIMEOUT, SERIAL_HANDSHAKE_TIMEOUT, SERIAL_PORT_CACHE,
+                    SERIAL_PROBE_WORKERS)
+from protocol import BinaryDecoder, HANDSHAKE_REQUEST, HANDSHAKE_ACK, TEXT_SAMPLE_RE
+
+log = get_logger('serial')
+
+# Результат проверки порта. confirmed - на порту точно наша плата
+# (подтвердила протокол или прислала правильную строку), tail - байты,
+# принятые во время проверки и ещё не разобранные
+ProbeResult = namedtuple('ProbeResult', 'port serial_port protocol tail confirmed')
+
+# Столько правильных бинарных кадров подряд достаточно, чтобы признать
+# плату, оставшуюся в бинарном режиме (один кадр может совпасть случайно)
+BOARD_BINARY_FRAMES = 2
+
+# Признаки платы NUCLEO (ST-LINK) в описании порта и её VID
+STM_KEYWORDS = ('STM', 'ST MICRO', 'STLINK', 'NUCLEO', 'VIRTUAL COM', 'ST MICROELECTRONICS')
+STM_VID = 0x0483
+
+
+def _is_board_line(line):
+    """Строка текстового протокола платы"""
+    return bool(TEXT_SAMPLE_RE.match(line)) or line.startswith("BTN:")
+
+
+def _has_board_line(received):
+    lines = bytes(received).decode('utf-8', errors='ignore').split('\n')
+    # Последний кусок может быть неполной строкой
+    return any(_is_board_line(line.strip()) for line in lines[:-1])
+
+
+def _listen(serial_port):
+    """Слушать порт, пока он не станет похож на плату
+    
+    Ничего не отправляет. Ждёт не дольше SERIAL_LISTEN_TIMEOUT правильной
+    строки текстового протокола или (в режиме 'auto') BOARD_BINARY_FRAMES
+    бинарных кадров. Возвращает (принятые байты, похож на плату).
+    """
+    received = bytearray()
+    decoder = BinaryDecoder() if SERIAL_PROTOCOL == 'auto' else None
+    frames = 0
+    deadline = time.monotonic() + SERIAL_LISTEN_TIMEOUT
+    while time.monotonic() < deadline:
+        chunk = serial_port.read(serial_port.in_waiting or 1)
+        received += chunk
+        if decoder is not None:
+            frames += len(decoder.feed(chunk))
+        if frames >= BOARD_BINARY_FRAMES or _has_board_line(received):
+            return bytes(received), True
+    return bytes(received), False
+
+
+def handshake(serial_port):
+    """Согласование протокола на открытом порту
+    
+    Сначала порт только слушается (см. _listen()); порт, не приславший
+    данных платы, не подтверждается, и в него ничего не пишется. Плате
+    в режиме 'auto' отправляется запрос бинарного протокола, подтверждение
+    ждётся не дольше SERIAL_HANDSHAKE_TIMEOUT; старая прошивка запрос
+    игнорирует, и остаётся текстовый протокол.
+    Возвращает (протокол, принятые байты после подтверждения, подтверждено).
+    """
+    received, board = _listen(serial_port)
+    if not board or SERIAL_PROTOCOL != 'auto':
+        # Текстовые строки, пришедшие во время ожидания, не теряем
+        return 'text', received, board
+    
+    received = bytearray(received)
+    start = len(received)
+    serial_port.write(HANDSHAKE_REQUEST)
+    deadline = time.monotonic() + SERIAL_HANDSHAKE_TIMEOUT
+    while time.monotonic() < deadline:
+        received += serial_port.read(serial_port.in_waiting or 1)
+        ack = received.find(HANDSHAKE_ACK, start)
+        if ack >= 0:
+            # Всё, что пришло после подтверждения, - уже бинарные кадры
+            return 'binary', bytes(received[ack + len(HANDSHAKE_ACK):]), True
+    
+    return 'text', bytes(received), True
+
+
+def probe(port):
+    """Открыть порт и проверить, что на нём плата (None - порт не открылся)"""
+    try:
+        serial_port = serial.Serial(port, BAUD_RATE, timeout=SERIAL_READ_TIMEOUT)
+    except Exception:
+        return None
+    try:
+        protocol, tail, confirmed = handshake(serial_port)
+    except Exception as e:
+        log.debug("[DEBUG] Ошибка проверки порта %s: %s", port, e)
+        protocol, tail, confirmed = 'text', b'', False
+    return ProbeResult(port, serial_port, protocol, tail, confirmed)
+
+
+def load_cache():
+    """Последняя найденная плата: {'port', 'vid', 'pid', 'serial_number'} или {}"""
+    try:
+        with open(SERIAL_PORT_CACHE, encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(port, port_info=None):
+    cache = {'port': port}
+    if port_info is not None:
+        cache.update(vid=port_info.vid, pid=port_info.pid, serial_number=port_info.serial_number)
+    try:
+        with open(SERIAL_PORT_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        log.debug("[DEBUG] Не удалось сохранить кэш порта: %s", e)
+
+
+def _fallback_ports():
+    """Имена портов, которые проверяются, даже если их нет в списке системы"""
+    if sys.platform.startswith('win'):
+        return [f'COM{n}' for n in range(3, 11)]
+    return sorted(glob.glob('/dev/ttyACM*')) + sorted(glob.glob('/dev/ttyUSB*'))
+
+
+def _is_stm_port(info):
+    """Порт ST-LINK по VID или описанию"""
+    if info is None:
+        return False
+    description = (info.description or '').upper()
+    return info.vid == STM_VID or any(keyword in description for keyword in STM_KEYWORDS)
+
+
+def _cached_port(cache, infos):
+    """Порт последней найденной платы: по VID/PID и серийному номеру, иначе по имени"""
+    if cache.get('vid') is not None:
+        key = (cache.get('vid'), cache.get('pid'), cache.get('serial_number'))
+        for port, info in infos.items():
+            if (info.vid, info.pid, info.serial_number) == key:
+                return port
+    return cache.get('port')
+
+
+def candidate_ports(cache=None):
+    """Порты для проверки по убыванию приоритета
+    
+    Возвращает (список имён, {имя: ListPortInfo}, порт из кэша или None).
+    Первым идёт порт из кэша, затем порты ST-LINK, затем остальные
+    порты системы и стандартные имена, которых нет в её списке.
+    """
+    cache = cache or {}
+    try:
+        infos = {info.device: info for info in serial.tools.list_ports.comports()}
+    except Exception:
+        infos = {}
+    cached = _cached_port(cache, infos)
+    
+    def rank(port):
+        if port == cached:
+            return 0
+        info = infos.get(port)
+        if info is None:
+            return 3
+        return 1 if _is_stm_port(info) else 2
+    
+    ports = list(infos)
+    for port in _fallback_ports() + ([cached] if cached else []):
+        if port not in ports:
+            ports.append(port)
+    # sorted устойчив: внутри одного приоритета сохраняется порядок системы
+    return sorted(ports, key=rank), infos, cached
+
+
+def _close(result):
+    if result is not None:
+        try:
+            result.serial_port.close()
+        except Exception:
+            pass
+
+
+def discover():
+    """Найти плату: ProbeResult с открытым портом или None
+    
+    Возвращается сразу после первого подтверждения; остальные проверки
+    доделываются в фоне и закрывают свои порты. Если ни один порт не
+    подтвердился, выбирается первый по приоритету открывшийся порт из
+    кэша или ST-LINK (плата могла ещё не начать передачу); молчащие
+    порты других устройств не выбираются.
+    """
+    cache = load_cache()
+    ports, infos, cached = candidate_ports(cache)
+    if not ports:
+        return None
+    
+    # Порт из кэша - отдельно и первым: обычно это сразу плата
+    opened = {}
+    if cached is not None:
+        result = probe(cached)
+        if result is not None and result.confirmed:
+            save_cache(result.port, infos.get(result.port))
+            return result
+        if result is not None:
+            # Открылся, но молчит: повторно не проверяется, остаётся
+            # кандидатом, если не ответит никто другой
+            opened[cached] = result
+    
+    rest = [port for port in ports if port != cached]
+    pool = ThreadPoolExecutor(max_workers=max(1, min(len(rest), SERIAL_PROBE_WORKERS)))
+    futures = [pool.submit(probe, port) for port in rest]
+    found = None
+    for future in as_completed(futures):
+        result = future.result()
+        if result is None:
+            continue
+        if result.confirmed:
+            found = result
+            break
+        opened[result.port] = result
+    
+    if found is None:
+        for port in ports:
+            if port in opened and (port == cached or _is_stm_port(infos.get(port))):
+                found = opened[port]
+                log.info("Плата не ответила, используется порт ST-LINK %s", port)
+                break
+    
+    def close_unused(future):
+        result = future.result()
+        if result is not found:
+            _close(result)
+    
+    if cached in opened and opened[cached] is not found:
+        _close(opened[cached])
+    for future in futures:
+        # Для завершённых проверок вызывается сразу, для остальных - по окончании
+        future.add_done_callback(close_unused)
+    pool.shutdown(wait=False)
+    
+    if found is not None and found.confirmed:
+        save_cache(found.port, infos.get(found.port))
+    return found
+
+
+def probe_all(ports):
+    """Проверить порты параллельно; результаты в порядке ports (None - не открылся)"""
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(ports), SERIAL_PROBE_WORKERS))) as pool:
+        return list(pool.map(probe, ports))
+
+
+def discover_all(limit=None):
+    """Найти все подключённые платы: список ProbeResult с открытыми портами
+    
+    В отличие от discover() ждёт окончания всех проверок и берёт только
+    подтвердившиеся порты (по приоритету, не больше limit).
+    """
+    ports, _infos, _cached = candidate_ports(load_cache())
+    found = []
+    for result in probe_all(ports):
+        if result is None:
+            continue
+        if result.confirmed and (limit is None or len(found) < limit):
+            found.append(result)
+        else:
+            _close(result)
+    return found
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Компактный бинарный протокол джойстика
+
+Кадр фиксированной длины (8 байт, little-endian):
+    sync (0xA5) | x (uint16) | y (uint16) | кнопки (uint8) | seq (uint8) | crc (uint8)
+
+crc - XOR всех байт кадра после sync. Младшие биты поля кнопок - нажатые
+кнопки (см. BUTTON_BITS), старший бит FLAG_SAMPLE означает, что x/y - это
+плановый отсчёт джойстика, а не кадр, отправленный только ради кнопки.
+"""
+
+import re
+import struct
+
+SYNC_BYTE = 0xA5
+FRAME = struct.Struct('<BHHBBB')
+FRAME_SIZE = FRAME.size
+
+# Биты поля кнопок в порядке младший -> старший
+BUTTON_BITS = ('A', 'B', 'C', 'D', 'E', 'F', 'JOY')
+FLAG_SAMPLE = 0x80
+
+# Согласование протокола при подключении
+HANDSHAKE_REQUEST = b'PROTO:BIN\n'
+HANDSHAKE_ACK = b'ACK:BIN\n'
+TEXT_MODE_REQUEST = b'PROTO:TXT\n'
+
+# Текстовый кадр "X:1234,Y:5678,B:0"
+TEXT_SAMPLE_RE = re.compile(r'X:(\d+),Y:(\d+),B:(\d+)')
+
+
+def checksum(x, y, buttons, seq):
+    """Контрольная сумма кадра по уже распакованным полям"""
+    return (x ^ (x >> 8) ^ y ^ (y >> 8) ^ buttons ^ seq) & 0xFF
+
+
+def encode_frame(x, y, buttons=FLAG_SAMPLE, seq=0):
+    """Собрать бинарный кадр (используется в тестах и симуляторах)"""
+    seq &= 0xFF
+    return FRAME.pack(SYNC_BYTE, x, y, buttons, seq, checksum(x, y, buttons, seq))
+
+
+def buttons_from_mask(mask):
+    """Список имён кнопок, чьи биты выставлены в маске"""
+    return [name for bit, name in enumerate(BUTTON_BITS) if mask & (1 << bit)]
+
+
+class BinaryDecoder:
+    """Потоковый декодер бинарных кадров
+
+    Принимает произвольные куски байт, возвращает список кортежей
+    (x, y, buttons, seq). Выровненный участок буфера разбирается одним
+    проходом struct.iter_unpack; при сбое синхронизации или контрольной
+    суммы декодер сдвигается на байт и ищет следующий sync.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._last_seq = None
+        self.bad_frames = 0
+        self.lost_frames = 0
+
+    def feed(self, data):
+        """Добавить байты и вернуть все полностью принятые кадры"""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        pos = 0
+
+        while True:
+            pos = buffer.find(SYNC_BYTE, pos)
+            if pos < 0:
+                pos = len(buffer)
+                break
+
+            count = (len(buffer) - pos) // FRAME_SIZE
+            if count == 0:
+                break
+
+            end = pos + count * FRAME_SIZE
+            with memoryview(buffer)[pos:end] as view:
+                for sync, x, y, buttons, seq, crc in FRAME.iter_unpack(view):
+                    if sync != SYNC_BYTE or crc != checksum(x, y, buttons, seq):
+                        break
+                    frames.append((x, y, buttons, seq))
+                    pos += FRAME_SIZE
+
+            if pos < end:
+                # Испорченный кадр - пропускаем байт и ищем следующий sync
+                self.bad_frames += 1
+                pos += 1
+
+        del buffer[:pos]
+        self._count_lost(frames)
+        return frames
+
+    def _count_lost(self, frames):
+        """Подсчёт пропущенных кадров по разрывам в seq"""
+        last = self._last_seq
+        for frame in frames:
+            seq = frame[3]
+            if last is not None:
+                self.lost_frames += (seq - last - 1) & 0xFF
+            last = seq
+        self._last_seq = last
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Воспроизведение записанного сеанса без платы
+    
+    python replay.py session.pslog              # в реальном времени, с окном
+    python replay.py session.pslog --max-speed  # без окна, как можно быстрее
+
+В режиме --max-speed используется видеодрайвер SDL dummy, а в конце
+выводятся кадры/с, строки/с и итоговые залитые фигуры - этим удобно
+сравнивать производительность разбора и отрисовки между версиями.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение журнала сеанса")
+    parser.add_argument('log', help="файл журнала, записанный через main.py --record")
+    parser.add_argument('--max-speed', action='store_true',
+                        help="без окна и без ожидания, с отчётом о производительности")
+    parser.add_argument('--verbose', action='store_true',
+                        help="не подавлять вывод приложения в режиме --max-speed")
+    parser.add_argument('--latency-report', metavar='PATH',
+                        help="сохранить задержки по этапам (.csv или .json)")
+    args = parser.parse_args()
+    
+    if args.max_speed:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    
+    import app_log
+    from paint_app import PaintApp
+    from session_log import ReplaySource
+    
+    source = ReplaySource(args.log, realtime=not args.max_speed)
+    app = PaintApp(source, latency_report=args.latency_report)
+    if not source.find_and_connect():
+        return 1
+    source.start_reading()
+    
+    if not args.max_speed:
+        while app.step() and not source.exhausted:
+            app.wait_frame()
+        app.report_frames()
+        app.report_latency()
+        return 0
+    
+    frames = 0
+    lines = 0
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        while not source.exhausted:
+            lines += app.process_input()
+            app.render_frame()
+            frames += 1
+        app_log.flush()
+    elapsed = time.perf_counter() - start
+    
+    print(f"Кадров: {frames}, строк: {lines}, время: {elapsed:.3f} с")
+    print(f"Кадров/с: {frames / elapsed:.1f}")
+    print(f"Строк/с: {lines / elapsed:.1f}")
+    print(f"Картинка: {app.picture_type}")
+    print(f"Залитые фигуры: {app.filled_figures}")
+    app.report_latency()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
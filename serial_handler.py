@@ -4,85 +4,318 @@
 Модуль для работы с последовательным портом (COM-port)
 """
 
-import serial
-import serial.tools.list_ports
 import threading
-from queue import Queue
-from config import BAUD_RATE, DEBUG_MODE
+from collections import deque
+import time
+from app_log import get_logger, DEBUG
+from config import (BAUD_RATE, SERIAL_MAX_LINE, SERIAL_PORT,
+                    SERIAL_QUEUE_CAPACITY, SERIAL_OVERLOAD_POLICY,
+                    SERIAL_AUTO_RECONNECT, SERIAL_RECONNECT_DELAY, SERIAL_RECONNECT_MAX_DELAY,
+                    SERIAL_SILENCE_TIMEOUT)
+from ingest_queue import IngestQueue
+from port_discovery import discover, probe
+from protocol import BinaryDecoder, TEXT_MODE_REQUEST
+from session_log import SessionRecorder
+
+log = get_logger('serial')
+uart_log = get_logger('uart')
 
 
 class SerialHandler:
     """Класс для управления последовательным портом"""
     
-    def __init__(self):
+    def __init__(self, record_path=None, port=SERIAL_PORT):
         self.serial_port = None
-        self.data_queue = Queue()
+        self.port = port
+        # Номер устройства в пачках (одна плата - всегда 0, см. device_mux.py)
+        self.device_id = 0
+        # Ограниченная очередь: при перегрузке отсчёты сжимаются, кнопки сохраняются
+        self.data_queue = IngestQueue(SERIAL_QUEUE_CAPACITY, SERIAL_OVERLOAD_POLICY)
+        self._pending = deque()
+        self._pending_received_at = None
         self.serial_thread = None
         self._running = False
-    
-    def find_and_connect(self):
-        """Поиск и подключение к доступному COM порту"""
-        print("Поиск доступного COM порта...")
+        self._stop_event = threading.Event()
         
-        # Список портов для проверки
-        stm_ports_to_try = ['COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8', 'COM9', 'COM10']
+        # Переподключение: счётчики и время без связи
+        self.auto_reconnect = SERIAL_AUTO_RECONNECT
+        self.disconnects = 0
+        self.reconnects = 0
+        self._downtime = 0.0
+        self._down_since = None
         
-        # Сначала пытаемся найти STM устройства
-        try:
-            ports = serial.tools.list_ports.comports()
-            for port, desc, hwid in ports:
-                desc_upper = desc.upper()
-                if any(keyword in desc_upper for keyword in ['STM', 'ST MICRO', 'STLINK', 'NUCLEO', 'VIRTUAL COM', 'ST MICROELECTRONICS']):
-                    if port not in stm_ports_to_try:
-                        stm_ports_to_try.insert(0, port)
-        except:
-            pass
+        # Протокол обмена: 'text' или 'binary' (выбирается при подключении)
+        self.protocol = 'text'
+        self._decoder = None
+        self._handshake_tail = b''
         
-        # Пробуем подключиться к каждому порту из списка
-        for port in stm_ports_to_try:
-            try:
-                test_port = serial.Serial(port, BAUD_RATE, timeout=0.1)
-                test_port.close()
-                self.serial_port = serial.Serial(port, BAUD_RATE, timeout=0.1)
-                print(f"✓ Найден и подключен к порту: {port} на {BAUD_RATE} бод")
-                return True
-            except:
-                continue
+        # Запись сеанса в журнал (см. session_log.py)
+        self.record_path = record_path
+        self._recorder = None
+    
+    def find_and_connect(self):
+        """Поиск и подключение к плате
         
-        print("\n✗ Не удалось найти рабочий COM порт")
-        print("Проверьте подключение устройства и попробуйте снова")
+        Если порт задан явно (self.port - имя или путь, например pty
+        симулятора), подключается только к нему. Иначе все порты
+        проверяются параллельно (см. port_discovery.py).
+        """
+        if self._try_connect():
+            return True
+        if self.port:
+            log.error("✗ Не удалось открыть порт %s", self.port)
+        else:
+            log.error("\n✗ Не удалось найти рабочий COM порт")
+            log.error("Проверьте подключение устройства и попробуйте снова")
         return False
     
+    def _try_connect(self, quiet=False):
+        """Одна попытка подключения; quiet - для повторных попыток в фоне"""
+        if self.port:
+            result = probe(self.port)
+        else:
+            if not quiet:
+                log.info("Поиск доступного COM порта...")
+            start = time.monotonic()
+            result = discover()
+        if result is None:
+            return False
+        
+        if self.port:
+            log.info("✓ Подключен к порту: %s на %s бод", result.port, BAUD_RATE)
+        else:
+            log.info("✓ Найден и подключен к порту: %s на %s бод (поиск %.2f с)",
+                     result.port, BAUD_RATE, time.monotonic() - start)
+        self._use_port(result)
+        return True
+    
+    def _use_port(self, result):
+        """Принять открытый и проверенный порт (ProbeResult)"""
+        self.serial_port = result.serial_port
+        self.protocol = result.protocol
+        self._decoder = BinaryDecoder() if result.protocol == 'binary' else None
+        # Байты, принятые во время проверки, разберёт поток чтения
+        self._handshake_tail = result.tail
+        log.info("Протокол обмена: %s", self.protocol)
+    
     def start_reading(self):
-        """Запуск потока для чтения данных"""
-        if self.serial_port and not self._running:
+        """Запуск потока для чтения данных
+        
+        При auto_reconnect поток запускается и без порта: он сам
+        будет искать плату, пока она не появится.
+        """
+        if (self.serial_port or self.auto_reconnect) and not self._running:
+            if self.record_path and self._recorder is None:
+                self._recorder = SessionRecorder(self.record_path)
+                log.info("Запись сеанса в %s", self.record_path)
+            if self.serial_port is None:
+                self._down_since = time.monotonic()
             self._running = True
+            self._stop_event.clear()
             self.serial_thread = threading.Thread(target=self._read_thread, daemon=True)
             self.serial_thread.start()
     
     def _read_thread(self):
-        """Поток для чтения данных из последовательного порта"""
-        while self._running and self.serial_port and self.serial_port.is_open:
+        """Поток чтения и надзора за соединением
+        
+        Пока порт открыт, данные читаются в _read_port(). При ошибке порта
+        (кабель выдернут, плата перезагрузилась) поток закрывает его и
+        повторяет поиск с экспоненциально растущей паузой, не трогая
+        главный цикл; новый порт подменяется незаметно для приложения -
+        очередь и её читатели остаются прежними.
+        """
+        delay = SERIAL_RECONNECT_DELAY
+        while self._running:
+            if self.serial_port is None:
+                if not self._try_connect(quiet=True):
+                    if not self.auto_reconnect:
+                        break
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, SERIAL_RECONNECT_MAX_DELAY)
+                    continue
+                if not self._running:
+                    # close() успел отработать, пока шёл поиск: порт,
+                    # открытый после него, закрываем здесь
+                    self._close_port()
+                    break
+                self._on_connected()
+                delay = SERIAL_RECONNECT_DELAY
+            
             try:
-                if self.serial_port.in_waiting > 0:
-                    line = self.serial_port.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        if DEBUG_MODE:
-                            print(f"[UART] Получено: {line}")
-                        self.data_queue.put(line)
+                self._read_port()
             except Exception as e:
-                print(f"Ошибка чтения: {e}")
+                log.error("Ошибка чтения: %s", e)
+            if not self._running:
+                break
+            self._on_disconnected()
+            if not self.auto_reconnect:
                 break
     
+    def _read_port(self):
+        """Чтение открытого порта до ошибки или остановки
+        
+        Вместо опроса in_waiting в цикле поток блокируется в read() до
+        прихода первого байта (не дольше timeout порта), затем забирает
+        всё накопленное одним вызовом. Полные строки (или бинарные кадры)
+        кладутся в очередь одной пачкой вместе с временем приёма.
+        
+        Плата шлёт отсчёты постоянно, поэтому тишина дольше
+        SERIAL_SILENCE_TIMEOUT тоже считается обрывом связи.
+        """
+        buffer = bytearray()
+        chunk = self._handshake_tail
+        self._handshake_tail = b''
+        last_data = time.monotonic()
+        while self._running and self.serial_port.is_open:
+            if not chunk:
+                chunk = self.serial_port.read(self.serial_port.in_waiting or 1)
+                if not chunk:
+                    if SERIAL_SILENCE_TIMEOUT and time.monotonic() - last_data > SERIAL_SILENCE_TIMEOUT:
+                        raise OSError(f"нет данных от платы дольше {SERIAL_SILENCE_TIMEOUT} с")
+                    continue
+                last_data = time.monotonic()
+            
+            if self._decoder is not None:
+                items = self._decoder.feed(chunk)
+            else:
+                buffer += chunk
+                items = self._split_lines(buffer)
+            chunk = b''
+            
+            if items:
+                received_at = time.monotonic()
+                if self._recorder is not None:
+                    self._recorder.write(items, received_at)
+                if uart_log.enabled(DEBUG):
+                    for item in items:
+                        uart_log.debug("[UART] Получено: %s", item)
+                self.data_queue.put(received_at, items)
+    
+    def _on_disconnected(self):
+        """Порт перестал работать: закрыть его и начать отсчёт простоя"""
+        try:
+            self.serial_port.close()
+        except Exception:
+            pass
+        self.serial_port = None
+        self.disconnects += 1
+        self._down_since = time.monotonic()
+        log.warning("✗ Связь с платой потеряна, переподключение...")
+    
+    def _on_connected(self):
+        """Связь (вос)становлена потоком надзора"""
+        if self._down_since is None:
+            return
+        down = time.monotonic() - self._down_since
+        self._downtime += down
+        self._down_since = None
+        if self.disconnects:
+            self.reconnects += 1
+            log.info("✓ Связь с платой восстановлена через %.1f с", down)
+    
+    @property
+    def connected(self):
+        return self.serial_port is not None
+    
+    @property
+    def downtime(self):
+        """Суммарное время без связи с платой, сек (включая текущий простой)"""
+        if self._down_since is None:
+            return self._downtime
+        return self._downtime + time.monotonic() - self._down_since
+    
+    def metrics(self):
+        """Состояние соединения для отчётов"""
+        return {'connected': self.connected, 'disconnects': self.disconnects,
+                'reconnects': self.reconnects, 'downtime': round(self.downtime, 3)}
+    
+    @staticmethod
+    def _split_lines(buffer):
+        """Вырезать из буфера все полные строки текстового протокола"""
+        end = buffer.rfind(b'\n')
+        if end < 0:
+            if len(buffer) > SERIAL_MAX_LINE:
+                # Мусор без перевода строки - сбрасываем
+                del buffer[:]
+            return []
+        
+        text = buffer[:end].decode('utf-8', errors='ignore')
+        del buffer[:end + 1]
+        
+        lines = [line.strip() for line in text.split('\n')]
+        return [line for line in lines if line]
+    
     def get_data(self):
-        """Получить данные из очереди (если есть)"""
-        if not self.data_queue.empty():
-            return self.data_queue.get_nowait()
-        return None
+        """Получить одну запись из очереди (если есть)
+        
+        Запись - строка текстового протокола, кортеж (x, y, buttons, seq)
+        бинарного или CoalescedSample, если очередь сжимала отсчёты.
+        """
+        if not self._pending:
+            batch = self.data_queue.get_nowait()
+            if batch is None:
+                return None
+            self._pending_received_at, items = batch
+            self._pending.extend(items)
+        return self._pending.popleft()
+    
+    def get_batch(self):
+        """Получить все накопленные записи одним списком"""
+        lines = []
+        for _received_at, items, _device_id in self.get_batches():
+            lines.extend(items)
+        return lines
+    
+    def get_batches(self):
+        """Все накопленные пачки: список (время приёма, записи, номер устройства)"""
+        batches = []
+        if self._pending:
+            batches.append((self._pending_received_at, list(self._pending), self.device_id))
+            self._pending.clear()
+        batches.extend((received_at, items, self.device_id)
+                       for received_at, items in self.data_queue.get_all())
+        return batches
+    
+    def wait_batches(self, timeout):
+        """Как get_batches(), но ждёт первую пачку не дольше timeout секунд"""
+        if self._pending:
+            return self.get_batches()
+        return [(received_at, items, self.device_id)
+                for received_at, items in self.data_queue.wait(timeout)]
     
     def close(self):
         """Закрыть соединение"""
         self._running = False
-        if self.serial_port:
-            self.serial_port.close()
+        self._stop_event.set()
+        if self.serial_thread and self.serial_thread is not threading.current_thread():
+            self.serial_thread.join(timeout=1.0)
+        if self._recorder is not None:
+            self._recorder.close()
+            log.info("Записано строк: %s", self._recorder.records)
+            self._recorder = None
+        queue = self.data_queue
+        if queue.coalesced or queue.dropped or queue.dropped_buttons:
+            log.info("Очередь приёма (%s): принято %s, объединено %s, выброшено %s, кнопок %s",
+                     queue.policy, queue.enqueued, queue.coalesced, queue.dropped, queue.dropped_buttons)
+        if self.disconnects:
+            log.info("Переподключений: %s из %s обрывов, без связи %.1f с",
+                     self.reconnects, self.disconnects, self.downtime)
+        self._close_port()
+    
+    def _close_port(self):
+        """Вернуть плату в текстовый режим и закрыть порт
+        
+        Вызывается из close() и из потока чтения; повторное закрытие
+        того же порта безвредно.
+        """
+        serial_port = self.serial_port
+        if serial_port is None:
+            return
+        if self.protocol == 'binary':
+            # Возвращаем плату в текстовый режим по умолчанию
+            try:
+                serial_port.write(TEXT_MODE_REQUEST)
+            except Exception:
+                pass
+        serial_port.close()
 
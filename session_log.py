@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Запись и воспроизведение сеансов работы с платой
+
+Файл журнала: заголовок MAGIC, затем записи
+    delta_us (uint32) | kind (uint8) | length (uint16) | payload
+delta_us - время от предыдущей записи по монотонным часам, kind -
+KIND_TEXT (строка UTF-8) или KIND_FRAME (кадр бинарного протокола без
+sync и crc: x, y, buttons, seq).
+"""
+
+import struct
+import time
+from collections import deque
+
+MAGIC = b'PSLOG1\n'
+RECORD = struct.Struct('<IBH')
+FRAME_PAYLOAD = struct.Struct('<HHBB')
+
+KIND_TEXT = 0
+KIND_FRAME = 1
+
+
+class SessionRecorder:
+    """Запись принятых строк/кадров с отметками времени"""
+    
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._last = time.monotonic()
+        self.records = 0
+    
+    def write(self, items, timestamp=None):
+        """Записать пачку, принятую в момент timestamp (time.monotonic())"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        delta_us = min(max(int((timestamp - self._last) * 1e6), 0), 0xFFFFFFFF)
+        self._last = timestamp
+        
+        chunks = []
+        for item in items:
+            if isinstance(item, tuple):
+                payload = FRAME_PAYLOAD.pack(*item)
+                kind = KIND_FRAME
+            else:
+                payload = item.encode('utf-8')[:0xFFFF]
+                kind = KIND_TEXT
+            chunks.append(RECORD.pack(delta_us, kind, len(payload)))
+            chunks.append(payload)
+            # Остальные записи пачки приняты в тот же момент
+            delta_us = 0
+        self._file.write(b''.join(chunks))
+        self.records += len(items)
+    
+    def close(self):
+        self._file.close()
+
+
+def read_session(path):
+    """Прочитать журнал: список (время от начала в секундах, запись)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: не журнал сеанса")
+    
+    records = []
+    elapsed_us = 0
+    pos = len(MAGIC)
+    while pos + RECORD.size <= len(data):
+        delta_us, kind, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        payload = data[pos:pos + length]
+        pos += length
+        elapsed_us += delta_us
+        
+        if kind == KIND_FRAME:
+            item = FRAME_PAYLOAD.unpack(payload)
+        else:
+            item = payload.decode('utf-8', errors='ignore')
+        records.append((elapsed_us / 1e6, item))
+    return records
+
+
+class ReplaySource:
+    """Источник данных из журнала с интерфейсом SerialHandler
+    
+    realtime=True - записи выдаются по настоящим часам с исходными
+    интервалами. Иначе время виртуальное: каждый вызов get_batch()
+    сдвигает его на frame_interval, поэтому записи делятся по кадрам так
+    же, как при 60 fps, но без ожидания, и результат воспроизводим.
+    """
+    
+    def __init__(self, path, realtime=True, frame_interval=1 / 60):
+        self.path = path
+        self.realtime = realtime
+        self.frame_interval = frame_interval
+        self._records = deque()
+        self._start = None
+        self._virtual_time = 0.0
+        self.total_records = 0
+    
+    @property
+    def exhausted(self):
+        """Все записи журнала уже выданы"""
+        return self._start is not None and not self._records
+    
+    def find_and_connect(self):
+        self._records = deque(read_session(self.path))
+        self.total_records = len(self._records)
+        print(f"✓ Журнал {self.path}: {self.total_records} записей")
+        return True
+    
+    def start_reading(self):
+        self._start = time.monotonic()
+    
+    def _now(self):
+        """Текущее время воспроизведения от начала журнала"""
+        if self.realtime:
+            return time.monotonic() - self._start
+        return self._virtual_time
+    
+    def sample_clock(self):
+        """Время отсчётов для фильтра джойстика - время журнала, а не приёма"""
+        return self._now()
+    
+    def get_batch(self):
+        """Записи, время которых уже наступило"""
+        if not self.realtime:
+            self._virtual_time += self.frame_interval
+        
+        now = self._now()
+        records = self._records
+        batch = []
+        while records and records[0][0] <= now:
+            batch.append(records.popleft()[1])
+        return batch
+    
+    def get_batches(self):
+        """Как у SerialHandler: список (время выдачи, записи, номер устройства 0)"""
+        batch = self.get_batch()
+        return [(time.monotonic(), batch, 0)] if batch else []
+    
+    def wait_batches(self, timeout):
+        """Как get_batches(), но ждёт очередную запись не дольше timeout секунд"""
+        records = self._records
+        if self.realtime and records:
+            delay = records[0][0] - self._now()
+            if delay > 0:
+                time.sleep(min(delay, timeout))
+        return self.get_batches()
+    
+    def get_data(self):
+        """Одна запись, время которой уже наступило (или None)"""
+        records = self._records
+        if not records or (self.realtime and records[0][0] > self._now()):
+            return None
+        return records.popleft()[1]
+    
+    def close(self):
+        self._records.clear()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Симулятор платы NUCLEO с джойстиком на псевдотерминале (Linux)
+
+Создаёт pty и пишет в него тот же поток, что и прошивка: строки
+X:..,Y:..,B:.. и BTN:.. (или бинарные кадры после PROTO:BIN), с заданной
+частотой, пачками и с испорченными строками.
+
+    python simulator.py --rate 100             # печатает путь pty
+    python main.py --port /dev/pts/N           # подключить приложение
+
+    python simulator.py --load-test --rate 0 --duration 10
+
+В режиме --load-test симулятор и SerialHandler запускаются в одном
+процессе, очередь разбирается с частотой кадров 60 Гц, а в конце
+выводятся потерянные и опоздавшие отсчёты, рост очереди и загрузка CPU
+потоком чтения. --rate 0 - насыщение линии на скорости --baud.
+"""
+
+import argparse
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+
+from config import BAUD_RATE, JOY_X_CENTER, JOY_Y_CENTER
+from protocol import (encode_frame, FLAG_SAMPLE, BUTTON_BITS, FRAME_SIZE,
+                      HANDSHAKE_REQUEST, HANDSHAKE_ACK, TEXT_MODE_REQUEST,
+                      TEXT_SAMPLE_RE)
+from ingest_queue import CoalescedSample
+
+# Средняя длина текстовой строки отсчёта, байт (для расчёта насыщения)
+TEXT_LINE_SIZE = len("X:2048,Y:2048,B:0\n")
+
+MALFORMED_LINES = (
+    b"X:12",
+    b"X:abc,Y:1,B:0",
+    b"Y:100,X:200",
+    b"BTN:",
+    b"\xff\xfe\x00garbage",
+    b"X:99999999999999999999,Y:1,B:0",
+)
+
+
+class JoystickSimulator:
+    """Поток, изображающий плату на master-стороне pty"""
+    
+    def __init__(self, rate=20.0, baud=BAUD_RATE, button_rate=0.0, malformed=0.0,
+                 burst=0, burst_every=1.0, binary_capable=False, encode_seq=False, seed=None):
+        """
+        rate          - отсчётов в секунду (0 - насыщение линии на baud)
+        baud          - скорость эмулируемой линии (0 - без ограничения)
+        button_rate   - нажатий кнопок в секунду
+        malformed     - доля дополнительных испорченных строк
+        burst         - сколько отсчётов досылать разом каждые burst_every с
+        binary_capable- отвечать на PROTO:BIN (как новая прошивка)
+        encode_seq    - кодировать номер отсчёта в X/Y (для --load-test)
+        """
+        self.rate = rate
+        self.baud = baud
+        self.button_rate = button_rate
+        self.malformed = malformed
+        self.burst = burst
+        self.burst_every = burst_every
+        self.binary_capable = binary_capable
+        self.encode_seq = encode_seq
+        self._rng = random.Random(seed)
+        
+        self.binary = False
+        self.sent_samples = 0
+        self.sent_buttons = 0
+        self.sent_malformed = 0
+        self.send_times = []
+        
+        self._master = None
+        self._slave = None
+        self.path = None
+        self._thread = None
+        self._running = False
+    
+    def open(self):
+        """Создать pty; приложение подключается к self.path"""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.path = os.ttyname(self._slave)
+        return self.path
+    
+    def start(self):
+        if self._master is None:
+            self.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+    
+    def close(self):
+        self.stop()
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+    
+    def _effective_rate(self):
+        """Частота отсчётов с учётом насыщения линии"""
+        if self.rate > 0:
+            return self.rate
+        line_size = FRAME_SIZE if self.binary else TEXT_LINE_SIZE
+        if self.baud > 0:
+            return self.baud / 10 / line_size
+        return 100000.0
+    
+    def _sample(self, index, t):
+        """Один отсчёт: плавное движение с шумом или его номер"""
+        if self.encode_seq:
+            return index % 4096, (index // 4096) % 4096
+        x = JOY_X_CENTER + 1800 * math.sin(t * 0.7) + self._rng.gauss(0, 30)
+        y = JOY_Y_CENTER + 1800 * math.sin(t * 0.45 + 1.0) + self._rng.gauss(0, 30)
+        return min(max(int(x), 0), 4095), min(max(int(y), 0), 4095)
+    
+    def _encode_sample(self, x, y, seq):
+        if self.binary:
+            return encode_frame(x, y, FLAG_SAMPLE, seq)
+        return f"X:{x},Y:{y},B:0\n".encode()
+    
+    def _encode_button(self, button, x, y, seq):
+        if self.binary:
+            return encode_frame(x, y, 1 << BUTTON_BITS.index(button), seq)
+        return f"BTN:{button}\n".encode()
+    
+    def _handle_requests(self, request_buffer):
+        """Обработка команд хоста (переключение протокола)"""
+        while b'\n' in request_buffer:
+            line, _, rest = bytes(request_buffer).partition(b'\n')
+            request_buffer[:] = rest
+            line += b'\n'
+            if line == HANDSHAKE_REQUEST and self.binary_capable:
+                os.write(self._master, HANDSHAKE_ACK)
+                self.binary = True
+            elif line == TEXT_MODE_REQUEST:
+                self.binary = False
+    
+    def _run(self):
+        start = time.monotonic()
+        next_burst = start + self.burst_every
+        generated = 0
+        frame_seq = 0
+        request_buffer = bytearray()
+        
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.001)
+            if ready:
+                try:
+                    request_buffer += os.read(self._master, 1024)
+                except OSError:
+                    break
+                self._handle_requests(request_buffer)
+            
+            now = time.monotonic()
+            due = int((now - start) * self._effective_rate()) - generated
+            if self.burst and now >= next_burst:
+                due += self.burst
+                next_burst += self.burst_every
+            due = min(due, 4096)
+            if due <= 0:
+                continue
+            
+            chunks = []
+            for index in range(generated, generated + due):
+                x, y = self._sample(index, now - start)
+                chunks.append(self._encode_sample(x, y, frame_seq))
+                self.send_times.append(now)
+                frame_seq += 1
+                
+                if self.button_rate and self._rng.random() < self.button_rate / self._effective_rate():
+                    button = self._rng.choice(BUTTON_BITS[:6])
+                    chunks.append(self._encode_button(button, x, y, frame_seq))
+                    self.sent_buttons += 1
+                    frame_seq += 1
+                
+                if self.malformed and self._rng.random() < self.malformed:
+                    garbage = self._rng.choice(MALFORMED_LINES)
+                    chunks.append(garbage if self.binary else garbage + b'\n')
+                    self.sent_malformed += 1
+            generated += due
+            self.sent_samples += due
+            
+            try:
+                os.write(self._master, b''.join(chunks))
+            except OSError:
+                break
+
+
+def _thread_cpu_seconds(native_id):
+    """CPU-время потока (user + system) из /proc"""
+    try:
+        with open(f'/proc/self/task/{native_id}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return float('nan')
+    # После имени: state=0, ..., utime=11, stime=12
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def load_test(args):
+    """Нагрузочный тест SerialHandler на симуляторе"""
+    import app_log
+    from serial_handler import SerialHandler
+    
+    # Вывод каждой строки из потока чтения исказил бы замер
+    app_log.set_level('info', 'uart')
+    
+    simulator = JoystickSimulator(rate=args.rate, baud=args.baud, button_rate=args.buttons,
+                                  malformed=args.malformed, burst=args.burst,
+                                  burst_every=args.burst_every, binary_capable=args.binary,
+                                  encode_seq=True, seed=1)
+    simulator.open()
+    handler = SerialHandler(port=simulator.path)
+    simulator.start()
+    if not handler.find_and_connect():
+        return 1
+    handler.start_reading()
+    reader_id = handler.serial_thread.native_id
+    cpu_start = _thread_cpu_seconds(reader_id)
+    
+    received = set()
+    latencies = []
+    merged = 0
+    late = 0
+    late_limit = args.late_ms / 1000
+    
+    def drain():
+        nonlocal late, merged
+        now = time.monotonic()
+        for item in handler.get_batch():
+            if isinstance(item, CoalescedSample):
+                # Номера отсчётов в серии не восстановить
+                merged += item.count
+                continue
+            if isinstance(item, tuple):
+                if not item[2] & FLAG_SAMPLE:
+                    continue
+                x, y = item[0], item[1]
+            else:
+                match = TEXT_SAMPLE_RE.match(item)
+                if not match:
+                    continue
+                x, y = int(match.group(1)), int(match.group(2))
+            seq = x + 4096 * y
+            if seq < len(simulator.send_times):
+                latency = now - simulator.send_times[seq]
+                latencies.append(latency)
+                if latency > late_limit:
+                    late += 1
+                received.add(seq)
+    
+    wall_start = time.monotonic()
+    while time.monotonic() - wall_start < args.duration:
+        drain()
+        time.sleep(1 / 60)
+    simulator.stop()
+    time.sleep(0.3)
+    drain()
+    wall = time.monotonic() - wall_start
+    cpu = _thread_cpu_seconds(reader_id) - cpu_start
+    handler.close()
+    simulator.close()
+    app_log.flush()
+    
+    sent = simulator.sent_samples
+    print(f"Протокол: {handler.protocol}, длительность: {wall:.1f} с")
+    print(f"Отправлено отсчётов: {sent} ({sent / wall:.0f}/с), кнопок: {simulator.sent_buttons}, "
+          f"испорченных строк: {simulator.sent_malformed}")
+    print(f"Получено: {len(received)}, в объединённых сериях: {merged}, "
+          f"потеряно: {sent - len(received) - merged}")
+    print(f"Задержка до кадра: p50 {_percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p99 {_percentile(latencies, 0.99) * 1000:.1f} мс, опоздавших (> {args.late_ms} мс): {late}")
+    queue = handler.data_queue
+    print(f"Очередь ({queue.policy}, до {queue.capacity}): объединено {queue.coalesced}, "
+          f"выброшено {queue.dropped}, кнопок {queue.dropped_buttons}, макс. записей {queue.max_size}")
+    print(f"CPU потока чтения: {cpu:.2f} с ({cpu / wall * 100:.1f}% ядра)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор джойстика на pty")
+    parser.add_argument('--rate', type=float, default=20.0,
+                        help="отсчётов в секунду (0 - насыщение линии)")
+    parser.add_argument('--baud', type=int, default=BAUD_RATE,
+                        help="скорость эмулируемой линии (0 - без ограничения)")
+    parser.add_argument('--buttons', type=float, default=0.2, help="нажатий кнопок в секунду")
+    parser.add_argument('--malformed', type=float, default=0.0,
+                        help="доля дополнительных испорченных строк (0..1)")
+    parser.add_argument('--burst', type=int, default=0, help="размер пачки отсчётов")
+    parser.add_argument('--burst-every', type=float, default=1.0, help="период пачек, с")
+    parser.add_argument('--binary', action='store_true',
+                        help="поддерживать бинарный протокол (отвечать на PROTO:BIN)")
+    parser.add_argument('--load-test', action='store_true',
+                        help="запустить SerialHandler в этом же процессе и вывести статистику")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность нагрузочного теста, с")
+    parser.add_argument('--late-ms', type=float, default=50.0, help="порог опоздания отсчёта, мс")
+    args = parser.parse_args()
+    
+    if args.load_test:
+        return load_test(args)
+    
+    simulator = JoystickSimulator(rate=args.rate, baud=args.baud, button_rate=args.buttons,
+                                  malformed=args.malformed, burst=args.burst,
+                                  burst_every=args.burst_every, binary_capable=args.binary)
+    path = simulator.open()
+    simulator.start()
+    print(f"Симулятор запущен: {path}")
+    print(f"Подключение: python main.py --port {path}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    simulator.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Равномерная сетка над ограничивающими прямоугольниками фигур
+"""
+
+import math
+
+
+class GridIndex:
+    """Пространственный индекс для быстрого поиска фигур по точке
+    
+    Область, покрытая прямоугольниками, делится на ячейки примерно
+    одинакового размера; в каждой ячейке хранится список номеров
+    прямоугольников, которые её задевают, по возрастанию номера. Поиск
+    по точке возвращает кандидатов из одной ячейки, поэтому его
+    стоимость почти не зависит от общего количества фигур.
+    """
+    
+    # Среднее число прямоугольников на ячейку, на которое подбирается сетка
+    TARGET_PER_CELL = 2
+    MAX_CELLS_PER_AXIS = 256
+    
+    def __init__(self, rects):
+        """rects - список pygame.Rect (или (x, y, w, h)) в порядке приоритета"""
+        rects = [tuple(rect) for rect in rects]
+        self.count = len(rects)
+        if not rects:
+            self._cells = []
+            self._columns = self._rows = 0
+            return
+        
+        left = min(x for x, y, w, h in rects)
+        top = min(y for x, y, w, h in rects)
+        right = max(x + w for x, y, w, h in rects)
+        bottom = max(y + h for x, y, w, h in rects)
+        width = max(right - left, 1)
+        height = max(bottom - top, 1)
+        
+        per_axis = math.ceil(math.sqrt(len(rects) / self.TARGET_PER_CELL))
+        per_axis = max(1, min(per_axis, self.MAX_CELLS_PER_AXIS))
+        
+        self._left = left
+        self._top = top
+        self._columns = per_axis
+        self._rows = per_axis
+        self._cell_w = width / per_axis
+        self._cell_h = height / per_axis
+        self._cells = [[] for _ in range(per_axis * per_axis)]
+        
+        for index, (x, y, w, h) in enumerate(rects):
+            if w <= 0 or h <= 0:
+                continue
+            col0, row0 = self._cell_of(x, y)
+            col1, row1 = self._cell_of(x + w - 1, y + h - 1)
+            for row in range(row0, row1 + 1):
+                base = row * self._columns
+                for col in range(col0, col1 + 1):
+                    self._cells[base + col].append(index)
+    
+    def _cell_of(self, x, y):
+        """Ячейка (столбец, строка) для точки, прижатая к границам сетки"""
+        col = int((x - self._left) / self._cell_w)
+        row = int((y - self._top) / self._cell_h)
+        col = min(max(col, 0), self._columns - 1)
+        row = min(max(row, 0), self._rows - 1)
+        return col, row
+    
+    def candidates(self, x, y):
+        """Номера прямоугольников, которые могут содержать точку (x, y)"""
+        if not self._cells:
+            return ()
+        col = (x - self._left) / self._cell_w
+        row = (y - self._top) / self._cell_h
+        if col < 0 or row < 0 or col >= self._columns or row >= self._rows:
+            return ()
+        return self._cells[int(row) * self._columns + int(col)]
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Журнал состояния рисунка для восстановления после перезапуска
+
+Каждое действие, меняющее рисунок (заливка, очистка, смена картинки и
+цвета, отключение джойстика), дописывается в конец файла компактной записью:
+    kind (uint8) | player (uint16) | x (uint16) | y (uint16) | length (uint32) | payload
+player, x и y - номер джойстика и его курсор в момент действия. Запись
+KIND_SNAPSHOT содержит всё состояние целиком (JSON); после
+STATE_JOURNAL_COMPACT_EVERY действий журнал переписывается одним снимком,
+поэтому его чтение при запуске занимает миллисекунды.
+
+Файл пишет отдельный поток: append() только кладёт запись в очередь и не
+задерживает ни ввод, ни отрисовку. Недописанная при сбое последняя запись
+при чтении отбрасывается.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from app_log import get_logger
+
+log = get_logger('journal')
+
+MAGIC = b'PSTATE1\n'
+RECORD = struct.Struct('<BHHHI')
+COLOR = struct.Struct('<BBB')
+
+KIND_SNAPSHOT = 0
+KIND_PICTURE = 1      # payload - имя картинки; заливки и джойстики сбрасываются
+KIND_FILL = 2         # payload - цвет (r, g, b) и имя фигуры
+KIND_CLEAR = 3        # payload - имя фигуры
+KIND_CLEAR_ALL = 4
+KIND_COLOR = 5        # payload - номер цвета палитры (uint8)
+KIND_RELEASE = 6      # устройство джойстика отключилось, его курсор и цвет забываются
+
+
+def encode_fill(color, figure_name):
+    return COLOR.pack(*color) + figure_name.encode('utf-8')
+
+
+class JournalState:
+    """Состояние рисунка, собранное из записей журнала"""
+
+    def __init__(self):
+        self.picture_type = None
+        self.filled_figures = {}
+        # {номер джойстика: [x, y, номер цвета]}
+        self.players = {}
+        self.actions = 0
+
+    def apply(self, kind, player, x, y, payload):
+        """Применить одну запись журнала"""
+        if kind == KIND_SNAPSHOT:
+            state = json.loads(payload)
+            self.picture_type = state['picture_type']
+            self.filled_figures = {name: tuple(color) for name, color in state['filled_figures'].items()}
+            self.players = {int(player_id): values for player_id, values in state['players'].items()}
+            self.actions = 0
+            return
+
+        self.actions += 1
+        if kind == KIND_PICTURE:
+            self.picture_type = payload.decode('utf-8')
+            self.filled_figures = {}
+            self.players = {}
+            return
+        if kind == KIND_RELEASE:
+            self.players.pop(player, None)
+            return
+
+        values = self.players.setdefault(player, [x, y, 0])
+        values[0], values[1] = x, y
+        if kind == KIND_FILL:
+            self.filled_figures[payload[COLOR.size:].decode('utf-8')] = COLOR.unpack_from(payload)
+        elif kind == KIND_CLEAR:
+            self.filled_figures.pop(payload.decode('utf-8'), None)
+        elif kind == KIND_CLEAR_ALL:
+            self.filled_figures = {}
+        elif kind == KIND_COLOR:
+            values[2] = payload[0]
+
+    def snapshot(self):
+        """Всё состояние одной записью KIND_SNAPSHOT"""
+        payload = json.dumps({'picture_type': self.picture_type,
+                              'filled_figures': self.filled_figures,
+                              'players': self.players}, separators=(',', ':')).encode('utf-8')
+        return RECORD.pack(KIND_SNAPSHOT, 0, 0, 0, len(payload)) + payload
+
+
+def read_journal(path):
+    """Прочитать журнал: (JournalState, длина целых записей в байтах) или (None, 0)"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None, 0
+    if not data.startswith(MAGIC):
+        return None, 0
+
+    state = JournalState()
+    pos = len(MAGIC)
+    while pos + RECORD.size <= len(data):
+        kind, player, x, y, length = RECORD.unpack_from(data, pos)
+        end = pos + RECORD.size + length
+        if end > len(data):
+            # Запись не дописана (сбой посреди записи)
+            break
+        try:
+            state.apply(kind, player, x, y, data[pos + RECORD.size:end])
+        except (ValueError, KeyError, IndexError, struct.error):
+            log.warning("✗ Повреждённая запись журнала %s на позиции %s", path, pos)
+            break
+        pos = end
+    return state, pos
+
+
+class StateJournal:
+    """Журнал действий с записью в отдельном потоке"""
+
+    def __init__(self, path, compact_every=1000, fsync=True):
+        self.path = path
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._running = False
+        self._file = None
+        # Копия состояния, из которой пишется снимок при сжатии
+        self._state = JournalState()
+        self._loaded = False
+        self._valid = False
+        self.records = 0
+        self.compactions = 0
+
+    def load(self):
+        """Прочитать журнал (до start()); None - журнала нет или он пустой"""
+        state, valid_size = read_journal(self.path)
+        self._loaded = True
+        self._valid = state is not None
+        if state is None:
+            return None
+        if valid_size < os.path.getsize(self.path):
+            # Хвост недописанной записи отрезается, иначе следующие записи
+            # после него нельзя будет прочитать
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        self._state = state
+        return state if state.picture_type is not None else None
+
+    def start(self):
+        """Открыть файл на дозапись и запустить поток записи"""
+        if self._running:
+            return
+        if not self._loaded:
+            self.load()
+        if self._valid:
+            self._file = open(self.path, 'ab')
+        else:
+            self._rewrite()
+        self._running = True
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def append(self, kind, player, x, y, payload=b''):
+        """Добавить действие (вызывается потоком ввода, не блокирует)"""
+        self._pending.append((kind, player, min(max(int(x), 0), 0xFFFF),
+                              min(max(int(y), 0), 0xFFFF), payload))
+        self._wakeup.set()
+
+    def _write_loop(self):
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self._write_pending()
+
+    def _write_pending(self):
+        chunks = []
+        state = self._state
+        while self._pending:
+            kind, player, x, y, payload = self._pending.popleft()
+            chunks.append(RECORD.pack(kind, player, x, y, len(payload)))
+            chunks.append(payload)
+            state.apply(kind, player, x, y, payload)
+        if not chunks:
+            return
+        try:
+            self._file.write(b''.join(chunks))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records += len(chunks) // 2
+            if state.actions >= self.compact_every:
+                self._rewrite()
+                self.compactions += 1
+        except OSError as e:
+            log.error("✗ Ошибка записи журнала %s: %s", self.path, e)
+
+    def _rewrite(self):
+        """Сжатие: заменить журнал одним снимком текущего состояния"""
+        start = time.monotonic()
+        if self._file is not None:
+            self._file.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            if self._state.picture_type is not None:
+                f.write(self._state.snapshot())
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._state.actions = 0
+        self._file = open(self.path, 'ab')
+        log.debug("[DEBUG] Журнал сжат за %.1f мс", (time.monotonic() - start) * 1000)
+
+    def close(self):
+        """Дописать очередь и закрыть файл"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            if self._thread.is_alive():
+                # Поток ещё пишет (диск завис): файл остаётся ему
+                log.warning("✗ Журнал %s не дописан: поток записи не завершился", self.path)
+                return
+            self._thread = None
+        if self._file is not None:
+            self._write_pending()
+            self._file.close()
+            self._file = None
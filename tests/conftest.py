@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Общая настройка тестов: модули приложения из корня репозитория, pygame без окна"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
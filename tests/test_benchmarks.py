@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""Бенчмарки запускаются и печатают сводку; сообщения приложения не мешают разбору результатов"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(*args):
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks.py'), *args],
+                          cwd=ROOT, capture_output=True, text=True, timeout=120)
+
+
+def test_startup_smoke():
+    result = _run('startup', '--runs', '1', '--discovery-delay', '0')
+    assert result.returncode == 0, result.stderr
+    assert 'первый кадр' in result.stdout
+    assert 'подключение' in result.stdout
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Очередь приёма остаётся ограниченной и линейной при потоке кнопок"""
+
+import time
+
+import pytest
+
+from ingest_queue import POLICIES, CoalescedSample, IngestQueue, is_button
+
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_buttons_are_capped(policy):
+    queue = IngestQueue(capacity=16, policy=policy)
+    for i in range(100):
+        queue.put(float(i), ["BTN:B"])
+    assert queue.qsize() == 16
+    assert queue.dropped_buttons == 84
+    assert queue.max_size == 16
+
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_button_flood_is_linear(policy):
+    def flood(count):
+        queue = IngestQueue(capacity=128, policy=policy)
+        start = time.perf_counter()
+        for i in range(count):
+            queue.put(float(i), ["X:3000,Y:2048,B:0", "BTN:B"])
+        return time.perf_counter() - start
+    
+    small, large = flood(2000), flood(8000)
+    # Квадратичная очередь здесь медленнее в ~16 раз
+    assert large < small * 8 + 0.05
+
+
+def test_max_size_is_recorded_before_shrink():
+    queue = IngestQueue(capacity=4, policy='integrate-all')
+    queue.put(0.0, ["X:3000,Y:2048,B:0"] * 10)
+    assert queue.max_size == 10
+    assert queue.qsize() == 1
+
+
+def test_samples_still_merge_around_capped_buttons():
+    queue = IngestQueue(capacity=4, policy='integrate-all', button_capacity=2)
+    queue.put(0.0, ["X:3000,Y:2048,B:0", "BTN:A", "X:3000,Y:2048,B:0", "X:1000,Y:2048,B:0",
+                    "BTN:B", "BTN:C"])
+    items = [item for _, batch in queue.get_all() for item in batch]
+    assert [item for item in items if is_button(item)] == ["BTN:A", "BTN:B"]
+    assert CoalescedSample(2000, 2048, 2) in items
+    assert queue.dropped_buttons == 1
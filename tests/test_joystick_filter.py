@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Скорость курсора при полном отклонении ручки - как до фильтра"""
+
+import os
+
+import numpy as np
+import pytest
+
+from config import (JOY_X_CENTER, JOY_Y_CENTER, JOY_X_MAX, JOY_MAX_SPEED,
+                    JOY_SEND_PERIOD_MS, SCREEN_WIDTH)
+from joystick_filter import FILTERS, JoystickFilter
+
+# До фильтра курсор сдвигался на JOY_MAX_SPEED пикселей за отсчёт, а плата
+# шлёт отсчёт раз в JOY_SEND_PERIOD_MS
+BASELINE_SPEED = JOY_MAX_SPEED * 1000.0 / JOY_SEND_PERIOD_MS
+
+
+def _travel(kind, rate, seconds=1.0, batch=0.05):
+    """Путь курсора по X за seconds полного отклонения вправо при rate отсчётах/с"""
+    joystick = JoystickFilter(kind, calibrate=False)
+    per_batch = max(1, round(rate * batch))
+    samples = np.tile([JOY_X_MAX, JOY_Y_CENTER], (per_batch, 1))
+    start = cursor = (100, 300)
+    now = 0.0
+    for _ in range(round(seconds / batch)):
+        now += batch
+        cursor = joystick.process(samples, joystick.intervals(per_batch, now), cursor)
+    return cursor[0] - start[0]
+
+
+def test_firmware_period_matches_config():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Core', 'Src', 'main.c')
+    with open(path, encoding='utf-8', errors='replace') as f:
+        assert f"#define UART_SEND_PERIOD_MS {JOY_SEND_PERIOD_MS}\n" in f.read()
+
+
+@pytest.mark.parametrize('kind', FILTERS)
+@pytest.mark.parametrize('rate', [20, 50, 200])
+def test_full_deflection_speed_matches_baseline(kind, rate):
+    assert BASELINE_SPEED < SCREEN_WIDTH - 100
+    assert abs(_travel(kind, rate) - BASELINE_SPEED) <= 2
+
+
+def test_centered_stick_does_not_move():
+    joystick = JoystickFilter(calibrate=False)
+    cursor = (300, 300)
+    samples = np.tile([JOY_X_CENTER, JOY_Y_CENTER], (4, 1))
+    for step in range(1, 21):
+        cursor = joystick.process(samples, joystick.intervals(4, step * 0.05), cursor)
+    assert cursor == (300, 300)
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Командная строка: несовместимые и неправильные аргументы - ошибка использования, а не трассировка"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('args', [
+    ['--listen', 'abc'],
+    ['--listen', 'localhost:70000'],
+    ['--listen', '5005', '--record', 'session.log'],
+    ['--ports', '/dev/null', '--record', 'session.log'],
+    ['--devices', '2', '--record', 'session.log'],
+    ['--listen', '5005', '--ports', '/dev/null'],
+    ['--devices', '-1'],
+])
+def test_bad_arguments_are_usage_errors(args):
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), *args],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 2
+    assert 'usage:' in result.stderr
+    assert 'Traceback' not in result.stderr
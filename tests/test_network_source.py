@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Клиенты сети: ограниченная очередь и чистый джойстик для нового клиента"""
+
+import socket
+import time
+
+import pytest
+
+from config import NET_CLIENT_MAX_BUTTONS
+from ingest_queue import DEVICE_RELEASED
+from network_source import NetworkSource
+
+
+@pytest.fixture
+def source():
+    source = NetworkSource(host='127.0.0.1', port=0, udp=False)
+    assert source.find_and_connect()
+    source.start_reading()
+    yield source
+    source.close()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def _collect(source, until, timeout=5.0):
+    """Пачки источника, пока until(пачки) не станет истинным"""
+    batches = []
+    deadline = time.monotonic() + timeout
+    while not until(batches):
+        assert time.monotonic() < deadline
+        batches += source.wait_batches(0.1)
+    return batches
+
+
+def test_button_flood_disconnects_client(source):
+    client = socket.create_connection(('127.0.0.1', source.port))
+    client.sendall(b"BTN:B\n" * (NET_CLIENT_MAX_BUTTONS * 20))
+    _wait_for(lambda: source.overflowed == 1 and not source.clients)
+    
+    batches = _collect(source, lambda batches: any(DEVICE_RELEASED in items for _, items, _ in batches))
+    buttons = sum(len([item for item in items if item != DEVICE_RELEASED]) for _, items, _ in batches)
+    assert buttons <= NET_CLIENT_MAX_BUTTONS
+    client.close()
+
+
+def test_new_client_gets_fresh_player(source):
+    from paint_app import PaintApp
+    
+    app = PaintApp(source)
+    app.latency = None
+    first = socket.create_connection(('127.0.0.1', source.port))
+    second = socket.create_connection(('127.0.0.1', source.port))
+    _wait_for(lambda: len(source.clients) == 2)
+    second.sendall(b"X:4095,Y:2048,B:0\n" * 5 + b"BTN:D\n")
+    _wait_for(lambda: app.process_input() or len(app.players) == 2 and app.players[1].color_index == 1)
+    assert app._snapshot.cursors[1] != app._snapshot.cursors[0]
+    
+    second.close()
+    _wait_for(lambda: app.process_input() or len(app.players) == 1)
+    assert len(app._snapshot.cursors) == 1
+    
+    third = socket.create_connection(('127.0.0.1', source.port))
+    third.sendall(b"X:2048,Y:2048,B:0\n")
+    _wait_for(lambda: app.process_input() or len(app.players) == 2)
+    assert app.players[1].color_index == 0
+    assert app._snapshot.cursors[1] == app._snapshot.cursors[0]
+    first.close()
+    third.close()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Поиск платы: чужим портам ничего не пишется, close() не оставляет порт открытым"""
+
+import os
+import select
+import time
+import tty
+
+import pytest
+
+import port_discovery
+import serial_handler
+from protocol import HANDSHAKE_REQUEST
+from serial_handler import SerialHandler
+from simulator import JoystickSimulator
+
+
+@pytest.fixture
+def silent_port():
+    """pty без платы (как модем): (путь, master-сторона)"""
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    yield os.ttyname(slave), master
+    os.close(master)
+    os.close(slave)
+
+
+@pytest.fixture
+def board():
+    simulator = JoystickSimulator(rate=20.0, binary_capable=True, seed=0)
+    simulator.start()
+    yield simulator
+    simulator.close()
+
+
+def _written(master):
+    """Всё, что хост успел записать в порт"""
+    data = b''
+    while select.select([master], [], [], 0.05)[0]:
+        data += os.read(master, 1024)
+    return data
+
+
+def test_silent_port_gets_no_handshake(silent_port):
+    path, master = silent_port
+    result = port_discovery.probe(path)
+    try:
+        assert result is not None and not result.confirmed
+        assert _written(master) == b''
+    finally:
+        result.serial_port.close()
+
+
+def test_unrelated_device_gets_no_handshake(silent_port):
+    path, master = silent_port
+    os.write(master, b'AT\r\nOK\r\nRING\r\n' * 4)
+    result = port_discovery.probe(path)
+    try:
+        assert not result.confirmed
+        assert HANDSHAKE_REQUEST not in _written(master)
+    finally:
+        result.serial_port.close()
+
+
+def test_board_switches_to_binary(board):
+    result = port_discovery.probe(board.path)
+    try:
+        assert result.confirmed
+        assert result.protocol == 'binary'
+        assert board.binary
+    finally:
+        result.serial_port.close()
+
+
+def test_port_opened_after_close_is_closed(board, monkeypatch):
+    # Поиск дольше, чем close() ждёт поток чтения
+    def slow_probe(port):
+        time.sleep(1.5)
+        return port_discovery.probe(port)
+    
+    monkeypatch.setattr(serial_handler, 'probe', slow_probe)
+    handler = SerialHandler(port=board.path)
+    handler.start_reading()
+    handler.close()
+    handler.serial_thread.join(timeout=5.0)
+    assert not handler.serial_thread.is_alive()
+    assert handler.serial_port is not None
+    assert not handler.serial_port.is_open
+    # Плата возвращена в текстовый режим
+    deadline = time.monotonic() + 2.0
+    while board.binary and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not board.binary
+
+
+def test_cached_port_is_probed_once(silent_port, board, monkeypatch):
+    path, _master = silent_port
+    probed = []
+    real_probe = port_discovery.probe
+    
+    def counting_probe(port):
+        probed.append(port)
+        return real_probe(port)
+    
+    monkeypatch.setattr(port_discovery, 'probe', counting_probe)
+    monkeypatch.setattr(port_discovery, 'load_cache', lambda: {'port': path})
+    monkeypatch.setattr(port_discovery, 'save_cache', lambda port, port_info=None: None)
+    monkeypatch.setattr(port_discovery, 'candidate_ports',
+                        lambda cache: ([path, board.path], {}, path))
+    result = port_discovery.discover()
+    try:
+        assert result.port == board.path
+        assert probed.count(path) == 1
+    finally:
+        result.serial_port.close()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Журнал состояния: недоступный путь не мешает запуску, close() не пишет
+из двух потоков, законченный рисунок после перезапуска не сохраняется
+в галерею повторно, отключившиеся джойстики не возвращаются"""
+
+import threading
+
+import pygame
+
+from drawings import DRAWINGS
+from ingest_queue import DEVICE_RELEASED
+from paint_app import PaintApp
+from state_journal import KIND_COLOR, StateJournal
+
+
+class _Source:
+    def get_batch(self):
+        return []
+    
+    def get_batches(self):
+        return []
+
+
+def test_unwritable_journal_runs_without_it(tmp_path):
+    pygame.init()
+    app = PaintApp(_Source(), journal=StateJournal(str(tmp_path / 'missing' / 'state.journal')))
+    assert app.journal is None
+    app.select_color(1)
+
+
+def test_close_leaves_busy_writer_alone(tmp_path, monkeypatch):
+    journal = StateJournal(str(tmp_path / 'state.journal'), fsync=False)
+    journal.start()
+    release = threading.Event()
+    real_write = journal._write_pending
+    
+    def stuck_write():
+        release.wait()
+        real_write()
+    
+    monkeypatch.setattr(journal, '_write_pending', stuck_write)
+    journal.append(KIND_COLOR, 0, 0, 0, b'\x01')
+    journal.close()
+    # Поток записи ещё внутри _write_pending: файл остаётся ему
+    assert journal._file is not None
+    release.set()
+    journal._thread.join(timeout=2.0)
+    assert not journal._thread.is_alive()
+
+
+class _Exporter:
+    def __init__(self):
+        self.saved = []
+    
+    def submit(self, surface, picture_type, filled_figures):
+        self.saved.append((picture_type, dict(filled_figures)))
+
+
+def _finish_drawing(app):
+    for name in DRAWINGS[app.picture_type].FIGURES:
+        app.fill_figure(name)
+    app.publish_snapshot()
+    app.render_frame()
+    app._export_finished()
+
+
+def test_restored_drawing_is_not_exported_again(tmp_path):
+    pygame.init()
+    path = str(tmp_path / 'state.journal')
+    exporter = _Exporter()
+    app = PaintApp(_Source(), journal=StateJournal(path, fsync=False), exporter=exporter)
+    _finish_drawing(app)
+    app.journal.close()
+    assert len(exporter.saved) == 1
+    
+    for _restart in range(3):
+        app = PaintApp(_Source(), journal=StateJournal(path, fsync=False), exporter=exporter)
+        assert len(app.filled_figures) == len(DRAWINGS[app.picture_type].FIGURES)
+        app.render_frame()
+        app._export_finished()
+        app.journal.close()
+    assert len(exporter.saved) == 1
+
+
+def test_released_and_absent_players_stay_hidden(tmp_path):
+    pygame.init()
+    path = str(tmp_path / 'state.journal')
+    app = PaintApp(_Source(), journal=StateJournal(path, fsync=False))
+    for device_id in (1, 2):
+        app._select_player(device_id)
+        app.select_color(device_id)
+    app._select_player(1)
+    app._handle_items([DEVICE_RELEASED])
+    app.journal.close()
+    
+    app = PaintApp(_Source(), journal=StateJournal(path, fsync=False))
+    app.journal.close()
+    # Отключившийся забыт, а не вернувшийся пока не показывается
+    assert app._snapshot.cursors[1:] == (None, None)
+    app._select_player(2)
+    assert app.players[2].active
+    assert app.players[2].color_index == 2
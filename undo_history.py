@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+История отмены и повтора действий с заливками
+
+Шаг истории - одно действие (заливка, очистка фигуры, очистка всего,
+смена картинки), записанное как изменения filled_figures:
+    номер фигуры (16 бит) | старый цвет (8 бит) | новый цвет (8 бит)
+Номер фигуры - позиция в Picture.FIGURES, цвет - номер в COLOR_PALETTE
+плюс 1 (0 - фигура не залита). Шаг из одного изменения хранится одним
+целым числом, из нескольких - массивом array('I') по 4 байта на изменение.
+Смена картинки добавляет в начало массива запись с флагом PICTURE_FLAG и
+номерами старой и новой картинки в DRAWINGS.
+
+Отмена применяет изменения в обратную сторону, а отрисовка перерисовывает
+только затронутые фигуры, поэтому время отмены не зависит от размера canvas.
+"""
+
+from array import array
+from collections import deque
+
+from colors import COLOR_PALETTE
+from config import UNDO_DEPTH
+
+PICTURE_FLAG = 1 << 31
+
+_COLOR_CODES = {color: code for code, color in enumerate(COLOR_PALETTE, 1)}
+
+
+def color_code(color):
+    """Код цвета заливки (0 - не залита)"""
+    return 0 if color is None else _COLOR_CODES[color]
+
+
+def code_color(code):
+    """Цвет по коду (None - не залита)"""
+    return None if code == 0 else COLOR_PALETTE[code - 1]
+
+
+def encode_change(figure_id, old_color, new_color):
+    return figure_id << 16 | color_code(old_color) << 8 | color_code(new_color)
+
+
+def encode_step(changes, picture_change=None):
+    """Шаг из изменений [encode_change(...)] и, возможно, смены картинки (старая, новая)"""
+    if picture_change is None and len(changes) == 1:
+        return changes[0]
+    step = array('I')
+    if picture_change is not None:
+        old_picture, new_picture = picture_change
+        step.append(PICTURE_FLAG | old_picture << 15 | new_picture)
+    step.extend(changes)
+    return step
+
+
+def decode_step(step):
+    """(смена картинки (старая, новая) или None, [(фигура, старый код, новый код)])"""
+    entries = (step,) if isinstance(step, int) else step
+    picture_change = None
+    changes = []
+    for entry in entries:
+        if entry & PICTURE_FLAG:
+            picture_change = ((entry >> 15) & 0x7FFF, entry & 0x7FFF)
+        else:
+            changes.append((entry >> 16, (entry >> 8) & 0xFF, entry & 0xFF))
+    return picture_change, changes
+
+
+class UndoHistory:
+    """Ограниченные стеки отмены и повтора"""
+    
+    def __init__(self, depth=UNDO_DEPTH):
+        self._undo = deque(maxlen=depth)
+        self._redo = deque(maxlen=depth)
+    
+    def record(self, step):
+        """Новое действие; повторять отменённое после него уже нельзя"""
+        self._undo.append(step)
+        self._redo.clear()
+    
+    def undo(self):
+        """Шаг для отмены или None"""
+        if not self._undo:
+            return None
+        step = self._undo.pop()
+        self._redo.append(step)
+        return step
+    
+    def redo(self):
+        """Шаг для повтора или None"""
+        if not self._redo:
+            return None
+        step = self._redo.pop()
+        self._undo.append(step)
+        return step
+    
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+    
+    def __len__(self):
+        return len(self._undo)